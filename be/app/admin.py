@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import File
+from .models import DailyStat, File, FileResult, IngestCheckpoint, IngestedFile, Job, JobEvent, SessionExpiry, Upload
 
 
 @admin.register(File)
@@ -8,3 +8,57 @@ class FileAdmin(admin.ModelAdmin):
     list_display = ("id", "original_name", "session_id", "size", "content_type", "created_at")
     list_filter = ("created_at",)
     search_fields = ("original_name", "session_id")
+
+
+@admin.register(Upload)
+class UploadAdmin(admin.ModelAdmin):
+    list_display = ("id", "original_name", "session_id", "received", "size", "file", "updated_at")
+    search_fields = ("original_name", "session_id")
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "session_id", "action", "status", "processed", "failed", "total", "created_at")
+    list_filter = ("status", "kind", "created_at")
+    search_fields = ("session_id",)
+
+
+@admin.register(FileResult)
+class FileResultAdmin(admin.ModelAdmin):
+    list_display = ("id", "file", "kind", "action", "value", "decoder", "page", "output", "created_at")
+    list_filter = ("kind", "decoder")
+    search_fields = ("value", "file__session_id", "file__original_name")
+
+
+@admin.register(JobEvent)
+class JobEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "job", "event", "file", "page", "value", "created_at")
+    list_filter = ("event",)
+    search_fields = ("session_id", "file")
+
+
+@admin.register(SessionExpiry)
+class SessionExpiryAdmin(admin.ModelAdmin):
+    list_display = ("session_id", "reason", "expires_at", "created_at")
+    list_filter = ("reason",)
+    search_fields = ("session_id",)
+
+
+@admin.register(IngestedFile)
+class IngestedFileAdmin(admin.ModelAdmin):
+    list_display = ("id", "path", "status", "session_id", "size", "file", "updated_at")
+    list_filter = ("status",)
+    search_fields = ("path", "session_id", "sha256")
+
+
+@admin.register(IngestCheckpoint)
+class IngestCheckpointAdmin(admin.ModelAdmin):
+    list_display = ("path", "mtime_ns", "updated_at")
+    search_fields = ("path",)
+
+
+@admin.register(DailyStat)
+class DailyStatAdmin(admin.ModelAdmin):
+    list_display = ("date", "kind", "action", "outcome", "files", "pages", "bytes", "seconds")
+    list_filter = ("kind", "outcome", "date")
+    search_fields = ("action",)
@@ -0,0 +1,169 @@
+"""HTTP client for the AiDoc pdf2layer service.
+
+One pooled ``requests.Session`` is shared by a bounded thread pool, so at most
+``AIDOC_CONCURRENCY`` uploads are in flight. Request bodies are streamed from disk (the
+multipart body is a file-like object, not a bytes blob) and responses are streamed to a
+``.part`` file that is renamed into place once complete, or removed when the response is
+cut short. Transient failures (connection errors, timeouts, truncated responses, 429 and
+5xx) are retried with exponential backoff.
+
+The client only depends on its constructor arguments, so it can be pointed at a local
+stub server instead of ``settings.DOMAIN_AIDOC``.
+"""
+
+import contextlib
+import io
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+PDF2LAYER_PATH = "/home/api/v1/ocr-general/upload-and-download-pdf2layer"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CHUNK_SIZE = 1024 * 1024
+
+
+class MultipartFile:
+    """``multipart/form-data`` body that reads the uploaded file from disk as it is sent."""
+
+    def __init__(self, fields, name, path, content_type="application/pdf"):
+        self.boundary = uuid.uuid4().hex
+        head = b""
+        for key, value in fields.items():
+            head += (
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'
+            ).encode()
+        head += (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"; filename="{os.path.basename(path)}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode()
+        tail = f"\r\n--{self.boundary}--\r\n".encode()
+
+        self._file = open(path, "rb")
+        self._length = len(head) + os.path.getsize(path) + len(tail)
+        self._parts = [io.BytesIO(head).read, self._file.read, io.BytesIO(tail).read]
+        self.sent = 0
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        size = self._length if size is None or size < 0 else size
+        chunks = []
+        while self._parts and size > 0:
+            chunk = self._parts[0](size)
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            chunks.append(chunk)
+            size -= len(chunk)
+        data = b"".join(chunks)
+        self.sent += len(data)
+        return data
+
+    def __iter__(self):
+        return iter(lambda: self.read(CHUNK_SIZE), b"")
+
+    def close(self):
+        self._file.close()
+
+
+class AiDocClient:
+    def __init__(self, base_url=None, token=None, concurrency=None, retries=None, backoff=None, timeout=None):
+        self.url = f"{(base_url if base_url is not None else settings.DOMAIN_AIDOC).rstrip('/')}{PDF2LAYER_PATH}"
+        self.token = token if token is not None else settings.TOKEN_AIDOC
+        self.concurrency = concurrency or settings.AIDOC_CONCURRENCY
+        self.retries = retries if retries is not None else settings.AIDOC_RETRIES
+        self.backoff = backoff if backoff is not None else settings.AIDOC_BACKOFF
+        self.timeout = timeout or (settings.AIDOC_CONNECT_TIMEOUT, settings.AIDOC_READ_TIMEOUT)
+        self.fields = {"folder": 660690, "get_value": 1}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="aidoc")
+
+    def _post(self, src_path, dst_path):
+        body = MultipartFile(self.fields, "file", src_path)
+        headers = {"Authorization": self.token, "Content-Type": body.content_type}
+        try:
+            with (
+                metrics.timer("aidoc", [src_path]),
+                self.session.post(self.url, data=body, headers=headers, timeout=self.timeout, stream=True) as res,
+            ):
+                if res.status_code in RETRY_STATUSES:
+                    raise requests.HTTPError(f"AiDoc returned {res.status_code}", response=res)
+                res.raise_for_status()
+
+                tmp_path = f"{dst_path}.part"
+                try:
+                    with open(tmp_path, "wb") as f:
+                        for chunk in res.iter_content(CHUNK_SIZE):
+                            f.write(chunk)
+                    os.replace(tmp_path, dst_path)
+                except BaseException:
+                    # kết nối đứt giữa chừng: không để lại file dở, lần thử lại ghi từ đầu
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(tmp_path)
+                    raise
+        finally:
+            body.close()
+
+    @staticmethod
+    def _retryable(error):
+        if isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)):
+            return True
+        response = getattr(error, "response", None)
+        return response is not None and response.status_code in RETRY_STATUSES
+
+    def pdf2layer(self, src_path, dst_path, progress=None):
+        """Send one PDF and write the 2-layer PDF to ``dst_path``, retrying transient errors.
+
+        ``progress(src_path, state, **info)`` is called with ``uploading``, ``retry``, ``done`` or ``failed``.
+        """
+        progress = progress or (lambda *args, **kwargs: None)
+        for attempt in range(self.retries + 1):
+            progress(src_path, "uploading", attempt=attempt)
+            try:
+                started = time.monotonic()
+                self._post(src_path, dst_path)
+                progress(src_path, "done", seconds=round(time.monotonic() - started, 3))
+                return dst_path
+            except (requests.RequestException, OSError) as e:
+                if attempt >= self.retries or not self._retryable(e):
+                    progress(src_path, "failed", error=str(e))
+                    raise
+                delay = self.backoff * 2 ** attempt
+                delay += random.uniform(0, delay)
+                logger.info(f"AiDoc retry {attempt + 1}/{self.retries} for {src_path} in {delay:.1f}s: {e}")
+                progress(src_path, "retry", attempt=attempt + 1, delay=round(delay, 2), error=str(e))
+                time.sleep(delay)
+
+
+_lock = threading.Lock()
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = AiDocClient()
+    return _client
@@ -0,0 +1,328 @@
+"""Decode pipeline benchmark on a synthetic PDF corpus.
+
+The corpus is generated offline: QR codes (``cv2.QRCodeEncoder``) and Code 128 barcodes
+are drawn on A4 pages at several sizes, rotations and noise levels, saved as PDFs with
+Pillow, and the encoded value of every file is kept in ``manifest.json`` as ground truth.
+The same seed always produces the same corpus.
+
+Each file goes through ``QrCode.convert_pdfs`` / ``BarCode.convert_pdfs`` exactly as a job
+would run it. Stages are timed by wrapping the module functions the views call (render,
+cheap scanners, preprocessing, QReader, output copy) for the duration of the run. The decode
+result cache is bypassed unless asked for, otherwise a second run would only measure
+cache hits.
+
+Throughput is reported in files per second: qrcode / barcode jobs only decode the first
+page of a file, whatever its page count.
+
+Used by ``python manage.py bench_decode``. Timings depend on the machine, so there is no
+shared baseline in the repository: run ``bench_decode --save-baseline`` once on the
+machine (or CI runner) that checks for regressions, then every later ``bench_decode``
+there is compared against ``settings.BENCH_BASELINE``.
+"""
+
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import time
+
+import cv2
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from . import decoders, preprocess, qr_model, render, result_cache, writer
+from .models import Job
+
+MARKER = ".bench_corpus"
+# những gì generate_corpus và các view (thư mục output theo kind) tạo ra trong thư mục corpus
+LAYOUT = {MARKER, "manifest.json", "uploads", Job.KIND_QRCODE, Job.KIND_BARCODE}
+
+PAGE_DPI = 200
+PAGE_SIZE = (1654, 2339)  # A4 ở 200 DPI
+
+SIZES = {"small": 0.06, "medium": 0.1, "large": 0.16}  # cạnh của mã / chiều rộng trang
+ROTATIONS = (0, 7, 90)
+NOISE_LEVELS = (0.0, 0.08, 0.2)
+PAGE_COUNTS = (1, 4)
+
+# Code 128 bar/space widths, indexed by symbol value (103-105 = start A/B/C, 106 = stop)
+CODE128 = (
+    "212222 222122 222221 121223 121322 131222 122213 122312 132212 221213 221312 231212 112232 122132 "
+    "122231 113222 123122 123221 223211 221132 221231 213212 223112 312131 311222 321122 321221 312212 "
+    "322112 322211 212123 212321 232121 111323 131123 131321 112313 132113 132311 211313 231113 231311 "
+    "112133 112331 132131 113123 113321 133121 313121 211331 231131 213113 213311 213131 311123 311321 "
+    "331121 312113 312311 332111 314111 221411 431111 111224 111422 121124 121421 141122 141221 112214 "
+    "112412 122114 122411 142112 142211 241211 221114 413111 241112 134111 111242 121142 121241 114212 "
+    "124112 124211 411212 421112 421211 212141 214121 412121 111143 111341 131141 114113 114311 411113 "
+    "411311 113141 114131 311141 411131 211412 211214 211232 2331112"
+).split()
+CODE128_START_B = 104
+CODE128_STOP = 106
+
+
+def code128_modules(value):
+    """Code 128 (set B) of ``value`` as a 0/1 array of modules, 1 = bar, quiet zones included."""
+    codes = [CODE128_START_B] + [ord(char) - 32 for char in value]
+    codes.append(sum(code * max(position, 1) for position, code in enumerate(codes)) % 103)
+    codes.append(CODE128_STOP)
+    modules = [0] * 10
+    for code in codes:
+        for i, width in enumerate(CODE128[code]):
+            modules += [1 - i % 2] * int(width)
+    return np.array(modules + [0] * 10, dtype=np.uint8)
+
+
+def qr_image(value, side):
+    matrix = cv2.QRCodeEncoder.create().encode(value)  # 255 = trắng, đã có quiet zone
+    return cv2.resize(matrix, (side, side), interpolation=cv2.INTER_NEAREST)
+
+
+def barcode_image(value, width):
+    modules = code128_modules(value)
+    module = max(width // len(modules), 1)
+    row = np.repeat(255 * (1 - modules), module).astype(np.uint8)
+    return np.tile(row, (max(len(row) // 4, 40), 1))
+
+
+def draw_page(kind, value, size, rotation, noise, rng):
+    page = np.full(PAGE_SIZE[::-1], 255, dtype=np.uint8)
+    if value is not None:
+        side = int(PAGE_SIZE[0] * SIZES[size])
+        code = qr_image(value, side) if kind == Job.KIND_QRCODE else barcode_image(value, side * 3)
+        code = np.array(Image.fromarray(code).rotate(rotation, expand=True, fillcolor=255))
+
+        height, width = code.shape
+        if kind == Job.KIND_BARCODE:
+            # vùng ROI mặc định của barcode là 1/4 góc phải trên
+            x = rng.randint(PAGE_SIZE[0] // 2, max(PAGE_SIZE[0] - width - 40, PAGE_SIZE[0] // 2))
+            y = rng.randint(40, max(PAGE_SIZE[1] // 2 - height - 40, 40))
+        else:
+            x = rng.randint(40, PAGE_SIZE[0] - width - 40)
+            y = rng.randint(40, PAGE_SIZE[1] - height - 40)
+        page[y:y + height, x:x + width] = code[:PAGE_SIZE[1] - y, :PAGE_SIZE[0] - x]
+
+    if noise:
+        noise_rng = np.random.default_rng(rng.randint(0, 2 ** 32 - 1))
+        page = page.astype(np.float32) + noise_rng.normal(0, 255 * noise, page.shape)
+        page = cv2.GaussianBlur(np.clip(page, 0, 255).astype(np.uint8), (3, 3), 0)
+    return Image.fromarray(page)
+
+
+def generate_corpus(folder, seed=0, limit=None):
+    """Write the synthetic corpus under ``folder/uploads`` and return its manifest.
+
+    The files live in an ``uploads`` folder because the views derive the output folder by
+    replacing ``uploads`` with the action name.
+    """
+    rng = random.Random(seed)
+    uploads = os.path.join(folder, "uploads")
+    os.makedirs(uploads, exist_ok=True)
+    open(os.path.join(folder, MARKER), "w").close()
+
+    cases = []
+    for kind in (Job.KIND_QRCODE, Job.KIND_BARCODE):
+        for size in SIZES:
+            for rotation in ROTATIONS:
+                for noise in NOISE_LEVELS:
+                    for pages in PAGE_COUNTS:
+                        cases.append({"kind": kind, "size": size, "rotation": rotation, "noise": noise, "pages": pages})
+        # trang không có mã: kết quả đúng là không đọc được gì
+        cases.append({"kind": kind, "size": None, "rotation": 0, "noise": 0.0, "pages": 1, "empty": True})
+    if limit:
+        cases = rng.sample(cases, min(limit, len(cases)))
+
+    for index, case in enumerate(cases):
+        case["value"] = None if case.pop("empty", False) else f"BM{index:03d}-2026-{rng.randint(0, 999999):06d}"
+        case["file"] = os.path.join(uploads, f"{case['kind']}_{index:03d}.pdf")
+        images = [draw_page(case["kind"], case["value"], case["size"], case["rotation"], case["noise"], rng)]
+        images += [draw_page(case["kind"], None, None, 0, case["noise"], rng) for _ in range(case["pages"] - 1)]
+        images[0].save(case["file"], "PDF", resolution=PAGE_DPI, save_all=True, append_images=images[1:])
+
+    manifest = {"seed": seed, "limit": limit, "cases": cases}
+    with open(os.path.join(folder, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_or_generate_corpus(folder, seed=0, limit=None):
+    """The corpus in ``folder``, regenerated when it was made with another seed or limit.
+
+    Only a folder this tool generated (marker file, nothing but the corpus layout) is ever
+    cleared; anything else raises ``ValueError`` instead of deleting the user's files.
+    """
+    path = os.path.join(folder, "manifest.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get("seed") == seed and manifest.get("limit") == limit:
+            return manifest
+    entries = set(os.listdir(folder)) if os.path.isdir(folder) else set()
+    if entries:
+        if MARKER not in entries or not entries <= LAYOUT:
+            raise ValueError(f"{folder} is not an empty folder or a bench_decode corpus, use an empty or new folder")
+        for name in entries:
+            entry = os.path.join(folder, name)
+            if os.path.isdir(entry):
+                shutil.rmtree(entry)
+            else:
+                os.remove(entry)
+    return generate_corpus(folder, seed, limit)
+
+
+class StageTimer:
+    """Records the duration of every call to a set of wrapped functions, per stage name."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - started)
+        return timed
+
+    @contextlib.contextmanager
+    def patch(self, targets):
+        """Wrap ``(module, attribute, stage)`` targets for the duration of the block."""
+        originals = [(module, name, getattr(module, name)) for module, name, _ in targets]
+        for module, name, stage in targets:
+            setattr(module, name, self.wrap(stage, getattr(module, name)))
+        try:
+            yield self
+        finally:
+            for module, name, original in originals:
+                setattr(module, name, original)
+
+    def summary(self):
+        return {stage: summarize(samples) for stage, samples in self.samples.items()}
+
+
+def summarize(samples):
+    values = np.array(samples) * 1000
+    return {
+        "count": len(samples),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "total_s": round(float(values.sum()) / 1000, 3),
+    }
+
+
+def peak_rss_mb():
+    """Peak RSS of this process and of its (pdftoppm) children, in MB."""
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss: bytes trên macOS, KB trên Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024 / scale
+    return {"self": round(own / 1024, 1), "children": round(children / 1024, 1)}
+
+
+def is_correct(case, info):
+    # mỗi file chỉ còn một giá trị đặt tên, kể cả barcode
+    return ((info or {}).get("value") or None) == case["value"]
+
+
+def run(manifest, use_cache=False):
+    """Run every case of ``manifest`` through the views and return the benchmark report."""
+    from . import views
+
+    timer = StageTimer()
+    stages = [
+        (render, "page_image", "render"),
+        (render, "native_image", "native_image"),
+        (decoders, "scan", "cheap_decode"),
+        (preprocess, "apply", "preprocess"),
+        (qr_model, "detect_and_decode_batch", "qreader"),
+        (writer, "_clone", "write_output"),
+    ]
+    cache_patch = contextlib.nullcontext() if use_cache else _bypass_cache()
+
+    results = {}
+    with cache_patch, timer.patch(stages):
+        for kind in (Job.KIND_QRCODE, Job.KIND_BARCODE):
+            cases = [case for case in manifest["cases"] if case["kind"] == kind]
+            if not cases:
+                continue
+            latencies, correct, errors, tiers = [], 0, 0, {}
+            started = time.perf_counter()
+            for case in cases:
+                case_started = time.perf_counter()
+                try:
+                    if kind == Job.KIND_QRCODE:
+                        info = views.QrCode().convert_pdfs(case["file"], kind)
+                    else:
+                        info = views.BarCode.convert_pdfs(case["file"], kind)
+                except Exception:
+                    info, errors = None, errors + 1
+                latencies.append(time.perf_counter() - case_started)
+                correct += is_correct(case, info)
+                tier = (info or {}).get("tier", decoders.TIER_ERROR)
+                tiers[tier] = tiers.get(tier, 0) + 1
+            seconds = time.perf_counter() - started
+            results[kind] = {
+                "files": len(cases),
+                "seconds": round(seconds, 3),
+                "files_per_sec": round(len(cases) / seconds, 3) if seconds else None,
+                "accuracy": round(correct / len(cases), 4),
+                "errors": errors,
+                "tiers": tiers,
+                "latency": summarize(latencies),
+            }
+
+    return {
+        "meta": environment(manifest),
+        "results": results,
+        "stages": timer.summary(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+@contextlib.contextmanager
+def _bypass_cache():
+    original_get, original_set = result_cache.get, result_cache.set
+    result_cache.get = lambda *args, **kwargs: result_cache.MISS
+    result_cache.set = lambda *args, **kwargs: None
+    try:
+        yield
+    finally:
+        result_cache.get, result_cache.set = original_get, original_set
+
+
+def environment(manifest):
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "opencv": cv2.__version__,
+        "decoder_version": decoders.DECODER_VERSION,
+        "render_dpi_steps": list(settings.RENDER_DPI_STEPS),
+        "render_native_images": settings.RENDER_NATIVE_IMAGES,
+        "preprocess_steps": list(settings.PREPROCESS_STEPS),
+        "qreader_model_size": settings.QREADER_MODEL_SIZE,
+        "seed": manifest["seed"],
+        "cases": len(manifest["cases"]),
+    }
+
+
+def compare(report, baseline, max_slowdown=0.1, max_accuracy_drop=0.0):
+    """Regressions of ``report`` against ``baseline``, as human readable strings."""
+    regressions = []
+    for kind, current in report["results"].items():
+        previous = baseline.get("results", {}).get(kind)
+        if not previous:
+            continue
+        if previous["files_per_sec"] and current["files_per_sec"] < previous["files_per_sec"] * (1 - max_slowdown):
+            regressions.append(f"{kind}: {current['files_per_sec']} files/s < baseline {previous['files_per_sec']}")
+        if current["accuracy"] < previous["accuracy"] - max_accuracy_drop:
+            regressions.append(f"{kind}: accuracy {current['accuracy']} < baseline {previous['accuracy']}")
+    return regressions
@@ -0,0 +1,232 @@
+"""Tiered code detection: cheap scanners first, the QReader deep model last.
+
+Every rendered page goes through one detection pass that returns all the symbols on it
+(QR, Code 128, EAN, ... from ``pyzbar``; QR from ``cv2.QRCodeDetector`` when zbar found
+none; DataMatrix from ``pylibdmtx`` when installed and enabled) with their type and
+position. Naming rules are applied on top of that list with :func:`pick`, e.g. the
+first symbol matching ``settings.PATTERNS``, QR codes first. Only pages without an
+accepted symbol are batched into the QReader model. Each symbol carries the tier that
+produced it so jobs can report per-tier hit rates.
+
+Before giving up on the cheap scanners, the page is retried on the ``app.preprocess``
+variants (adaptive threshold, rescale, deskew, denoise); a symbol recovered that way is
+reported as ``<tier>+<step>``, e.g. ``pyzbar+deskew``.
+"""
+
+import re
+
+import cv2
+import numpy as np
+from django.conf import settings
+from pyzbar.pyzbar import decode as zbar_decode
+
+from . import metrics, preprocess, qr_model
+
+try:
+    from pylibdmtx.pylibdmtx import decode as dmtx_decode
+except ImportError:  # DataMatrix là tuỳ chọn: cần pylibdmtx + libdmtx trên máy
+    dmtx_decode = None
+
+# tăng khi thay đổi logic decode để bỏ qua kết quả cũ trong result_cache
+DECODER_VERSION = "3"
+
+TIER_CACHE = "cache"
+TIER_PYZBAR = "pyzbar"
+TIER_OPENCV = "opencv"
+TIER_DMTX = "libdmtx"
+TIER_QREADER = "qreader"
+TIER_NONE = "none"
+TIER_ERROR = "error"
+
+SYMBOLOGY_QR = "QRCODE"
+SYMBOLOGY_DATAMATRIX = "DATAMATRIX"
+
+
+def match_patterns(value):
+    return bool(value) and any(re.match(pattern, value) for pattern in settings.PATTERNS)
+
+
+def to_small_gray(image, max_side=None):
+    """Grayscale copy of an RGB image, downscaled so its longest side is at most ``max_side``."""
+    max_side = max_side or settings.QR_FAST_MAX_SIDE
+    with metrics.timer("grayscale"):
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        height, width = gray.shape[:2]
+        scale = max_side / max(height, width)
+        if scale < 1:
+            gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def symbol(value, symbology, rect, tier):
+    """One detected symbol; ``rect`` is ``[left, top, width, height]`` in page pixels, or ``None``."""
+    return {"value": value, "type": symbology, "rect": rect, "tier": tier}
+
+
+def scan_pyzbar(gray):
+    return [
+        symbol(found.data.decode("utf-8", errors="replace"), found.type, list(found.rect), TIER_PYZBAR)
+        for found in zbar_decode(gray)
+    ]
+
+
+def scan_opencv(gray):
+    ok, values, points, _ = cv2.QRCodeDetector().detectAndDecodeMulti(gray)
+    if not ok:
+        return []
+    return [
+        symbol(value, SYMBOLOGY_QR, list(cv2.boundingRect(np.asarray(quad, np.float32).reshape(-1, 1, 2))), TIER_OPENCV)
+        for value, quad in zip(values, points)
+        if value
+    ]
+
+
+def scan_datamatrix(gray):
+    height = gray.shape[0]
+    return [
+        # libdmtx đo top từ mép dưới ảnh
+        symbol(found.data.decode("utf-8", errors="replace"), SYMBOLOGY_DATAMATRIX,
+               [found.rect.left, height - found.rect.top - found.rect.height, found.rect.width, found.rect.height], TIER_DMTX)
+        for found in dmtx_decode(gray, timeout=settings.DATAMATRIX_TIMEOUT)
+    ]
+
+
+def _merge(symbols, found):
+    seen = {(item["type"], item["value"]) for item in symbols}
+    for item in found:
+        if (item["type"], item["value"]) not in seen:
+            seen.add((item["type"], item["value"]))
+            symbols.append(item)
+
+
+def scan(gray, accept=match_patterns, datamatrix=True):
+    """Every symbol the cheap scanners read in one grayscale image."""
+    symbols = []
+    with metrics.timer(TIER_PYZBAR):
+        try:
+            _merge(symbols, scan_pyzbar(gray))
+        except Exception:
+            pass
+    # OpenCV chỉ đọc QR: bỏ qua khi zbar đã đọc được QR hợp lệ
+    if not any(item["type"] == SYMBOLOGY_QR and accept(item["value"]) for item in symbols):
+        with metrics.timer(TIER_OPENCV):
+            try:
+                _merge(symbols, scan_opencv(gray))
+            except Exception:
+                pass
+    if datamatrix and dmtx_decode is not None and settings.DATAMATRIX_ENABLED:
+        with metrics.timer(TIER_DMTX):
+            try:
+                _merge(symbols, scan_datamatrix(gray))
+            except Exception:
+                pass
+    return symbols
+
+
+def _with_variants(gray, preprocess_steps):
+    yield None, gray
+    yield from preprocess.variants(gray, preprocess_steps)
+
+
+def detect_symbols(image, accept=match_patterns, preprocess_steps=None):
+    """All symbols on one RGB or grayscale page image.
+
+    The plain page is scanned first, then the preprocessed variants until one of them
+    yields a symbol ``accept`` takes. Rects are in ``image`` pixels; ``None`` for symbols
+    only found on a rotated or warped variant. ``preprocess_steps=()`` skips preprocessing.
+    """
+    gray = to_small_gray(image)
+    scale = image.shape[1] / gray.shape[1]
+    symbols = []
+    for step, variant in _with_variants(gray, preprocess_steps):
+        # DataMatrix chậm: chỉ quét trên ảnh gốc
+        found = scan(variant, accept, datamatrix=step is None)
+        if variant.shape == gray.shape:
+            factor = 1.0
+        elif step == preprocess.STEP_SCALE:
+            factor = variant.shape[1] / gray.shape[1]
+        else:
+            factor = None
+        for item in found:
+            item["rect"] = None if factor is None else [round(v * scale / factor) for v in item["rect"]]
+            if step is not None:
+                item["tier"] = f"{item['tier']}+{step}"
+        _merge(symbols, found)
+        if any(accept(item["value"]) for item in symbols):
+            break
+    return symbols
+
+
+def pick(symbols, accept=match_patterns, prefer=(SYMBOLOGY_QR,)):
+    """The symbol that names the file: accepted ones only, types in ``prefer`` first, then reading order."""
+    candidates = [item for item in symbols if item["value"] and accept(item["value"])]
+    if not candidates:
+        return None
+
+    def order(item):
+        left, top = (item["rect"] or [0, 0])[:2]
+        return prefer.index(item["type"]) if item["type"] in prefer else len(prefer), top, left
+
+    return min(candidates, key=order)
+
+
+def decode_pages(images, accept=match_patterns, use_model=True, preprocess_steps=None, prefer=(SYMBOLOGY_QR,)):
+    """Detect every symbol on each page image (RGB or grayscale).
+
+    Returns ``{"value", "tier", "symbols"}`` per image: the picked value (``None`` when no
+    accepted symbol) and the tier that read it (``"none"`` then).
+    """
+    results = []
+    for image in images:
+        symbols = detect_symbols(image, accept, preprocess_steps)
+        chosen = pick(symbols, accept, prefer)
+        results.append({
+            "value": chosen["value"] if chosen else None,
+            "tier": chosen["tier"] if chosen else TIER_NONE,
+            "symbols": symbols,
+        })
+
+    misses = [i for i, result in enumerate(results) if result["value"] is None]
+    if misses and use_model:
+        # ảnh nhúng của trang scan có thể là ảnh xám dù không yêu cầu gray
+        decoded = qr_model.detect_and_decode_batch([
+            cv2.cvtColor(images[i], cv2.COLOR_GRAY2RGB) if images[i].ndim == 2 else images[i] for i in misses
+        ])
+        for i, values in zip(misses, decoded):
+            value = next((value for value in values if accept(value)), None)
+            if value:
+                results[i]["symbols"].append(symbol(value, SYMBOLOGY_QR, None, TIER_QREADER))
+                results[i].update(value=value, tier=TIER_QREADER)
+
+    for result in results:
+        if "+" in result["tier"]:
+            tier, step = result["tier"].split("+", 1)
+            metrics.registry.inc("preprocess_recovered_total", step=step, tier=tier)
+    return results
+
+
+def result_rows(symbols, value, output, page=1):
+    """One result row per symbol; the output goes to the symbol that named the file."""
+    rows, named = [], False
+    for item in symbols:
+        names_file = not named and bool(value) and item["value"] == value
+        named = named or names_file
+        rows.append({
+            "value": item["value"],
+            "page": page,
+            "symbology": item["type"],
+            "bbox": item["rect"],
+            "decoder": item["tier"],
+            "output": output if names_file else "",
+        })
+    if not named:
+        rows.append({"value": value, "page": page if value else None, "output": output})
+    return rows
+
+
+def hit_rates(tiers):
+    """Share of pages resolved by each tier, from a ``{tier: count}`` dict."""
+    total = sum(tiers.values())
+    if not total:
+        return {}
+    return {tier: round(count / total, 4) for tier, count in tiers.items()}
@@ -0,0 +1,49 @@
+"""Job progress events.
+
+The dispatcher records events as ``JobEvent`` rows; ``app.ws`` streams them to WebSocket
+clients. Going through the DB lets any uvicorn worker serve the socket, whichever process
+runs the job.
+"""
+
+import os
+
+from django.db.models import Q
+
+from .models import JobEvent
+
+QUEUED = "queued"
+RENDERING = "rendering"
+DECODED = "decoded"
+RENAMED = "renamed"
+FAILED = "failed"
+DONE = "done"
+
+
+def build(job, event, path="", page=None, value="", **detail):
+    return JobEvent(
+        job_id=job.id,
+        session_id=job.session_id,
+        event=event,
+        file=os.path.basename(path or ""),
+        page=page,
+        value=(value or "")[:255],
+        detail=detail,
+    )
+
+
+def emit(job, event, path="", page=None, value="", **detail):
+    return build(job, event, path, page, value, **detail).save()
+
+
+def emit_many(events):
+    if events:
+        JobEvent.objects.bulk_create(events)
+
+
+def since_many(cursors, limit=500):
+    """``(session_id, event)`` of the events newer than ``cursors[session_id]`` for every session, oldest first."""
+    query = Q()
+    for session_id, after_id in cursors.items():
+        query |= Q(session_id=session_id, id__gt=after_id)
+    events = JobEvent.objects.filter(query).order_by("id")[:limit]
+    return [(event.session_id, event.to_dict()) for event in events]
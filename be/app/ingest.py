@@ -0,0 +1,369 @@
+"""Watch-folder ingestion from ``settings.DATA_SRC_PATH``.
+
+``manage.py ingest`` turns PDFs dropped under DATA_SRC_PATH (scanner shares, rsync
+targets) into upload sessions without going through the browser:
+
+- new files are found with inotify (``watchdog``, optional) and, as a fallback or when
+  ``INGEST_WATCHER=polling`` (network shares do not deliver inotify events), by rescanning
+  every INGEST_POLL_INTERVAL seconds. With inotify a rescan still runs every
+  INGEST_RESCAN_INTERVAL seconds in case the kernel event queue overflowed.
+- a rescan only lists directories whose mtime changed since their :class:`IngestCheckpoint`;
+  the others are walked through their stored subdirectories, so a restart over millions
+  of already ingested files costs one ``stat`` per directory.
+- a file is taken once its mtime is INGEST_SETTLE seconds old. Files whose path, size and
+  mtime match their :class:`IngestedFile` row are skipped without reading them; the others
+  are hashed and skipped as duplicates when the same content was ingested before.
+- new files are grouped by directory into sessions of at most INGEST_SESSION_SIZE files,
+  placed under ``uploads/`` (hard link / reflink / copy, see ``app.writer``) and queued for
+  every ``INGEST_PIPELINES`` entry. New sessions wait while INGEST_MAX_JOBS ingestion jobs
+  are queued or running, or the job queue is over its admission limits, so a large drop
+  does not flood the dispatcher.
+
+Sources are never modified or removed; the janitor expires ingestion sessions like
+uploaded ones and the ``IngestedFile`` rows keep the sources from being ingested again.
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from loguru import logger
+
+from . import jobs, metrics, result_cache, scheduler, writer
+from .models import File, IngestCheckpoint, IngestedFile, Job, upload_to_session
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog là tuỳ chọn: không có thì quét định kỳ
+    FileSystemEventHandler = object
+    Observer = None
+
+SESSION_PREFIX = "ingest-"
+LOOKUP_BATCH = 500
+ACTIVE = (Job.Status.QUEUED, Job.Status.RUNNING)
+
+
+def is_candidate(name):
+    # file đang copy nên ghi dưới tên ẩn / khác .pdf rồi đổi tên khi xong
+    return not name.startswith(".") and name.lower().endswith(".pdf")
+
+
+def pipelines():
+    """``[(kind, action)]`` from ``settings.INGEST_PIPELINES``; the action defaults to the kind."""
+    result = []
+    for entry in settings.INGEST_PIPELINES:
+        kind, _, action = entry.partition(":")
+        kind = kind.strip()
+        if kind not in Job.KINDS:
+            raise RuntimeError(f"INGEST_PIPELINES: unknown job kind {kind!r}")
+        result.append((kind, action.strip() or kind))
+    return result
+
+
+def active_jobs():
+    return Job.objects.filter(session_id__startswith=SESSION_PREFIX, status__in=ACTIVE).count()
+
+
+def new_session_id():
+    return f"{SESSION_PREFIX}{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+class _Handler(FileSystemEventHandler):
+    def __init__(self, ingester):
+        self.ingester = ingester
+
+    def on_any_event(self, event):
+        if event.event_type in ("opened", "closed_no_write", "deleted"):
+            return
+        self.ingester.notify(getattr(event, "dest_path", "") or event.src_path, event.is_directory)
+
+
+class Ingester:
+    """Finds new PDFs under ``root`` and queues them as sessions."""
+
+    def __init__(self, root=None):
+        if not (root or settings.DATA_SRC_PATH):
+            raise RuntimeError("DATA_SRC_PATH is not set")
+        self.root = os.path.abspath(root or settings.DATA_SRC_PATH)
+        self.pipelines = pipelines()
+        self.pending = {}  # đường dẫn tương đối -> thư mục chứa, file chưa xử lý xong
+        self.listings = {}  # thư mục đã liệt kê -> (mtime_ns, subdirs), chờ ghi checkpoint
+        self.observer = None
+        self._events = set()
+        self._rescan = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=max(settings.INGEST_WORKERS, 1), thread_name_prefix="ingest")
+
+    def relative(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def notify(self, path, is_directory=False):
+        """Called from the watchdog thread for a created / modified / moved path."""
+        rel = self.relative(path)
+        if rel.startswith("..") or any(part.startswith(".") for part in rel.split(os.sep) if part != "."):
+            return
+        with self._lock:
+            if is_directory:
+                # thư mục được move vào có thể đã chứa sẵn file
+                self._rescan.add("" if rel == "." else rel)
+            elif is_candidate(os.path.basename(rel)):
+                self._events.add(rel)
+        self._wake.set()
+
+    def start_watcher(self):
+        if settings.INGEST_WATCHER == "polling" or Observer is None:
+            return None
+        try:
+            observer = Observer()
+            observer.schedule(_Handler(self), self.root, recursive=True)
+            observer.start()
+        except OSError as e:  # hết inotify watches, filesystem không hỗ trợ...
+            logger.info(f"------------ Ingest: inotify unavailable ({e}), polling every {settings.INGEST_POLL_INTERVAL}s")
+            return None
+        self.observer = observer
+        return observer
+
+    def walk(self, top=""):
+        """List the directories under ``top`` changed since their checkpoint; returns how many were listed."""
+        checkpoints = {row.path: (row.mtime_ns, row.subdirs) for row in IngestCheckpoint.objects.all()}
+        stack, listed = [top], 0
+        while stack:
+            rel = stack.pop()
+            full = os.path.join(self.root, rel)
+            try:
+                mtime_ns = os.stat(full).st_mtime_ns
+            except OSError:
+                continue
+            checkpoint = checkpoints.get(rel)
+            if checkpoint is not None and checkpoint[0] == mtime_ns:
+                stack.extend(checkpoint[1])
+                continue
+
+            subdirs = []
+            try:
+                with os.scandir(full) as entries:
+                    for entry in entries:
+                        if entry.name.startswith("."):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(os.path.join(rel, entry.name))
+                        elif is_candidate(entry.name) and entry.is_file():
+                            self.pending[os.path.join(rel, entry.name)] = rel
+            except OSError as e:
+                logger.info(f"------------ Ingest: cannot list {full}: {e}")
+                continue
+            listed += 1
+            self.listings[rel] = (mtime_ns, subdirs)
+            stack.extend(subdirs)
+        return listed
+
+    def checkpoint(self):
+        """Store the listings whose files were all handled."""
+        busy = set(self.pending.values())
+        done = [rel for rel in self.listings if rel not in busy]
+        if not done:
+            return
+        with transaction.atomic():
+            for rel in done:
+                mtime_ns, subdirs = self.listings.pop(rel)
+                IngestCheckpoint.objects.update_or_create(path=rel, defaults={"mtime_ns": mtime_ns, "subdirs": subdirs})
+
+    def drain_events(self):
+        with self._lock:
+            files, dirs = self._events, self._rescan
+            self._events, self._rescan = set(), set()
+        for rel in dirs:
+            self.walk(rel)
+        for rel in files:
+            self.pending[rel] = os.path.dirname(rel)
+
+    def ready(self, limit):
+        """Up to ``limit`` ``(rel, stat, row)`` of pending files to ingest now, in path order.
+
+        Pending files whose row matches their size and mtime are dropped on the way.
+        """
+        rels, now, ready = sorted(self.pending), time.time(), []
+        for i in range(0, len(rels), LOOKUP_BATCH):
+            chunk = rels[i:i + LOOKUP_BATCH]
+            known = {row.path: row for row in IngestedFile.objects.filter(path__in=chunk)}
+            for rel in chunk:
+                try:
+                    stat = os.stat(os.path.join(self.root, rel))
+                except FileNotFoundError:
+                    self.pending.pop(rel)
+                    continue
+                row = known.get(rel)
+                if row is not None and row.size == stat.st_size and row.mtime_ns == stat.st_mtime_ns:
+                    self.pending.pop(rel)
+                    continue
+                if now - stat.st_mtime < settings.INGEST_SETTLE:
+                    continue  # có thể vẫn đang được ghi
+                ready.append((rel, stat, row))
+                if len(ready) >= limit:
+                    return ready
+        return ready
+
+    def _hash(self, rel):
+        try:
+            return result_cache.file_sha256(os.path.join(self.root, rel)), ""
+        except OSError as e:
+            return "", str(e)
+
+    def _place(self, rel, session_id):
+        name = upload_to_session(File(session_id=session_id), os.path.basename(rel))
+        folder = os.path.dirname(default_storage.path(name))
+        os.makedirs(folder, exist_ok=True)
+        # tạo file độc quyền: hai file cùng tên trong một session thành "name (1).pdf" thay vì đè nhau
+        path = writer.place_unique(os.path.join(self.root, rel), folder, os.path.basename(name))
+        return os.path.relpath(path, settings.MEDIA_ROOT)
+
+    def process(self):
+        """Ingest the settled pending files, as many sessions as the job budget allows.
+
+        Returns ``{status: files}``, ``unchanged`` counting files only touched since their ingestion.
+        """
+        report = {}
+        if not self.pending:
+            return report
+        budget = max(settings.INGEST_MAX_JOBS, len(self.pipelines)) - active_jobs()
+        room = budget // len(self.pipelines)
+        if room <= 0 or scheduler.overloaded() is not None:
+            return report  # chờ các job ingest đang chạy xong bớt / hàng đợi chung bớt tải
+        size = max(settings.INGEST_SESSION_SIZE, 1)
+        ready = self.ready(room * size)
+        if not ready:
+            return report
+
+        # gom theo thư mục, mỗi session tối đa INGEST_SESSION_SIZE file
+        groups = []
+        for rel, stat, row in ready:
+            folder = os.path.dirname(rel)
+            if not groups or groups[-1][0] != folder or len(groups[-1][1]) >= size:
+                if len(groups) == room:
+                    break
+                groups.append((folder, []))
+            groups[-1][1].append((rel, stat, row))
+        batch = [item for _, items in groups for item in items]
+
+        hashes = dict(zip((rel for rel, _, _ in batch), self._pool.map(self._hash, (rel for rel, _, _ in batch))))
+        seen = set(
+            IngestedFile.objects.filter(sha256__in=[sha256 for sha256, _ in hashes.values() if sha256], status=IngestedFile.STATUS_INGESTED)
+            .values_list("sha256", flat=True)
+        )
+
+        rows, touched, sessions = [], [], []
+        for _, items in groups:
+            session_id, fresh = new_session_id(), []
+            for rel, stat, row in items:
+                sha256, error = hashes[rel]
+                row = row or IngestedFile(path=rel)
+                # chỉ mtime đổi (touch, copy lại cùng nội dung): cập nhật row, không ingest lại
+                unchanged = row.pk is not None and row.sha256 == sha256 and not error
+                row.size, row.mtime_ns, row.sha256, row.error = stat.st_size, stat.st_mtime_ns, sha256, error
+                if unchanged:
+                    touched.append(row)
+                    continue
+                if error:
+                    row.status = IngestedFile.STATUS_FAILED
+                elif sha256 in seen:
+                    row.status = IngestedFile.STATUS_DUPLICATE
+                else:
+                    row.status, row.session_id = IngestedFile.STATUS_INGESTED, session_id
+                    seen.add(sha256)
+                    fresh.append(row)
+                rows.append(row)
+            if fresh:
+                sessions.append((session_id, fresh))
+
+        # copy / hard link trước, ngoài transaction: không giữ write lock của DB trong lúc chép cả lô.
+        # Lỗi giữa chừng để lại thư mục session không có row nào, janitor dọn như session bỏ dở.
+        placed = [
+            (session_id, fresh, list(self._pool.map(lambda row, session_id=session_id: self._place(row.path, session_id), fresh)))
+            for session_id, fresh in sessions
+        ]
+        with transaction.atomic():
+            for session_id, fresh, names in placed:
+                files = File.objects.bulk_create([
+                    File(
+                        session_id=session_id,
+                        file=name,
+                        original_name=os.path.basename(row.path),
+                        size=row.size,
+                        content_type="application/pdf",
+                        sha256=row.sha256,
+                    )
+                    for row, name in zip(fresh, names)
+                ])
+                for row, file in zip(fresh, files):
+                    row.file = file
+            for row in rows + touched:
+                row.save()
+            for session_id, fresh in sessions:
+                for kind, action in self.pipelines:
+                    jobs.enqueue(session_id, kind, action, admit=False)
+
+        for row in touched:
+            self.pending.pop(row.path, None)
+        if touched:
+            report["unchanged"] = len(touched)
+        for row in rows:
+            self.pending.pop(row.path, None)
+            report[row.status] = report.get(row.status, 0) + 1
+            metrics.registry.inc("ingest_files_total", status=row.status)
+            if row.status == IngestedFile.STATUS_FAILED:
+                logger.info(f"------------ Ingest: {row.path} failed: {row.error}")
+        metrics.registry.flush()
+        for session_id, fresh in sessions:
+            logger.info(f"------------ Ingest: session {session_id} with {len(fresh)} file(s) queued for {self.pipelines}")
+        return report
+
+    def run_once(self):
+        """Scan, ingest everything settled and checkpoint; returns ``{status: files}``."""
+        self.walk()
+        report = {}
+        while True:
+            step = self.process()
+            for status, count in step.items():
+                report[status] = report.get(status, 0) + count
+            if not step:
+                break
+        self.checkpoint()
+        return report
+
+    def serve_forever(self):
+        os.makedirs(self.root, exist_ok=True)
+        watching = self.start_watcher() is not None
+        interval = settings.INGEST_RESCAN_INTERVAL if watching else settings.INGEST_POLL_INTERVAL
+        logger.info(f"------------ Ingest started on {self.root} ({'inotify' if watching else 'polling'}), pipelines {self.pipelines}")
+        next_scan = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_scan:
+                    listed = self.walk()
+                    logger.info(f"------------ Ingest: rescan listed {listed} changed folder(s), {len(self.pending)} file(s) pending")
+                    next_scan = time.monotonic() + interval if interval else float("inf")
+                self.drain_events()
+                self.process()
+                self.checkpoint()
+            except Exception as e:
+                logger.exception(f"Ingest error: {e}")
+            finally:
+                close_old_connections()
+            # còn file chờ đủ INGEST_SETTLE / chờ job chạy bớt: kiểm tra lại sau 1s
+            timeout = 1.0 if self.pending else min(max(next_scan - time.monotonic(), 0.0), 60.0)
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join(timeout=5)
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,233 @@
+"""Session expiry and storage garbage collection.
+
+A session owns its uploads (``uploads/YYYY/MM/DD/<session>``), the folders the actions
+derive from them (``<action>/YYYY/MM/DD/<session>``), legacy ``<session>.zip`` files and
+its DB rows (File, Upload, Job, with their results and events). The janitor removes all
+of it, in batches and off the request path, when
+
+- the session was scheduled to expire with :func:`expire` (a finished download, after
+  SESSION_DOWNLOAD_GRACE so the archive can still be resumed or fetched again),
+- nothing happened in the session for SESSION_TTL seconds,
+- session storage is over MEDIA_QUOTA bytes: least recently active sessions go first.
+
+Folders without any DB row left are sessions too, last active at their mtime. Sessions
+with a queued or running job are never removed, checked again for each session right before
+it is deleted; quota eviction also spares sessions active within JANITOR_MIN_AGE seconds.
+
+Runs as a thread next to the job dispatcher (``manage.py run_workers``, or inside the web
+process when the dispatcher is embedded), or once, e.g. from cron, with ``manage.py janitor``.
+"""
+
+import glob
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Max
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from loguru import logger
+
+from . import metrics
+from .models import File, Job, SessionExpiry, Upload
+
+ACTIVE = (Job.Status.QUEUED, Job.Status.RUNNING)
+
+
+def expire(session_id, delay, reason=""):
+    """Schedule ``session_id`` for removal ``delay`` seconds from now."""
+    SessionExpiry.objects.update_or_create(
+        session_id=session_id,
+        defaults={"expires_at": timezone.now() + timedelta(seconds=delay), "reason": reason},
+    )
+    if settings.JOB_DISPATCHER_EMBEDDED:
+        janitor.start()
+
+
+def session_folders():
+    """``{session_id: [folder, ...]}`` for every ``<top>/YYYY/MM/DD/<session>`` under MEDIA_ROOT."""
+    folders = {}
+    if not os.path.isdir(settings.MEDIA_ROOT):
+        return folders
+    for top in os.scandir(settings.MEDIA_ROOT):
+        # .cache (decode cache, metrics) không thuộc session nào
+        if not top.is_dir() or top.name.startswith("."):
+            continue
+        for path in glob.glob(os.path.join(top.path, "[0-9]" * 4, "[0-9]" * 2, "[0-9]" * 2, "*")):
+            if os.path.isdir(path):
+                folders.setdefault(os.path.basename(path), []).append(path)
+    return folders
+
+
+def folder_usage(folders, seen):
+    """``(bytes, latest mtime)`` of ``folders``; inodes in ``seen`` (hard links) count once."""
+    size, mtime = 0, 0.0
+    for folder in folders:
+        for root, dirs, names in os.walk(folder):
+            try:
+                mtime = max(mtime, os.stat(root).st_mtime)
+            except FileNotFoundError:
+                continue
+            for name in names:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                mtime = max(mtime, stat.st_mtime)
+                if (stat.st_dev, stat.st_ino) not in seen:
+                    seen.add((stat.st_dev, stat.st_ino))
+                    size += stat.st_size
+    return size, mtime
+
+
+def last_activity():
+    """``{session_id: datetime}`` of the latest upload or job of every session in the DB."""
+    activity = {}
+    for rows in (
+        File.objects.values("session_id").annotate(last=Max("created_at")),
+        Upload.objects.values("session_id").annotate(last=Max("updated_at")),
+        Job.objects.values("session_id").annotate(last=Max(Coalesce("finished_at", "created_at"))),
+    ):
+        for row in rows:
+            if row["last"] is not None and (row["session_id"] not in activity or row["last"] > activity[row["session_id"]]):
+                activity[row["session_id"]] = row["last"]
+    return activity
+
+
+def busy(session_id, since):
+    """Whether ``session_id`` has a queued or running job, or got an upload after ``since``."""
+    return (
+        Job.objects.filter(session_id=session_id, status__in=ACTIVE).exists()
+        or File.objects.filter(session_id=session_id, created_at__gt=since).exists()
+        or Upload.objects.filter(session_id=session_id, updated_at__gt=since).exists()
+    )
+
+
+def purge(session_ids, folders, since=None):
+    """Remove the folders, legacy ZIPs and DB rows of ``session_ids``; returns ``(bytes freed, sessions removed)``.
+
+    Each session is checked again right before it goes: one that got a job (process on
+    arrival) or an upload since ``since``, the time it was selected, is kept.
+    """
+    since = since or timezone.now()
+    freed, removed, seen = 0, [], set()
+    for session_id in session_ids:
+        # SQLite (IMMEDIATE): transaction giữ write lock từ lúc kiểm tra, không upload / job nào chen vào được
+        with transaction.atomic():
+            if busy(session_id, since):
+                logger.info(f"------------ Janitor: {session_id} became active, kept")
+                continue
+            for folder in folders.get(session_id, []):
+                freed += folder_usage([folder], seen)[0]
+                shutil.rmtree(folder, ignore_errors=True)
+            # bản cũ tạo <session>.zip trên đĩa trước khi trả về
+            for base in (settings.BASE_DIR, settings.MEDIA_ROOT):
+                zip_path = os.path.join(base, f"{session_id}.zip")
+                if os.path.exists(zip_path):
+                    freed += os.path.getsize(zip_path)
+                    os.remove(zip_path)
+            File.objects.filter(session_id=session_id).delete()
+            Upload.objects.filter(session_id=session_id).delete()
+            Job.objects.filter(session_id=session_id).delete()
+            SessionExpiry.objects.filter(session_id=session_id).delete()
+        removed.append(session_id)
+    return freed, removed
+
+
+class Janitor:
+    """Periodically expires sessions and enforces the storage quota."""
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if not settings.JANITOR_INTERVAL:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self.serve_forever, name="janitor", daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        self._wake.set()
+
+    def serve_forever(self):
+        logger.info(f"------------ Janitor started, every {settings.JANITOR_INTERVAL}s")
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.exception(f"Janitor error: {e}")
+            finally:
+                close_old_connections()
+            self._wake.wait(settings.JANITOR_INTERVAL)
+            self._wake.clear()
+
+    def select(self, now, folders):
+        """``{session_id: reason}`` of the sessions to remove now."""
+        activity = last_activity()
+        for session_id, session_dirs in folders.items():
+            if session_id not in activity:
+                mtime = max((os.stat(folder).st_mtime for folder in session_dirs if os.path.exists(folder)), default=0)
+                activity[session_id] = datetime.fromtimestamp(mtime, tz=dt_timezone.utc)
+        protected = set(Job.objects.filter(status__in=ACTIVE).values_list("session_id", flat=True))
+
+        doomed = dict(SessionExpiry.objects.filter(expires_at__lte=now).values_list("session_id", "reason"))
+        if settings.SESSION_TTL:
+            cutoff = now - timedelta(seconds=settings.SESSION_TTL)
+            for session_id, last in activity.items():
+                if last < cutoff:
+                    doomed.setdefault(session_id, "ttl")
+
+        if settings.MEDIA_QUOTA:
+            seen = set()
+            usage = {session_id: folder_usage(session_dirs, seen)[0] for session_id, session_dirs in folders.items()}
+            remaining = sum(size for session_id, size in usage.items() if session_id not in doomed or session_id in protected)
+            recent = now - timedelta(seconds=settings.JANITOR_MIN_AGE)
+            for session_id, last in sorted(activity.items(), key=lambda item: item[1]):
+                if remaining <= settings.MEDIA_QUOTA:
+                    break
+                if session_id in doomed or session_id in protected or last > recent:
+                    continue
+                doomed[session_id] = "quota"
+                remaining -= usage.get(session_id, 0)
+            if remaining > settings.MEDIA_QUOTA:
+                logger.info(f"------------ Janitor: storage still over quota ({remaining} > {settings.MEDIA_QUOTA} bytes)")
+
+        return {session_id: reason or "expired" for session_id, reason in doomed.items() if session_id not in protected}
+
+    def run_once(self, dry_run=False):
+        """One pass; returns ``{reason: sessions}`` plus the bytes freed."""
+        folders = session_folders()
+        now = timezone.now()
+        doomed = self.select(now, folders)
+        report = {"bytes": 0}
+        for reason in doomed.values():
+            report[reason] = report.get(reason, 0) + 1
+        if dry_run or not doomed:
+            return report
+
+        session_ids = sorted(doomed)
+        kept = 0
+        for i in range(0, len(session_ids), settings.JANITOR_BATCH):
+            batch = session_ids[i:i + settings.JANITOR_BATCH]
+            freed, removed = purge(batch, folders, since=now)
+            report["bytes"] += freed
+            metrics.registry.inc("janitor_bytes_total", freed)
+            for session_id in set(batch) - set(removed):
+                report[doomed[session_id]] -= 1
+                kept += 1
+            for session_id in removed:
+                metrics.registry.inc("janitor_sessions_total", reason=doomed[session_id])
+        metrics.registry.flush()
+        logger.info(f"------------ Janitor removed {len(session_ids) - kept} sessions, {report['bytes']} bytes: {report}")
+        return report
+
+
+janitor = Janitor()
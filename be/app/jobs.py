@@ -0,0 +1,693 @@
+"""Background job queue for the processing endpoints.
+
+``QrCode.start``, ``BarCode.start`` and ``AiDoc.pdf2layer`` only create a :class:`Job`
+row and return its id. A dispatcher thread claims queued jobs from the DB and fans the
+files of the session out over a process pool sized to the CPU count; several jobs run at
+once and share the pool fairly between sessions (see ``app.scheduler``). Progress is
+written back to the ``Job`` row so the FE can poll ``GET /app/jobs/<id>/``.
+"""
+
+import contextlib
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from loguru import logger
+
+from . import aidoc, decoders, events, janitor, metrics, render, scheduler, stats, worker
+from .models import File, FileResult, Job, WorkerStatus
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def run_files(kind, items, action):
+    """Process a chunk of files of a job. Runs inside a worker process.
+
+    ``items`` are ``(path, sha256)`` pairs. Returns ``(path, error, info)`` for every file,
+    ``error`` being ``None`` on success and ``info`` a small dict of pipeline details
+    (e.g. the decoder tier, stage timings) merged into ``Job.stats``.
+    """
+    try:
+        results = _run_files(kind, items, action)
+    except Exception:
+        for path_file, _ in items:
+            metrics.pop_timings(path_file)
+        raise
+    finally:
+        metrics.registry.flush()
+    for path_file, _, info in results:
+        info["timings"] = metrics.pop_timings(path_file)
+    return results
+
+
+def _run_files(kind, items, action):
+    from . import views
+
+    if kind == Job.KIND_QRCODE:
+        # cả chunk đi chung một lần inference của model
+        paths = [path for path, _ in items]
+        infos = views.QrCode().convert_batch(paths, action, [sha256 for _, sha256 in items])
+        return [(path, None, info) for path, info in zip(paths, infos)]
+
+    results = []
+    for path_file, sha256 in items:
+        try:
+            if kind == Job.KIND_BARCODE:
+                info = views.BarCode.convert_pdfs(path_file, action, sha256)
+            elif kind == Job.KIND_PDF2LAYER:
+                info = {"outputs": [views.AiDoc.pdf2layer_file(path_file, action)]}
+                with contextlib.suppress(Exception):
+                    info["pages"] = count_pages(path_file)
+            else:
+                raise ValueError(f"Unknown job kind: {kind}")
+            results.append((path_file, None, info))
+        except Exception as e:
+            results.append((path_file, str(e), {}))
+    return results
+
+
+def count_pages(path_file):
+    return render.page_count(path_file)
+
+
+def scan_page(path_file, page_number, action):
+    """``(value, tier, timings)`` of one page for the split action. Runs inside a worker process."""
+    from . import views
+
+    try:
+        value, tier = views.Split.scan_page(path_file, page_number, action)
+    except Exception:
+        metrics.pop_timings(path_file)
+        raise
+    finally:
+        metrics.registry.flush()
+    return value, tier, metrics.pop_timings(path_file)
+
+
+def split_file(path_file, action, codes):
+    """Write the segments of one PDF for the split action; returns ``(segments, timings)``.
+
+    Runs inside a worker process.
+    """
+    from . import views
+
+    try:
+        segments = views.Split.write_segments(path_file, action, codes)
+    except Exception:
+        metrics.pop_timings(path_file)
+        raise
+    finally:
+        metrics.registry.flush()
+    return segments, metrics.pop_timings(path_file)
+
+
+class Progress:
+    """Per-job counters, flushed to the ``Job`` row as results come in."""
+
+    def __init__(self, job, file_ids=None, file_sizes=None):
+        self.job = job
+        self.file_ids = file_ids or {}
+        self.file_sizes = file_sizes or {}
+        self.rollup = stats.Rollup(job.kind, job.action)
+        self.outcomes = {}
+        self.processed = 0
+        self.failed = 0
+        self.pages = 0
+        self.segments = 0
+        self.tiers = {}
+        self.events = []
+        self.skipped = 0
+        self.timings = {}
+        self.file_timings = {}
+        self.finished_files = []
+        self.results = []
+
+    def add_timings(self, path_file, timings):
+        metrics.merge_timings(self.timings, timings)
+        metrics.merge_timings(self.file_timings.setdefault(path_file, {}), timings)
+
+    def count_tier(self, tier):
+        self.tiers[tier] = self.tiers.get(tier, 0) + 1
+        metrics.registry.inc("decode_tier_total", kind=self.job.kind, tier=tier)
+
+    def event(self, event, path_file="", page=None, value="", **detail):
+        self.events.append(events.build(self.job, event, path_file, page, value, **detail))
+
+    def file_done(self, path_file, error=None, info=None):
+        info = info or {}
+        self.add_timings(path_file, info.get("timings", {}))
+        if error is None and info.get("tier") == decoders.TIER_ERROR:
+            # không render được trang: không lưu như "đã xong" để lần sau còn chạy lại
+            result_error = "render failed"
+        else:
+            result_error = error
+        self.finished_files.append((path_file, result_error is None))
+        # qrcode / barcode chỉ đọc trang đầu; split và pdf2layer báo số trang trong info
+        self.outcomes[path_file] = (stats.outcome(self.job.kind, result_error, info), info.get("pages", 0 if error else 1))
+        self.add_results(path_file, result_error, info)
+        metrics.registry.inc("files_total", kind=self.job.kind, status="done" if error is None else "failed")
+        if error is None:
+            self.processed += 1
+            if info.get("value") is not None and "segments" not in info:
+                self.event(events.DECODED, path_file, value=info["value"], tier=info.get("tier", ""))
+            outputs = [os.path.basename(output) for output in info.get("outputs", [])]
+            self.event(events.RENAMED, path_file, value=info.get("value") or "", outputs=outputs)
+        else:
+            self.failed += 1
+            logger.info(f"------------ Job {self.job.id} failed on {path_file}: {error}")
+            self.event(events.FAILED, path_file, error=error)
+        if "tier" in info:
+            self.count_tier(info["tier"])
+        self.segments += info.get("segments", 0)
+
+    def add_results(self, path_file, error, info):
+        if path_file not in self.file_ids:
+            return
+        rows = info.get("results") or [
+            {"value": info.get("value"), "page": info.get("page"), "output": output}
+            for output in info.get("outputs") or [""]
+        ]
+        for row in rows:
+            output = row.get("output") or ""
+            self.results.append(FileResult(
+                file_id=self.file_ids[path_file],
+                job_id=self.job.id,
+                kind=self.job.kind,
+                action=self.job.action,
+                value=(row.get("value") or "")[:255],
+                decoder=row.get("decoder") or info.get("tier") or ("" if error is None else decoders.TIER_ERROR),
+                symbology=row.get("symbology") or "",
+                bbox=row.get("bbox"),
+                confidence=row.get("confidence"),
+                page=row.get("page"),
+                output=os.path.relpath(output, settings.MEDIA_ROOT) if output else "",
+                error=error or "",
+            ))
+
+    def page_done(self, path_file, page_number, value, tier, timings=None):
+        self.pages += 1
+        self.count_tier(tier)
+        self.add_timings(path_file, timings or {})
+        metrics.registry.inc("pages_total", kind=self.job.kind)
+        self.event(events.DECODED, path_file, page=page_number, value=value, tier=tier)
+
+    def stats(self):
+        stats = {}
+        if self.tiers:
+            stats.update(tiers=self.tiers, hitRates=decoders.hit_rates(self.tiers))
+        if self.pages:
+            stats.update(pages=self.pages, segments=self.segments)
+        if self.skipped:
+            stats.update(skipped=self.skipped)
+        if self.timings:
+            stats.update(timings=self.timings)
+        return stats
+
+    def save(self):
+        done, failed = [], []
+        for path_file, ok in self.finished_files:
+            stages = self.file_timings.pop(path_file, {})
+            outcome, pages = self.outcomes.pop(path_file)
+            self.rollup.add(outcome, pages, self.file_sizes.get(path_file, 0), sum(stages.values()))
+            if path_file in self.file_ids:
+                timings = {"job": self.job.id, "kind": self.job.kind, "stages": stages, "total": round(sum(stages.values()), 4)}
+                (done if ok else failed).append(File(id=self.file_ids[path_file], timings=timings, is_processed=True))
+
+        # một transaction cho cả lượt ghi: giữ write lock (SQLite) một lần thay vì mỗi câu lệnh một lần
+        with transaction.atomic():
+            Job.objects.filter(pk=self.job.pk).update(processed=self.processed, failed=self.failed, stats=self.stats())
+            events.emit_many(self.events)
+            File.objects.bulk_update(done, ["timings", "is_processed"])
+            File.objects.bulk_update(failed, ["timings"])
+            FileResult.objects.bulk_create(self.results)
+            self.rollup.flush()
+        self.events = []
+        self.finished_files = []
+        self.results = []
+        metrics.registry.flush()
+
+
+def chunk_size(kind):
+    if kind == Job.KIND_QRCODE:
+        return max(settings.QREADER_BATCH_SIZE, 1)
+    return 1
+
+
+class Run:
+    """A claimed job in progress: its tasks, the callbacks handling their results and its slots."""
+
+    def __init__(self, job, progress):
+        self.job = job
+        self.progress = progress
+        self.tasks = iter(())
+        self.on_result = None
+        self.on_submit = None
+        self.followups = deque()
+        self.peeked = None
+        self.exhausted = False
+        self.in_flight = 0
+        self.failed = False
+
+    def ready(self):
+        """Whether a task can be submitted now; pulls the next one from ``tasks`` if needed."""
+        if self.followups or self.peeked is not None:
+            return True
+        if not self.exhausted:
+            self.peeked = next(self.tasks, None)
+            self.exhausted = self.peeked is None
+        return self.peeked is not None
+
+    def next_task(self):
+        # task nối tiếp (vd. cắt file sau khi quét đủ trang) chạy trước task mới
+        if self.followups:
+            return self.followups.popleft()
+        task, self.peeked = self.peeked, None
+        return task
+
+
+class Dispatcher:
+    """Claims queued jobs and runs their files on a shared process pool.
+
+    Up to JOB_MAX_RUNNING jobs run at once; their tasks share the executors' windows
+    through a :class:`scheduler.FairQueue`, all from the dispatcher thread. Claimed jobs are
+    leased: the dispatcher keeps ``Job.heartbeat_at`` fresh, and any dispatcher puts back
+    the running jobs whose lease expired, whichever host claimed them.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or settings.JOB_WORKERS
+        self.name = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pool = None
+        self.runs = []
+        self.pending = {}
+        self.in_flight = {}
+        self.fair = scheduler.FairQueue()
+        self._next_claim = 0.0
+        self._next_heartbeat = 0.0
+
+    @staticmethod
+    def lane(kind):
+        return "aidoc" if kind == Job.KIND_PDF2LAYER else "pool"
+
+    def executor(self, kind):
+        # pdf2layer chỉ chờ mạng: chạy trên thread pool giới hạn của AiDocClient thay vì process pool
+        if kind == Job.KIND_PDF2LAYER:
+            return aidoc.get_client().executor
+        return self.pool
+
+    def window(self, kind):
+        if kind == Job.KIND_PDF2LAYER:
+            return aidoc.get_client().concurrency * 2
+        return self.workers * 2
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            # spawn: không fork tiến trình đang chạy event loop / thread của uvicorn
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=worker.init,
+            )
+        return self._pool
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self.serve_forever, name="job-dispatcher", daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        self._wake.set()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def serve_forever(self):
+        logger.info(f"------------ Job dispatcher {self.name} started with {self.workers} workers")
+        self.requeue_orphans()
+        while True:
+            try:
+                self.step()
+            except Exception as e:
+                logger.exception(f"Job dispatcher error: {e}")
+            finally:
+                close_old_connections()
+
+    def step(self):
+        """Claim new jobs when due, fill the free slots, then handle the tasks that finished."""
+        if self._wake.is_set() or time.monotonic() >= self._next_claim:
+            self._wake.clear()
+            self._next_claim = time.monotonic() + settings.JOB_POLL_INTERVAL
+            while len(self.runs) < settings.JOB_MAX_RUNNING:
+                job = self.claim()
+                if job is None:
+                    break
+                self.begin(job)
+
+        if time.monotonic() >= self._next_heartbeat:
+            self._next_heartbeat = time.monotonic() + settings.JOB_HEARTBEAT_INTERVAL
+            self.heartbeat()
+            self.publish_status()
+            self.requeue_orphans()
+
+        self.fill()
+        if self.pending:
+            # timeout: job mới vẫn được nhận trong lúc các task dài đang chạy
+            done, _ = wait(self.pending, timeout=settings.JOB_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                self.complete(future)
+        self.reap()
+        if not self.pending and not self.runs:
+            self._wake.wait(settings.JOB_POLL_INTERVAL)
+
+    def heartbeat(self):
+        """Renew the lease of the running jobs; drop the runs whose job was taken back meanwhile."""
+        ids = [run.job.id for run in self.runs]
+        if not ids:
+            return
+        owned = set(Job.objects.filter(pk__in=ids, status=Job.Status.RUNNING, worker=self.name).values_list("id", flat=True))
+        Job.objects.filter(pk__in=owned).update(heartbeat_at=timezone.now())
+        for run in list(self.runs):
+            if run.job.id not in owned:
+                # lease đã hết và job đã được trả về hàng đợi: bỏ kết quả, dispatcher khác chạy lại
+                logger.info(f"------------ Job {run.job.id} lease lost, dropping it")
+                run.failed = True
+                self.remove(run)
+
+    def publish_status(self):
+        """Publish this container's memory use for admission control in the web processes."""
+        now = timezone.now()
+        WorkerStatus.objects.update_or_create(
+            name=self.name, defaults={"memory_percent": scheduler.memory_percent(), "heartbeat_at": now}
+        )
+        WorkerStatus.objects.filter(heartbeat_at__lt=now - timedelta(seconds=settings.JOB_LEASE)).delete()
+
+    def orphaned(self, job, cutoff):
+        host, _, rest = job.worker.partition(":")
+        pid = rest.partition(":")[0]
+        if host == socket.gethostname() and pid.isdigit() and (int(pid) == os.getpid() or not _pid_alive(int(pid))):
+            # cùng máy: biết ngay dispatcher đã chết, không cần chờ hết lease
+            return True
+        last = job.heartbeat_at or job.started_at
+        return last is None or last < cutoff
+
+    def requeue_orphans(self):
+        """Put back running jobs whose dispatcher is gone: dead on this host, or lease expired on any host."""
+        cutoff = timezone.now() - timedelta(seconds=settings.JOB_LEASE)
+        running = Job.objects.filter(status=Job.Status.RUNNING).exclude(worker=self.name)
+        for job in running.only("id", "worker", "started_at", "heartbeat_at"):
+            if not self.orphaned(job, cutoff):
+                continue
+            requeued = Job.objects.filter(
+                pk=job.pk, status=Job.Status.RUNNING, worker=job.worker, heartbeat_at=job.heartbeat_at,
+            ).update(status=Job.Status.QUEUED, worker="", heartbeat_at=None)
+            if requeued:
+                logger.info(f"------------ Requeue orphan job {job.id} ({job.worker}, last heartbeat {job.heartbeat_at})")
+
+    def claim(self):
+        queued = Job.objects.filter(status=Job.Status.QUEUED).order_by("created_at", "id")
+        running = Job.objects.filter(status=Job.Status.RUNNING).values_list("session_id", "kind", "action")
+        for job in scheduler.claim_order(queued[:50], list(running)):
+            now = timezone.now()
+            claimed = Job.objects.filter(pk=job.pk, status=Job.Status.QUEUED).update(
+                status=Job.Status.RUNNING,
+                worker=self.name,
+                started_at=now,
+                heartbeat_at=now,
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+        return None
+
+    def begin(self, job):
+        """Start running ``job``: skip the files already done and prepare its tasks."""
+        try:
+            files = list(File.objects.filter(session_id=job.session_id).order_by("id"))
+            # file đã xử lý xong với cùng kind/action thì bỏ qua (start với force=true để chạy lại)
+            done_ids = set(
+                FileResult.objects.filter(file__session_id=job.session_id, kind=job.kind, action=job.action, error="")
+                .values_list("file_id", flat=True)
+            )
+            todo = [file for file in files if file.id not in done_ids]
+            Job.objects.filter(pk=job.pk).update(total=len(files), processed=len(files) - len(todo), failed=0)
+            logger.info(f"------------ Job {job.id} ({job.kind}) started: {len(todo)} file(s), {len(files) - len(todo)} already done")
+
+            paths = {file.id: os.path.join(settings.MEDIA_ROOT, file.file.name) for file in todo}
+            progress = Progress(
+                job,
+                {path_file: file_id for file_id, path_file in paths.items()},
+                {paths[file.id]: file.size for file in todo},
+            )
+            progress.processed = progress.skipped = len(files) - len(todo)
+            if progress.skipped:
+                progress.save()
+            items = [(paths[file.id], file.sha256) for file in todo]
+            run = Run(job, progress)
+            if job.kind == Job.KIND_SPLIT:
+                self.split_tasks(run, items)
+            else:
+                self.chunk_tasks(run, items)
+        except Exception as e:
+            self.finish(job, Job.Status.FAILED, error=str(e))
+            return
+        self.runs.append(run)
+        self.fair.activate(job.session_id)
+
+    def ready(self, run):
+        try:
+            return run.ready()
+        except Exception as e:
+            # lỗi khi sinh task (vd. đọc số trang để tách file) làm hỏng cả job như trước
+            self.abort(run, str(e))
+            return False
+
+    def fill(self):
+        """Give the free slots of every executor to the runs chosen by the fair queue."""
+        lanes = {self.lane(run.job.kind): run.job.kind for run in self.runs}
+        for lane, kind in lanes.items():
+            # giới hạn số task đang chạy để không đẩy cả session vào pool một lúc
+            while self.in_flight.get(lane, 0) < self.window(kind):
+                runs = [run for run in list(self.runs) if self.lane(run.job.kind) == lane and self.ready(run)]
+                run = self.fair.pick(runs)
+                if run is None:
+                    break
+                self.submit(run)
+
+    def submit(self, run):
+        fn, args, key, cost = run.next_task()
+        try:
+            future = self.executor(run.job.kind).submit(fn, *args)
+        except BrokenProcessPool as e:
+            self.pool_crashed(e)
+            return
+        lane = self.lane(run.job.kind)
+        self.pending[future] = (run, key)
+        self.in_flight[lane] = self.in_flight.get(lane, 0) + 1
+        run.in_flight += 1
+        self.fair.charge(run.job.session_id, cost)
+        if run.on_submit is not None:
+            run.on_submit(key)
+
+    def complete(self, future):
+        if future not in self.pending:
+            return
+        run, key = self.pending.pop(future)
+        self.in_flight[self.lane(run.job.kind)] -= 1
+        run.in_flight -= 1
+        try:
+            result, error = future.result(), None
+        except BrokenProcessPool as e:
+            self.pool_crashed(e)
+            return
+        except Exception as e:
+            result, error = None, str(e)
+        if run.failed:
+            return
+        try:
+            run.followups.extend(run.on_result(key, result, error) or ())
+        except Exception as e:
+            self.abort(run, str(e))
+
+    def pool_crashed(self, error):
+        """Fail every job with tasks on the process pool, which has to be recreated."""
+        logger.info(f"------------ Worker pool crashed: {error}")
+        self.shutdown()
+        for future, (run, _) in list(self.pending.items()):
+            if self.lane(run.job.kind) == "pool":
+                del self.pending[future]
+                run.in_flight -= 1
+        self.in_flight["pool"] = 0
+        for run in list(self.runs):
+            if self.lane(run.job.kind) == "pool":
+                self.abort(run, f"Worker pool crashed: {error}")
+
+    def abort(self, run, error):
+        if run.failed:
+            return
+        # task đang chạy của job này vẫn được đếm tới khi xong, kết quả bị bỏ qua
+        run.failed = True
+        self.remove(run)
+        self.finish(run.job, Job.Status.FAILED, error=error)
+
+    def remove(self, run):
+        if run not in self.runs:
+            return
+        self.runs.remove(run)
+        if not any(other.job.session_id == run.job.session_id for other in self.runs):
+            self.fair.deactivate(run.job.session_id)
+
+    def reap(self):
+        for run in list(self.runs):
+            if run.in_flight or self.ready(run):
+                continue
+            self.remove(run)
+            if run.progress.tiers:
+                logger.info(f"------------ Job {run.job.id} decoder hit rates: {decoders.hit_rates(run.progress.tiers)}")
+            self.finish(run.job, Job.Status.DONE)
+
+    @staticmethod
+    def chunk_tasks(run, items):
+        job, progress = run.job, run.progress
+        size = chunk_size(job.kind)
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+
+        def on_result(chunk, results, error):
+            if error is not None:
+                results = [(path_file, error, {}) for path_file, _ in chunk]
+            for path_file, file_error, info in results:
+                progress.file_done(path_file, file_error, info)
+            progress.save()
+
+        def on_submit(chunk):
+            for path_file, _ in chunk:
+                progress.event(events.RENDERING, path_file)
+            progress.save()
+
+        run.tasks = ((run_files, (job.kind, chunk, job.action), chunk, len(chunk)) for chunk in chunks)
+        run.on_result, run.on_submit = on_result, on_submit
+
+    @staticmethod
+    def split_tasks(run, items):
+        """Scan every page of every PDF in parallel, then cut each PDF at its separator pages."""
+        job, progress = run.job, run.progress
+        page_counts, codes, tiers = {}, {}, {}
+
+        def page_tasks():
+            for path_file, _ in items:
+                try:
+                    page_counts[path_file] = count_pages(path_file)
+                except Exception as e:
+                    progress.file_done(path_file, str(e))
+                    progress.save()
+                    continue
+                if not page_counts[path_file]:
+                    progress.file_done(path_file, "PDF không có trang nào")
+                    progress.save()
+                    continue
+                codes[path_file] = {}
+                for page_number in range(1, page_counts[path_file] + 1):
+                    yield scan_page, (path_file, page_number, job.action), (path_file, page_number), 1
+
+        def on_result(key, result, error):
+            if key[0] == "write":
+                segments, timings = result or ([], {})
+                page_tiers = tiers.pop(key[1], {})
+                results = [
+                    {"value": value, "page": page, "output": output, "decoder": page_tiers.get(page) if value else decoders.TIER_NONE}
+                    for output, page, value in segments
+                ]
+                info = {
+                    "segments": len(segments),
+                    "outputs": [output for output, _, _ in segments],
+                    "results": results,
+                    "timings": timings,
+                    "pages": page_counts.get(key[1], 0),
+                }
+                progress.file_done(key[1], error, info)
+                progress.save()
+                return None
+
+            path_file, page_number = key
+            if error is not None:
+                logger.info(f"------------ Job {job.id} page {page_number} of {path_file} failed: {error}")
+            value, tier, timings = result if result else (None, decoders.TIER_ERROR, {})
+            codes[path_file][page_number] = value
+            tiers.setdefault(path_file, {})[page_number] = tier
+            progress.page_done(path_file, page_number, value, tier, timings)
+            if len(progress.events) >= 50:
+                progress.save()
+            if len(codes[path_file]) == page_counts[path_file]:
+                # đủ kết quả mọi trang -> cắt file theo các trang phân cách
+                return [(split_file, (path_file, job.action, codes.pop(path_file)), ("write", path_file), 1)]
+            return None
+
+        def on_submit(key):
+            if key[0] != "write":
+                progress.event(events.RENDERING, key[0], page=key[1])
+
+        run.tasks = page_tasks()
+        run.on_result, run.on_submit = on_result, on_submit
+
+    @staticmethod
+    def finish(job, status, error=""):
+        # chỉ khi job còn là của dispatcher này (chưa bị trả về hàng đợi vì hết lease)
+        Job.objects.filter(pk=job.pk, worker=job.worker).update(status=status, error=error, finished_at=timezone.now())
+        events.emit(job, events.DONE, status=status, error=error)
+        metrics.registry.inc("jobs_total", kind=job.kind, status=status)
+        metrics.registry.flush()
+        logger.info(f"------------ Job {job.id} finished: {status} {error}")
+
+
+dispatcher = Dispatcher()
+
+
+def enqueue(session_id, kind, action, force=False, admit=True):
+    """Queue a job for the session and wake up the dispatcher.
+
+    Files with a stored result for the same kind and action are skipped, unless ``force``.
+    A job still queued for the same session, kind and action is reused: files uploaded
+    with process on arrival call this once each, and ``start`` then only waits for it.
+    A new job raises ``scheduler.Overloaded`` while the queue is over its limits, unless
+    ``admit`` is false (callers with their own backpressure).
+    """
+    queued = Job.objects.filter(session_id=session_id, kind=kind, action=action, status=Job.Status.QUEUED)
+    if admit and not queued.exists():
+        scheduler.admit()
+    with transaction.atomic():
+        if force:
+            FileResult.objects.filter(file__session_id=session_id, kind=kind, action=action).delete()
+        job = queued.select_for_update().order_by("created_at", "id").first()
+        if job is None:
+            job = Job.objects.create(session_id=session_id, kind=kind, action=action)
+            events.emit(job, events.QUEUED, kind=kind, action=action)
+    if settings.JOB_DISPATCHER_EMBEDDED:
+        dispatcher.start()
+        dispatcher.notify()
+        janitor.janitor.start()
+    return job
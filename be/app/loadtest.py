@@ -0,0 +1,289 @@
+"""Concurrent upload load test.
+
+Runs ``sessions`` upload sessions, ``concurrency`` at a time, each sending ``files`` PDFs
+either in one multipart request (``/app/files/upload/``) or through the chunked upload
+endpoints (init, one PUT per chunk, complete). Sessions go to a running server when a
+``url`` is given, otherwise through Django's test client in this process, one thread and
+DB connection per session in flight, which is enough to reproduce SQLite write-lock
+contention. In-process runs can also flush job progress from ``progress`` threads at the
+same time, the way the dispatcher does, since those writes compete for the same lock.
+
+In-process runs go to a :func:`scratch` MEDIA_ROOT and database unless told otherwise, so a
+load test never fills the real ones. Used by ``python manage.py loadtest_uploads``;
+failures caused by "database is locked" are counted separately from other errors.
+"""
+
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connections
+from django.test.utils import override_settings
+
+from . import jobs
+from .models import File, Job, Upload
+
+LOCKED = "database is locked"
+
+
+def make_pdf(size):
+    """``size`` bytes that look like a PDF to the upload endpoints."""
+    body = b"%PDF-1.4\n"
+    return body + os.urandom(max(size - len(body), 0))
+
+
+class ClientTransport:
+    """In-process requests through ``django.test.Client``."""
+
+    def __init__(self):
+        from django.test import Client
+
+        self.client = Client(raise_request_exception=False)
+
+    def post_files(self, path, fields, files):
+        data = dict(fields)
+        data["files"] = [_named(name, content) for name, content in files]
+        return self._result(self.client.post(path, data))
+
+    def post_json(self, path, payload):
+        return self._result(self.client.post(path, json.dumps(payload), content_type="application/json"))
+
+    def put(self, path, content):
+        return self._result(self.client.put(path, content, content_type="application/octet-stream"))
+
+    @staticmethod
+    def _result(response):
+        return response.status_code, response.content.decode("utf-8", "replace")
+
+    def close(self):
+        connections.close_all()
+
+
+class HttpTransport:
+    """Requests to a running server."""
+
+    def __init__(self, url, timeout=120):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def post_files(self, path, fields, files):
+        boundary = uuid.uuid4().hex
+        parts = []
+        for key, value in fields.items():
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'.encode())
+        for name, content in files:
+            parts.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="{name}"\r\n'
+                f"Content-Type: application/pdf\r\n\r\n".encode() + content + b"\r\n"
+            )
+        parts.append(f"--{boundary}--\r\n".encode())
+        return self._send("POST", path, b"".join(parts), f"multipart/form-data; boundary={boundary}")
+
+    def post_json(self, path, payload):
+        return self._send("POST", path, json.dumps(payload).encode(), "application/json")
+
+    def put(self, path, content):
+        return self._send("PUT", path, content, "application/octet-stream")
+
+    def _send(self, method, path, body, content_type):
+        request = urllib.request.Request(self.url + path, data=body, method=method, headers={"Content-Type": content_type})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read().decode("utf-8", "replace")
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode("utf-8", "replace")
+
+    def close(self):
+        pass
+
+
+def _named(name, content):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    return SimpleUploadedFile(name, content, content_type="application/pdf")
+
+
+def upload_multipart(transport, session_id, files):
+    status, body = transport.post_files("/app/files/upload/", {"session_id": session_id}, files)
+    return status == 200, status, body
+
+
+def upload_chunked(transport, session_id, files, chunk_size):
+    payload = {"session_id": session_id, "files": [{"name": name, "size": len(content)} for name, content in files]}
+    status, body = transport.post_json("/app/files/uploads/", payload)
+    if status != 200:
+        return False, status, body
+    contents = dict(files)
+    for upload in json.loads(body)["uploads"]:
+        content = contents[upload["name"]]
+        for offset in range(0, len(content), chunk_size):
+            status, body = transport.put(f"/app/files/uploads/{upload['uploadId']}/?offset={offset}", content[offset:offset + chunk_size])
+            if status != 200:
+                return False, status, body
+    status, body = transport.post_json("/app/files/uploads/complete/", {"session_id": session_id})
+    return status == 200, status, body
+
+
+def run_session(make_transport, session_id, files, chunked, chunk_size):
+    transport = make_transport()
+    started = time.perf_counter()
+    try:
+        if chunked:
+            ok, status, body = upload_chunked(transport, session_id, files, chunk_size)
+        else:
+            ok, status, body = upload_multipart(transport, session_id, files)
+    except Exception as e:
+        ok, status, body = False, None, f"{type(e).__name__}: {e}"
+    finally:
+        transport.close()
+    return {
+        "session": session_id,
+        "ok": ok,
+        "status": status,
+        "seconds": time.perf_counter() - started,
+        "locked": not ok and LOCKED in body,
+        "error": "" if ok else body[:200],
+    }
+
+
+def write_progress(session_id, stop, files=1000):
+    """Flush the progress of a fake running job after every file until ``stop`` is set."""
+    started = time.perf_counter()
+    flushes, error = 0, ""
+    try:
+        job = Job.objects.create(session_id=session_id, kind=Job.KIND_QRCODE, action="qr", status=Job.Status.RUNNING, total=files)
+        progress = jobs.Progress(job)
+        while not stop.is_set() and flushes < files:
+            progress.file_done(f"doc_{flushes:04d}.pdf", info={"value": f"HD-2024-{flushes:06d}"})
+            progress.save()
+            flushes += 1
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        connections.close_all()
+    return {
+        "session": session_id,
+        "ok": not error,
+        "flushes": flushes,
+        "seconds": time.perf_counter() - started,
+        "locked": LOCKED in error,
+        "error": error[:200],
+    }
+
+
+@contextlib.contextmanager
+def scratch():
+    """Point MEDIA_ROOT and the default database at a temporary directory, migrated, for the block.
+
+    SQLite gets a new file with the configured options (WAL, busy timeout...); other engines
+    get a test database as ``manage.py test`` creates it.
+    """
+    folder = tempfile.mkdtemp(prefix="loadtest_")
+    database = settings.DATABASES["default"]
+    old_name, old_connection = database["NAME"], connections["default"]
+    sqlite = database["ENGINE"].endswith("sqlite3")
+    try:
+        with override_settings(MEDIA_ROOT=folder, METRICS_DIR=os.path.join(folder, "metrics")):
+            if sqlite:
+                # các thread mở kết nối mới theo settings; kết nối của thread này đổi sang file tạm
+                database["NAME"] = os.path.join(folder, "db.sqlite3")
+                connections["default"] = connections.create_connection("default")
+                call_command("migrate", verbosity=0, interactive=False)
+            else:
+                old_connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                yield folder
+            finally:
+                if sqlite:
+                    connections["default"].close()
+                    database["NAME"] = old_name
+                    connections["default"] = old_connection
+                else:
+                    old_connection.creation.destroy_test_db(old_name, verbosity=0)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(round(q * (len(values) - 1))), len(values) - 1)]
+
+
+def run(sessions=20, files=10, size=200 * 1024, concurrency=8, chunked=False, chunk_size=64 * 1024, url=None, progress=0):
+    """Run the load test; ``progress`` job progress writers run next to the uploads (in-process only)."""
+    prefix = f"loadtest_{int(time.time() * 1000)}"
+    payloads = [(f"doc_{i:03d}.pdf", make_pdf(size)) for i in range(files)]
+    make_transport = (lambda: HttpTransport(url)) if url else ClientTransport
+    progress = 0 if url else progress
+
+    stop = threading.Event()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=progress or 1) as writers:
+        progress_futures = [writers.submit(write_progress, f"{prefix}_job_{i:02d}", stop) for i in range(progress)]
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(
+                    lambda i: run_session(make_transport, f"{prefix}_{i:04d}", payloads, chunked, chunk_size),
+                    range(sessions),
+                ))
+        finally:
+            stop.set()
+        writes = [future.result() for future in progress_futures]
+    elapsed = time.perf_counter() - started
+
+    latencies = [result["seconds"] for result in results if result["ok"]]
+    failed = [result for result in results + writes if not result["ok"]]
+    return {
+        "prefix": prefix,
+        "mode": "chunked" if chunked else "multipart",
+        "target": url or "in-process",
+        "database": settings.DATABASES["default"]["ENGINE"].rsplit(".", 1)[-1],
+        "sessions": sessions,
+        "files": sessions * files,
+        "concurrency": concurrency,
+        "progress_flushes": sum(write["flushes"] for write in writes),
+        "ok": len(latencies),
+        "failed": len(failed),
+        "locked": sum(1 for result in failed if result["locked"]),
+        "seconds": round(elapsed, 3),
+        "files_per_sec": round(len(latencies) * files / elapsed, 2) if elapsed else 0.0,
+        "latency": {
+            "p50_ms": round(_percentile(latencies, 0.5) * 1000, 1),
+            "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+            "max_ms": round(max(latencies, default=0.0) * 1000, 1),
+        },
+        "errors": [result["error"] for result in failed][:10],
+    }
+
+
+def cleanup(prefix):
+    """Delete the rows and files created by a run in the configured database and MEDIA_ROOT."""
+    folders = set()
+    for obj in File.objects.filter(session_id__startswith=prefix):
+        if obj.file:
+            folders.add(os.path.dirname(obj.file.path))
+            obj.file.delete(save=False)
+    for upload in Upload.objects.filter(session_id__startswith=prefix):
+        full_path = default_storage.path(upload.path)
+        folders.add(os.path.dirname(full_path))
+        if os.path.exists(full_path):
+            os.remove(full_path)
+    Upload.objects.filter(session_id__startswith=prefix).delete()
+    File.objects.filter(session_id__startswith=prefix).delete()
+    Job.objects.filter(session_id__startswith=prefix).delete()
+    for folder in folders:
+        if os.path.basename(folder).startswith(prefix) and str(folder).startswith(str(settings.MEDIA_ROOT)):
+            shutil.rmtree(folder, ignore_errors=True)
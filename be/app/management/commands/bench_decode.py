@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app import benchmark
+
+
+class Command(BaseCommand):
+    help = "Benchmark QR / barcode decoding on a synthetic PDF corpus and compare with a baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corpus", help="Corpus folder, reused when its seed/limit match (default: a temp folder)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--limit", type=int, help="Only run this many randomly picked cases")
+        parser.add_argument("--use-cache", action="store_true", help="Keep the decode result cache enabled")
+        parser.add_argument("--output", help="Write the report to this JSON file")
+        parser.add_argument("--baseline", default=settings.BENCH_BASELINE, help="Baseline JSON to compare against")
+        parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+        parser.add_argument("--max-slowdown", type=float, default=0.1, help="Allowed files/sec drop vs baseline (0.1 = 10%%)")
+        parser.add_argument("--max-accuracy-drop", type=float, default=0.0)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory(prefix="bench_decode_") as tmp:
+            folder = options["corpus"] or tmp
+            try:
+                manifest = benchmark.load_or_generate_corpus(folder, options["seed"], options["limit"])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"Corpus: {len(manifest['cases'])} files in {folder}")
+            report = benchmark.run(manifest, use_cache=options["use_cache"])
+
+        for kind, result in report["results"].items():
+            self.stdout.write(
+                f"{kind:8} {result['files_per_sec']:>8} files/s  accuracy {result['accuracy']:.2%}  "
+                f"p50 {result['latency']['p50_ms']} ms  p95 {result['latency']['p95_ms']} ms  errors {result['errors']}"
+            )
+            self.stdout.write(f"  tiers: {', '.join(f'{tier}={count}' for tier, count in sorted(result['tiers'].items()))}")
+        for stage, summary in report["stages"].items():
+            self.stdout.write(f"  {stage:15} n={summary['count']:<5} p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms")
+        self.stdout.write(f"Peak RSS: {report['peak_rss_mb']} MB")
+
+        if options["output"]:
+            self._write(options["output"], report)
+
+        baseline_path = options["baseline"]
+        if options["save_baseline"]:
+            self._write(baseline_path, report)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {baseline_path}"))
+        elif os.path.exists(baseline_path):
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+            regressions = benchmark.compare(report, baseline, options["max_slowdown"], options["max_accuracy_drop"])
+            if regressions:
+                raise CommandError("Regression against baseline:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS(f"No regression against {baseline_path}"))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"No baseline at {baseline_path}: run bench_decode --save-baseline once on this machine to enable the regression check"
+            ))
+
+    @staticmethod
+    def _write(path, report):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
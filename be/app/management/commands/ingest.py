@@ -0,0 +1,35 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from loguru import logger
+
+from app import ingest
+
+
+class Command(BaseCommand):
+    help = "Watch DATA_SRC_PATH and queue new PDFs as sessions for INGEST_PIPELINES."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", help="Folder to ingest (default: DATA_SRC_PATH)")
+        parser.add_argument("--once", action="store_true", help="Scan once, queue what is settled and exit")
+
+    def handle(self, *args, **options):
+        ingester = ingest.Ingester(options["path"])
+        if options["once"]:
+            report = ingester.run_once()
+            files = ", ".join(f"{count} {status}" for status, count in sorted(report.items())) or "nothing new"
+            self.stdout.write(f"Ingested from {ingester.root}: {files}; {len(ingester.pending)} file(s) still pending")
+            ingester.stop()
+            return
+
+        def stop(signum, frame):
+            raise SystemExit(0)
+
+        signal.signal(signal.SIGTERM, stop)
+        try:
+            ingester.serve_forever()
+        except (KeyboardInterrupt, SystemExit):
+            logger.info(f"------------ Ingest on {ingester.root} stopping")
+        finally:
+            # file chưa xử lý xong không có checkpoint: lần khởi động sau sẽ tìm lại
+            ingester.stop()
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from app import janitor
+
+
+class Command(BaseCommand):
+    help = "Remove expired sessions (files, derived folders, ZIPs, DB rows) and enforce MEDIA_QUOTA once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed")
+
+    def handle(self, *args, **options):
+        report = janitor.janitor.run_once(dry_run=options["dry_run"])
+        freed = report.pop("bytes")
+        sessions = ", ".join(f"{count} {reason}" for reason, count in sorted(report.items())) or "none"
+        verb = "Would remove" if options["dry_run"] else "Removed"
+        self.stdout.write(f"{verb} sessions: {sessions}; {freed} bytes freed")
@@ -0,0 +1,64 @@
+import contextlib
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import loadtest
+
+
+class Command(BaseCommand):
+    help = "Upload many sessions concurrently and report latency, throughput and database lock errors."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sessions", type=int, default=20)
+        parser.add_argument("--files", type=int, default=10, help="Files per session")
+        parser.add_argument("--size", type=int, default=200 * 1024, help="Bytes per file")
+        parser.add_argument("--concurrency", type=int, default=8, help="Sessions in flight at once")
+        parser.add_argument("--chunked", action="store_true", help="Use the chunked upload endpoints")
+        parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+        parser.add_argument("--url", help="Base URL of a running server (default: in-process test client)")
+        parser.add_argument(
+            "--progress", type=int, default=2,
+            help="Threads flushing job progress during the uploads (in-process runs on the temporary database only)",
+        )
+        parser.add_argument(
+            "--in-place", action="store_true",
+            help="Upload into the configured database and MEDIA_ROOT instead of temporary ones (in-process runs)",
+        )
+        parser.add_argument("--keep", action="store_true", help="Keep the uploaded files and rows (with --url or --in-place)")
+        parser.add_argument("--output", help="Write the report to this JSON file")
+
+    def handle(self, *args, **options):
+        scratch = not options["url"] and not options["in_place"]
+        with loadtest.scratch() if scratch else contextlib.nullcontext():
+            report = loadtest.run(
+                sessions=options["sessions"],
+                files=options["files"],
+                size=options["size"],
+                concurrency=options["concurrency"],
+                chunked=options["chunked"],
+                chunk_size=options["chunk_size"],
+                url=options["url"],
+                # tiến độ giả cộng vào DailyStat: chỉ ghi vào database tạm
+                progress=options["progress"] if scratch else 0,
+            )
+        if not scratch and not options["keep"]:
+            loadtest.cleanup(report["prefix"])
+
+        self.stdout.write(
+            f"{report['mode']} x{report['concurrency']} on {report['database']} ({report['target']}): "
+            f"{report['ok']}/{report['sessions']} sessions ok, {report['files_per_sec']} files/s, "
+            f"{report['progress_flushes']} progress flushes, "
+            f"p50 {report['latency']['p50_ms']} ms  p95 {report['latency']['p95_ms']} ms  max {report['latency']['max_ms']} ms"
+        )
+        for error in report["errors"]:
+            self.stdout.write(f"  {error}")
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+
+        if report["locked"]:
+            raise CommandError(f"{report['locked']} sessions or progress writers failed with '{loadtest.LOCKED}'")
+        if report["failed"]:
+            raise CommandError(f"{report['failed']} sessions or progress writers failed")
+        self.stdout.write(self.style.SUCCESS("No database lock errors"))
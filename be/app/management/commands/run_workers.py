@@ -0,0 +1,30 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from loguru import logger
+
+from app import janitor, jobs
+
+
+class Command(BaseCommand):
+    help = "Run the job dispatcher, its decode worker processes and the janitor, separately from the web server."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, help="Decode worker processes (default: JOB_WORKERS)")
+
+    def handle(self, *args, **options):
+        dispatcher = jobs.Dispatcher(options["workers"])
+        jobs.dispatcher = dispatcher
+
+        def stop(signum, frame):
+            raise SystemExit(0)
+
+        signal.signal(signal.SIGTERM, stop)
+        janitor.janitor.start()
+        try:
+            dispatcher.serve_forever()
+        except (KeyboardInterrupt, SystemExit):
+            logger.info(f"------------ Job dispatcher {dispatcher.name} stopping")
+        finally:
+            # job đang chạy dở sẽ được requeue_orphans đưa lại hàng đợi ở lần khởi động sau
+            dispatcher.shutdown()
@@ -0,0 +1,298 @@
+"""Pipeline instrumentation: stage timers, counters and histograms.
+
+Every process (web, dispatcher, decode workers) keeps its own in-memory registry and
+writes a snapshot of it to ``settings.METRICS_DIR/<host>-<pid>-<start>.json``; ``/app/metrics/``
+adds all snapshots up and renders them in the Prometheus text format. Counters and
+histograms only grow, so the snapshots of exited processes are still counted: each flush
+merges into ``archive.json`` and removes the snapshots of exited processes of its host and
+those not written for METRICS_SNAPSHOT_TTL seconds on any host (a recreated container has a
+new hostname), so the directory does not grow with every worker that ever ran. A process
+whose snapshot was archived while it was idle only writes what it counted since. The process
+start time in the name keeps a reused pid (a restarted container) from overwriting or
+claiming an old snapshot.
+
+``timer(stage, files)`` also charges the elapsed time to the given files (split evenly
+when a stage handles a batch), so a task can return per-file timings with
+``pop_timings(path)``; the dispatcher stores them in ``File.timings``.
+"""
+
+import contextlib
+import glob
+import json
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+PREFIX = "tcsmart"
+ARCHIVE = "archive.json"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+HELP = {
+    "stage_seconds": ("histogram", "Time spent in a pipeline stage"),
+    "files_total": ("counter", "Files processed by jobs, by kind and status"),
+    "pages_total": ("counter", "Pages scanned by split jobs"),
+    "decode_tier_total": ("counter", "Decoded pages/files by the decoder tier that resolved them"),
+    "preprocess_recovered_total": ("counter", "Codes read only after a preprocessing step, by step and decoder"),
+    "jobs_total": ("counter", "Finished jobs, by kind and status"),
+    "jobs_rejected_total": ("counter", "New jobs refused by admission control, by reason"),
+    "render_total": ("counter", "Page images by source (native embedded image / pdfium / pdftoppm)"),
+    "outputs_total": ("counter", "Output files written, by method (hardlink / reflink / copy)"),
+    "ingest_files_total": ("counter", "Files picked up from DATA_SRC_PATH, by status (ingested / duplicate / failed)"),
+    "janitor_sessions_total": ("counter", "Sessions removed by the janitor, by reason"),
+    "janitor_bytes_total": ("counter", "Bytes freed by the janitor"),
+}
+
+
+def _labels_key(labels):
+    return json.dumps(sorted(labels.items()))
+
+
+def _process_start(pid):
+    """Start time of ``pid`` (clock ticks since boot), ``None`` when it is not running."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+def _snapshot_name(pid):
+    return f"{socket.gethostname()}-{pid}-{_process_start(pid) or 0}.json"
+
+
+_dir_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _locked(shared=False):
+    """Lock METRICS_DIR against the other threads of this process and, with flock, other processes."""
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    with _dir_lock, open(os.path.join(settings.METRICS_DIR, ".lock"), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _write_json(path, data):
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _add(counters, histograms, snapshot):
+    for name, labels, value in snapshot["counters"]:
+        counters[(name, labels)] = counters.get((name, labels), 0) + value
+    for name, labels, h in snapshot["histograms"]:
+        total = histograms.setdefault((name, labels), {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+        total["buckets"] = [a + b for a, b in zip(total["buckets"], h["buckets"])]
+        total["sum"] += h["sum"]
+        total["count"] += h["count"]
+
+
+def _subtract(snapshot, counters, histograms):
+    """``snapshot`` minus the ``counters`` and ``histograms`` already counted elsewhere."""
+    result = {"counters": [], "histograms": []}
+    for name, labels, value in snapshot["counters"]:
+        result["counters"].append([name, labels, value - counters.get((name, labels), 0)])
+    for name, labels, h in snapshot["histograms"]:
+        base = histograms.get((name, labels), {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+        result["histograms"].append([name, labels, {
+            "buckets": [a - b for a, b in zip(h["buckets"], base["buckets"])],
+            "sum": h["sum"] - base["sum"],
+            "count": h["count"] - base["count"],
+        }])
+    return result
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self._name = None
+        # dữ liệu đã nằm trong archive.json (snapshot bị gộp lúc process im lặng) và snapshot ghi gần nhất
+        self._archived = ({}, {})
+        self._written = None
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            # buckets lưu sẵn dạng cộng dồn (le), cộng các snapshot lại là ra đúng tổng
+            histogram = self.histograms.setdefault(key, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": [[name, labels, value] for (name, labels), value in self.counters.items()],
+                "histograms": [[name, labels, dict(h, buckets=list(h["buckets"]))] for (name, labels), h in self.histograms.items()],
+            }
+
+    def flush(self):
+        """Write this process' snapshot to ``METRICS_DIR`` and archive those of exited processes."""
+        pid = os.getpid()
+        stale = stale_snapshots()
+        # lock cả với các thread cùng process: chúng ghi chung một file snapshot (và file .tmp của nó)
+        with _locked():
+            if self._name is None or self._name[0] != pid:
+                self._name = (pid, _snapshot_name(pid))
+                self._written = None
+            path = os.path.join(settings.METRICS_DIR, self._name[1])
+            if self._written is not None and not os.path.exists(path):
+                # snapshot trước đã được gộp vào archive: từ giờ chỉ ghi phần tăng thêm
+                _add(*self._archived, self._written)
+            self._written = _subtract(self.snapshot(), *self._archived)
+            _write_json(path, self._written)
+            if stale:
+                _archive(stale_snapshots(keep=self._name[1]))
+
+
+registry = Registry()
+
+_timings_lock = threading.Lock()
+_timings = {}
+
+
+@contextlib.contextmanager
+def timer(stage, files=()):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        registry.observe("stage_seconds", seconds, stage=stage)
+        if files:
+            share = seconds / len(files)
+            with _timings_lock:
+                for path in files:
+                    stages = _timings.setdefault(path, {})
+                    stages[stage] = stages.get(stage, 0.0) + share
+
+
+def pop_timings(path):
+    """Stage timings (seconds) charged to ``path`` since the last call."""
+    with _timings_lock:
+        stages = _timings.pop(path, {})
+    return {stage: round(seconds, 4) for stage, seconds in stages.items()}
+
+
+def merge_timings(total, timings):
+    for stage, seconds in timings.items():
+        total[stage] = round(total.get(stage, 0.0) + seconds, 4)
+    return total
+
+
+def stale_snapshots(keep=None):
+    """Snapshots of exited processes of this host, or not written for METRICS_SNAPSHOT_TTL seconds on any host."""
+    host = socket.gethostname()
+    # không có /proc thì không kiểm tra được process còn sống: chỉ xét theo tuổi
+    check_pids = os.path.isdir("/proc/self")
+    cutoff = time.time() - settings.METRICS_SNAPSHOT_TTL
+    paths = []
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, "*.json")):
+        name = os.path.basename(path)
+        if name in (ARCHIVE, keep):
+            continue
+        snapshot_host, pid, start = (name[:-len(".json")].rsplit("-", 2) + ["", ""])[:3]
+        if check_pids and snapshot_host == host and pid.isdigit() and _process_start(int(pid)) != start:
+            paths.append(path)
+            continue
+        try:
+            if settings.METRICS_SNAPSHOT_TTL and os.stat(path).st_mtime < cutoff:
+                paths.append(path)
+        except FileNotFoundError:
+            continue
+    return paths
+
+
+def _archive(paths):
+    """Add the snapshots at ``paths`` to ``archive.json`` and remove them; the caller holds the lock."""
+    if not paths:
+        return
+    archive_path = os.path.join(settings.METRICS_DIR, ARCHIVE)
+    counters, histograms = {}, {}
+    for path in [archive_path] + paths:
+        snapshot = _read_json(path)
+        if snapshot is not None:
+            _add(counters, histograms, snapshot)
+    _write_json(archive_path, {
+        "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+        "histograms": [[name, labels, h] for (name, labels), h in histograms.items()],
+    })
+    for path in paths:
+        os.remove(path)
+
+
+def collect():
+    """Sum of every process' snapshot and the archive, this process' live registry included."""
+    registry.flush()
+    counters, histograms = {}, {}
+    # lock chung: không đọc archive và snapshot giữa lúc chúng đang được gộp
+    with _locked(shared=True):
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, "*.json")):
+            snapshot = _read_json(path)
+            if snapshot is not None:
+                _add(counters, histograms, snapshot)
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, **extra):
+    pairs = json.loads(labels) + sorted(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def render_prometheus():
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text) in HELP.items():
+        metric = f"{PREFIX}_{name}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        if kind == "counter":
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f"{metric}{_format_labels(labels)} {value}")
+        else:
+            for (histogram_name, labels), h in sorted(histograms.items()):
+                if histogram_name != name:
+                    continue
+                for bound, count in zip(BUCKETS, h["buckets"]):
+                    lines.append(f"{metric}_bucket{_format_labels(labels, le=bound)} {count}")
+                lines.append(f"{metric}_bucket{_format_labels(labels, le='+Inf')} {h['count']}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {round(h['sum'], 6)}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {h['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.3 on 2026-10-18 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='sha256',
+            field=models.CharField(blank=True, db_comment='Hash nội dung file, tính khi upload', db_index=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.3 on 2026-10-18 09:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_file_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=64)),
+                ('event', models.CharField(max_length=16)),
+                ('file', models.CharField(blank=True, default='', max_length=255)),
+                ('page', models.IntegerField(blank=True, null=True)),
+                ('value', models.CharField(blank=True, default='', max_length=255)),
+                ('detail', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='app.job')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['session_id', 'id'], name='app_jobeven_session_b271e3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.3 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='timings',
+            field=models.JSONField(blank=True, db_comment='Thời gian từng bước xử lý của job gần nhất (giây)', default=dict),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.3 on 2026-10-18 10:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_file_timings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=32)),
+                ('action', models.CharField(max_length=64)),
+                ('value', models.CharField(blank=True, default='', max_length=255)),
+                ('decoder', models.CharField(blank=True, default='', max_length=16)),
+                ('confidence', models.FloatField(blank=True, null=True)),
+                ('page', models.IntegerField(blank=True, null=True)),
+                ('output', models.CharField(blank=True, default='', max_length=512)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='app.file')),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='results', to='app.job')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['file', 'kind', 'action'], name='app_fileres_file_id_3d2fd9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.3 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_sessionexpiry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileresult',
+            name='bbox',
+            field=models.JSONField(blank=True, db_comment='Vị trí mã trên trang render [left, top, width, height]', null=True),
+        ),
+        migrations.AddField(
+            model_name='fileresult',
+            name='symbology',
+            field=models.CharField(blank=True, db_comment='Loại mã: QRCODE, CODE128, EAN13, DATAMATRIX...', default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.3 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_ingest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('kind', models.CharField(max_length=32)),
+                ('action', models.CharField(max_length=64)),
+                ('outcome', models.CharField(max_length=16)),
+                ('files', models.BigIntegerField(default=0)),
+                ('pages', models.BigIntegerField(default=0)),
+                ('bytes', models.BigIntegerField(default=0)),
+                ('seconds', models.FloatField(default=0.0)),
+                ('buckets', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='app_dailyst_date_a23c00_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'kind', 'action', 'outcome'), name='dailystat_unique_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.3 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_dailystat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='upload',
+            name='action',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='upload',
+            name='kind',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
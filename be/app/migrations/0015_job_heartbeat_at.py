@@ -0,0 +1,18 @@
+# Generated by Django 6.0.3 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_upload_process'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, db_comment='Lần cuối dispatcher xác nhận còn chạy job (lease)', null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.3 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_job_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkerStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True)),
+                ('memory_percent', models.FloatField(blank=True, db_comment='Bộ nhớ đang dùng, % giới hạn của container', null=True)),
+                ('heartbeat_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
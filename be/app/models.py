@@ -1,5 +1,6 @@
 from django.db import models
 import os
+import uuid
 from datetime import datetime
 
 def upload_to_session(instance, filename):
@@ -24,10 +25,288 @@ class File(models.Model):
     original_name = models.CharField(max_length=255)
     size = models.BigIntegerField(default=0)
     content_type = models.CharField(max_length=100, blank=True, default="")
+    sha256 = models.CharField(max_length=64, blank=True, default="", db_index=True, db_comment="Hash nội dung file, tính khi upload")
     created_at = models.DateTimeField(auto_now_add=True)
 
     is_processed = models.BooleanField(default=False, db_comment="Đã được xử lý xong chưa")
+    timings = models.JSONField(default=dict, blank=True, db_comment="Thời gian từng bước xử lý của job gần nhất (giây)")
 
 
     def __str__(self) -> str:
         return f"{self.original_name} ({self.session_id})"
+
+
+class Upload(models.Model):
+    """Chunked upload in progress, see ``FileUpload.init_uploads``.
+
+    Notes:
+        - path is the final storage name (under upload_to_session), chunks are written to it directly.
+        - received is the number of bytes stored so far, i.e. the offset the client resumes from.
+        - file is set once the upload is completed and its ``File`` row created.
+        - kind / action (process on arrival): the file is queued for that pipeline as soon as
+          its last chunk is stored, instead of waiting for ``complete`` and ``start``.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    session_id = models.CharField(max_length=64, db_index=True)
+    original_name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    content_type = models.CharField(max_length=100, blank=True, default="")
+    path = models.CharField(max_length=255)
+    file = models.OneToOneField(File, null=True, blank=True, on_delete=models.SET_NULL, related_name="upload")
+    kind = models.CharField(max_length=32, blank=True, default="")
+    action = models.CharField(max_length=64, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def complete(self) -> bool:
+        return self.received >= self.size
+
+    def to_dict(self) -> dict:
+        return {
+            "uploadId": str(self.id),
+            "name": self.original_name,
+            "size": self.size,
+            "offset": self.received,
+            "fileId": self.file_id,
+        }
+
+    def __str__(self) -> str:
+        return f"{self.original_name} ({self.session_id}, {self.received}/{self.size})"
+
+
+class Job(models.Model):
+    """Background processing job for one upload session.
+
+    Notes:
+        - kind selects the pipeline (qrcode / barcode / pdf2layer / split).
+        - action is the output folder name sent by the FE, same as before.
+        - stats keeps free-form counters reported by the pipeline.
+    """
+
+    KIND_QRCODE = "qrcode"
+    KIND_BARCODE = "barcode"
+    KIND_PDF2LAYER = "pdf2layer"
+    KIND_SPLIT = "split"
+    KINDS = (KIND_QRCODE, KIND_BARCODE, KIND_PDF2LAYER, KIND_SPLIT)
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    session_id = models.CharField(max_length=64, db_index=True)
+    kind = models.CharField(max_length=32)
+    action = models.CharField(max_length=64)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED, db_index=True)
+
+    total = models.IntegerField(default=0)
+    processed = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    stats = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    worker = models.CharField(max_length=128, blank=True, default="", db_comment="Dispatcher đang xử lý job (host:pid:token)")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, db_comment="Lần cuối dispatcher xác nhận còn chạy job (lease)")
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "sessionId": self.session_id,
+            "kind": self.kind,
+            "action": self.action,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "failed": self.failed,
+            "stats": self.stats,
+            "error": self.error,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+        }
+
+    def __str__(self) -> str:
+        return f"{self.kind} job #{self.id} ({self.session_id}, {self.status})"
+
+
+class FileResult(models.Model):
+    """Result of one pipeline (kind + action) on one uploaded file, one row per output.
+
+    Notes:
+        - decoder is the tier that produced the value (pyzbar / opencv / qreader / cache / none / error).
+        - confidence is only set when the decoder reports a score.
+        - page is the page the value was read on (split: first page of the segment).
+        - output is relative to MEDIA_ROOT, empty when the file failed.
+    """
+
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name="results")
+    job = models.ForeignKey(Job, null=True, blank=True, on_delete=models.SET_NULL, related_name="results")
+    kind = models.CharField(max_length=32)
+    action = models.CharField(max_length=64)
+    value = models.CharField(max_length=255, blank=True, default="")
+    decoder = models.CharField(max_length=16, blank=True, default="")
+    symbology = models.CharField(max_length=32, blank=True, default="", db_comment="Loại mã: QRCODE, CODE128, EAN13, DATAMATRIX...")
+    bbox = models.JSONField(null=True, blank=True, db_comment="Vị trí mã trên trang render [left, top, width, height]")
+    confidence = models.FloatField(null=True, blank=True)
+    page = models.IntegerField(null=True, blank=True)
+    output = models.CharField(max_length=512, blank=True, default="")
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["file", "kind", "action"])]
+
+
+class JobEvent(models.Model):
+    """Progress event of a job, pushed to the FE over ``/ws/sessions/<session_id>/``.
+
+    Notes:
+        - event is one of queued / rendering / decoded / renamed / failed / done.
+        - file is the input file name, page is set for page-level events (split).
+    """
+
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name="events")
+    session_id = models.CharField(max_length=64)
+    event = models.CharField(max_length=16)
+    file = models.CharField(max_length=255, blank=True, default="")
+    page = models.IntegerField(null=True, blank=True)
+    value = models.CharField(max_length=255, blank=True, default="")
+    detail = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["session_id", "id"])]
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "jobId": self.job_id,
+            "event": self.event,
+            "file": self.file,
+            "page": self.page,
+            "value": self.value,
+            "detail": self.detail,
+            "ts": self.created_at.isoformat(),
+        }
+
+
+class WorkerStatus(models.Model):
+    """Last reading a job dispatcher published about its host, see ``scheduler.admit``.
+
+    Notes:
+        - name is ``Dispatcher.name``; the row is refreshed every JOB_HEARTBEAT_INTERVAL.
+        - memory_percent is measured inside the dispatcher's container, where the decode
+          workers run, so admission in the web container checks the right memory.
+        - rows not refreshed for JOB_LEASE seconds are ignored and removed.
+    """
+
+    name = models.CharField(max_length=128, unique=True)
+    memory_percent = models.FloatField(null=True, blank=True, db_comment="Bộ nhớ đang dùng, % giới hạn của container")
+    heartbeat_at = models.DateTimeField(db_index=True)
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.memory_percent}%, {self.heartbeat_at})"
+
+
+class SessionExpiry(models.Model):
+    """Session scheduled for removal by the janitor (``app.janitor``).
+
+    Notes:
+        - a completed download schedules its session SESSION_DOWNLOAD_GRACE seconds ahead,
+          so the archive can still be resumed or fetched again until then.
+        - sessions without a row here expire after SESSION_TTL seconds of inactivity.
+    """
+
+    session_id = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    reason = models.CharField(max_length=32, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.session_id} ({self.reason}, {self.expires_at})"
+
+
+class IngestedFile(models.Model):
+    """PDF picked up from DATA_SRC_PATH by the ingestion service (``app.ingest``).
+
+    Notes:
+        - path is relative to DATA_SRC_PATH; size and mtime_ns are compared on every scan,
+          the file is hashed again only when one of them changed.
+        - status is ingested / duplicate (same sha256 as a file ingested before) / failed.
+        - file is the uploaded copy, emptied when the janitor removes its session: the
+          row stays so the source is not ingested again.
+    """
+
+    STATUS_INGESTED = "ingested"
+    STATUS_DUPLICATE = "duplicate"
+    STATUS_FAILED = "failed"
+
+    path = models.CharField(max_length=1024, unique=True)
+    size = models.BigIntegerField()
+    mtime_ns = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    status = models.CharField(max_length=16)
+    session_id = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    file = models.ForeignKey(File, null=True, blank=True, on_delete=models.SET_NULL, related_name="ingested")
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.path} ({self.status})"
+
+
+class IngestCheckpoint(models.Model):
+    """Last listing of a DATA_SRC_PATH directory by the ingestion scan.
+
+    Notes:
+        - a directory whose mtime is still mtime_ns has the same entries: the scan only
+          walks into its stored subdirs instead of listing it again.
+        - only written once every PDF of the listing was handled, so files still being
+          copied when the service stopped are found again on restart.
+    """
+
+    path = models.CharField(max_length=1024, unique=True, blank=True, db_comment="Tương đối với DATA_SRC_PATH, rỗng = thư mục gốc")
+    mtime_ns = models.BigIntegerField()
+    subdirs = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.path or '.'} ({self.mtime_ns})"
+
+
+class DailyStat(models.Model):
+    """Per-day rollup of finished files for one kind, action and outcome (``app.stats``).
+
+    Notes:
+        - outcome is success (a code was read / the output written), no_code or failed.
+        - seconds is the sum of the per-file processing times, buckets their histogram
+          over ``metrics.BUCKETS`` (last bucket = slower than the last bound).
+        - updated in the transaction that stores the job progress; the janitor never
+          removes these rows, so reports outlive the sessions.
+    """
+
+    date = models.DateField()
+    kind = models.CharField(max_length=32)
+    action = models.CharField(max_length=64)
+    outcome = models.CharField(max_length=16)
+    files = models.BigIntegerField(default=0)
+    pages = models.BigIntegerField(default=0)
+    bytes = models.BigIntegerField(default=0)
+    seconds = models.FloatField(default=0.0)
+    buckets = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["date", "kind", "action", "outcome"], name="dailystat_unique_key")]
+        indexes = [models.Index(fields=["date"])]
+
+    def __str__(self) -> str:
+        return f"{self.date} {self.kind}/{self.action} {self.outcome}: {self.files}"
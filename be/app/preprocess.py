@@ -0,0 +1,151 @@
+"""Image preprocessing for codes the cheap decoders miss on the plain grayscale page.
+
+Phone photos and skewed scans mostly fail for three reasons: uneven lighting (zbar's
+global threshold loses part of the code), rotation or perspective, and modules that are
+too small or too large at the rendered scale. Each step targets one of them and returns
+variants of the grayscale image:
+
+- ``threshold``: adaptive (local) Gaussian threshold,
+- ``denoise``: median blur then Otsu, for speckled scans and JPEG noise,
+- ``deskew``: perspective warp of the QR code found by ``cv2.QRCodeDetector.detect``
+  (which locates codes it cannot decode), or rotation to the dominant gradient
+  orientation (bars of a 1D barcode) when no QR code is located,
+- ``scale``: the page resized by each of ``settings.PREPROCESS_SCALES``.
+
+The decoders retry on the variants in ``settings.PREPROCESS_STEPS`` order, at the same
+render DPI, and report the step that recovered the code with the tier
+(``pyzbar+deskew``), so hit rates show what every step is worth. All steps are whole-image
+OpenCV / NumPy operations.
+"""
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from . import metrics
+
+STEP_THRESHOLD = "threshold"
+STEP_DENOISE = "denoise"
+STEP_DESKEW = "deskew"
+STEP_SCALE = "scale"
+
+# vùng trắng quanh mã sau khi nắn thẳng, theo tỉ lệ cạnh mã (quiet zone)
+QUIET_ZONE = 0.2
+# góc lệch nhỏ hơn thế này thì zbar vẫn đọc được, không cần xoay
+MIN_SKEW_DEGREES = 2.0
+MAX_SCALED_SIDE = 4000
+
+
+def _odd(value):
+    return value + 1 - value % 2
+
+
+def threshold(gray):
+    # cửa sổ ~1/30 cạnh ảnh: đủ lớn để chứa vài module của mã, đủ nhỏ để theo kịp vùng tối/sáng
+    block = max(_odd(max(gray.shape) // 30), 11)
+    return [cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block, 10)]
+
+
+def denoise(gray):
+    blurred = cv2.medianBlur(gray, 3)
+    _, binary = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return [binary]
+
+
+def qr_quad(gray):
+    """Corners of a QR code located (not necessarily decodable) in ``gray``, or ``None``."""
+    try:
+        found, points = cv2.QRCodeDetector().detect(gray)
+    except cv2.error:
+        return None
+    if not found or points is None:
+        return None
+    return points.reshape(4, 2).astype(np.float32)
+
+
+def warp_quad(gray, quad):
+    """Square, axis-aligned crop of the quadrilateral ``quad`` with a white quiet zone."""
+    side = int(np.linalg.norm(quad - np.roll(quad, 1, axis=0), axis=1).max())
+    if side < 8:
+        return None
+    pad = int(side * QUIET_ZONE)
+    target = np.float32([[pad, pad], [pad + side, pad], [pad + side, pad + side], [pad, pad + side]])
+    matrix = cv2.getPerspectiveTransform(quad, target)
+    return cv2.warpPerspective(gray, matrix, (side + 2 * pad, side + 2 * pad), flags=cv2.INTER_CUBIC, borderValue=255)
+
+
+def dominant_angle(gray):
+    """Dominant edge orientation in degrees, folded into [-45, 45).
+
+    Doubled-angle mean of the strongest gradients (structure tensor): the bars of a 1D
+    barcode or the module edges of a 2D code dominate it.
+    """
+    gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+    magnitude = gx * gx + gy * gy
+    strong = magnitude > np.percentile(magnitude, 95)
+    if not strong.any():
+        return 0.0
+    gxx, gyy, gxy = (gx * gx)[strong].sum(), (gy * gy)[strong].sum(), (gx * gy)[strong].sum()
+    angle = 0.5 * np.degrees(np.arctan2(2 * gxy, gxx - gyy))
+    return float((angle + 45) % 90 - 45)
+
+
+def rotate(gray, angle):
+    height, width = gray.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+    new_width, new_height = int(height * sin + width * cos), int(height * cos + width * sin)
+    matrix[0, 2] += new_width / 2 - width / 2
+    matrix[1, 2] += new_height / 2 - height / 2
+    return cv2.warpAffine(gray, matrix, (new_width, new_height), flags=cv2.INTER_LINEAR, borderValue=255)
+
+
+def deskew(gray):
+    quad = qr_quad(gray)
+    if quad is not None:
+        warped = warp_quad(gray, quad)
+        if warped is None:
+            return []
+        # vùng cắt chỉ còn mã + quiet zone: ngưỡng Otsu toàn cục đủ dùng và rẻ
+        _, binary = cv2.threshold(warped, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return [warped, binary]
+    angle = dominant_angle(gray)
+    if abs(angle) < MIN_SKEW_DEGREES:
+        return []
+    return [rotate(gray, angle)]
+
+
+def rescale(gray):
+    variants = []
+    height, width = gray.shape[:2]
+    for factor in settings.PREPROCESS_SCALES:
+        factor = min(factor, MAX_SCALED_SIDE / max(height, width))
+        if abs(factor - 1) < 0.05:
+            continue
+        interpolation = cv2.INTER_AREA if factor < 1 else cv2.INTER_CUBIC
+        variants.append(cv2.resize(gray, (int(width * factor), int(height * factor)), interpolation=interpolation))
+    return variants
+
+
+STEPS = {
+    STEP_THRESHOLD: threshold,
+    STEP_DENOISE: denoise,
+    STEP_DESKEW: deskew,
+    STEP_SCALE: rescale,
+}
+
+
+def apply(step, gray):
+    """Variants of ``gray`` produced by ``step``."""
+    with metrics.timer(f"preprocess_{step}"):
+        return STEPS[step](gray)
+
+
+def variants(gray, steps=None):
+    """Yield ``(step, image)`` for every configured step, computed lazily one step at a time."""
+    for step in settings.PREPROCESS_STEPS if steps is None else steps:
+        if step not in STEPS:
+            continue
+        for image in apply(step, gray):
+            yield step, image
@@ -0,0 +1,69 @@
+"""Lazy, per-process QReader model.
+
+The YOLO weights are loaded the first time a decode worker actually needs them, so the
+API process (uploads / downloads / job polling) never pays for the model. The size
+(n / s / m / l) comes from ``settings.QREADER_MODEL_SIZE``.
+"""
+
+import threading
+
+from django.conf import settings
+from loguru import logger
+
+from . import metrics
+
+_lock = threading.Lock()
+_reader = None
+
+
+def get_reader():
+    global _reader
+    if _reader is None:
+        with _lock:
+            if _reader is None:
+                from qreader import QReader
+
+                logger.info(f"------------ Loading QReader model (size={settings.QREADER_MODEL_SIZE})")
+                _reader = QReader(model_size=settings.QREADER_MODEL_SIZE)
+    return _reader
+
+
+def _predict_batch(reader, images):
+    """Run the YOLO detector once over a list of RGB images.
+
+    Uses qrdet's own pre/post-processing so the detections have exactly the format
+    ``QReader.decode`` expects.
+    """
+    from qrdet import _prepare_input, _yolo_v8_results_to_dict
+
+    detector = reader.detector
+    prepared = [_prepare_input(source=image, is_bgr=False) for image in images]
+    results = detector.model.predict(
+        source=prepared, conf=detector._conf_th, iou=detector._nms_iou, half=False,
+        device=None, max_det=100, augment=False, agnostic_nms=True, classes=None, verbose=False,
+    )
+    return [_yolo_v8_results_to_dict(results=result, image=image) for result, image in zip(results, prepared)]
+
+
+def detect_and_decode_batch(images):
+    """Detect and decode QR codes on several RGB page images (numpy, HxWx3).
+
+    Returns one tuple of decoded values (``None`` for unreadable codes) per image, in order.
+    Batches of ``settings.QREADER_BATCH_SIZE`` images share a single model call.
+    """
+    reader = get_reader()
+    decoded = []
+    batch_size = max(settings.QREADER_BATCH_SIZE, 1)
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        with metrics.timer("qreader"):
+            try:
+                detections = _predict_batch(reader, batch)
+            except (ImportError, AttributeError) as e:
+                # qrdet khác version -> quay về gọi từng ảnh
+                logger.info(f"QReader batch inference unavailable ({e}), falling back to per-image calls")
+                decoded.extend(reader.detect_and_decode(image=image) for image in batch)
+                continue
+            for image, image_detections in zip(batch, detections):
+                decoded.append(tuple(reader.decode(image=image, detection_result=d) for d in image_detections))
+    return decoded
@@ -0,0 +1,258 @@
+"""Page rasterization for the decode pipeline.
+
+Two backends, picked with ``settings.RENDER_BACKEND``:
+
+- ``pdfium`` (pypdfium2): the PDF is opened once and pages are rendered in-process,
+  straight into a NumPy array in RGB or grayscale. Open documents are kept in a small
+  per-process LRU pool (``RENDER_DOC_POOL``), so every page of a file, and every DPI
+  step of a page, reuses the same handle. No subprocess, no temp image, no extra copy.
+- ``pdftoppm`` (poppler, the binary pdf2image wraps): one subprocess per page, PPM on
+  stdout. Used when pypdfium2 is not installed.
+
+``auto`` (default) uses pdfium when available. Both can crop a region of interest at
+render time instead of rasterizing the whole page at 300 DPI and throwing most of it away.
+
+Scanner output is mostly one JPEG / CCITT image per page. For such image-only pages
+(one image covering the page, at most an invisible OCR text layer next to it)
+:func:`page_image` skips rasterization entirely: the embedded image is decoded at its
+native resolution, oriented like the displayed page and cropped to the ROI. Rendering at
+a higher DPI would add nothing to it, so callers stop escalating DPI for native images.
+Vector or mixed pages are rendered as usual.
+
+A region of interest is a tuple of page fractions ``(left, top, right, bottom)``;
+``settings.ROI_TEMPLATES`` maps an action (or a job kind) to one, ``None`` meaning the full
+page. Callers walk ``settings.RENDER_DPI_STEPS`` from low to high DPI and only re-render
+when decoding at the current step failed.
+"""
+
+import atexit
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+
+import cv2
+import numpy as np
+from django.conf import settings
+from PIL import Image
+from PyPDF2 import PdfReader
+
+from . import metrics
+
+try:
+    import pypdfium2 as pdfium
+    import pypdfium2.raw as pdfium_c
+except ImportError:
+    pdfium = pdfium_c = None
+
+POINTS_PER_INCH = 72
+# ảnh nhúng phải phủ ít nhất chừng này diện tích trang mới coi là trang scan
+NATIVE_MIN_COVERAGE = 0.9
+
+BACKEND_PDFIUM = "pdfium"
+BACKEND_PDFTOPPM = "pdftoppm"
+
+# pdfium không thread-safe: mọi lời gọi trong một process đi qua lock này
+_pdfium_lock = threading.RLock()
+_documents = OrderedDict()
+
+
+def backend():
+    if settings.RENDER_BACKEND == BACKEND_PDFTOPPM or (settings.RENDER_BACKEND == "auto" and pdfium is None):
+        return BACKEND_PDFTOPPM
+    if pdfium is None:
+        raise RuntimeError("RENDER_BACKEND=pdfium but pypdfium2 is not installed")
+    return BACKEND_PDFIUM
+
+
+def roi_for(action, kind=None):
+    """ROI template of an action, falling back to the template of its job kind."""
+    templates = settings.ROI_TEMPLATES
+    if action in templates:
+        return templates[action]
+    return templates.get(kind)
+
+
+@lru_cache(maxsize=256)
+def page_size(pdf_path, page_number):
+    """Displayed page size in points, as pdftoppm sees it (media box, /Rotate applied)."""
+    page = PdfReader(pdf_path).pages[page_number - 1]
+    width, height = float(page.mediabox.width), float(page.mediabox.height)
+    if (page.get("/Rotate") or 0) % 180:
+        width, height = height, width
+    return width, height
+
+
+def crop_box(pdf_path, page_number, dpi, roi):
+    """Pixel crop ``(x, y, w, h)`` of ``roi`` on a page rendered at ``dpi``."""
+    width, height = page_size(pdf_path, page_number)
+    scale = dpi / POINTS_PER_INCH
+    left, top, right, bottom = roi
+    x, y = int(width * scale * left), int(height * scale * top)
+    return x, y, max(int(width * scale * right) - x, 1), max(int(height * scale * bottom) - y, 1)
+
+
+def open_document(pdf_path):
+    """Pooled pdfium document of ``pdf_path``; reopened when the file changed. Call with ``_pdfium_lock`` held."""
+    stat = os.stat(pdf_path)
+    key = str(pdf_path)
+    entry = _documents.get(key)
+    if entry is not None and entry[0] == (stat.st_mtime_ns, stat.st_size):
+        _documents.move_to_end(key)
+        return entry[1]
+    if entry is not None:
+        entry[1].close()
+    document = pdfium.PdfDocument(key)
+    _documents[key] = ((stat.st_mtime_ns, stat.st_size), document)
+    while len(_documents) > max(settings.RENDER_DOC_POOL, 1):
+        _, (_, evicted) = _documents.popitem(last=False)
+        evicted.close()
+    return document
+
+
+def close_documents():
+    with _pdfium_lock:
+        while _documents:
+            _, (_, document) = _documents.popitem()
+            document.close()
+
+
+atexit.register(close_documents)
+
+
+def page_count(pdf_path):
+    if backend() == BACKEND_PDFIUM:
+        with _pdfium_lock:
+            return len(open_document(pdf_path))
+    return len(PdfReader(pdf_path).pages)
+
+
+def _render_pdfium(pdf_path, page_number, dpi, roi, gray):
+    with _pdfium_lock:
+        page = open_document(pdf_path)[page_number - 1]
+        try:
+            crop = (0, 0, 0, 0)
+            if roi:
+                # crop tính theo point, đo từ các cạnh của trang đã xoay (left, bottom, right, top)
+                width, height = page.get_size()
+                left, top, right, bottom = roi
+                crop = (width * left, height * (1 - bottom), width * (1 - right), height * top)
+            bitmap = page.render(scale=dpi / POINTS_PER_INCH, crop=crop, grayscale=gray, rev_byteorder=not gray)
+            # bitmap do Python cấp phát: mảng numpy giữ buffer, không cần copy
+            image = bitmap.to_numpy()
+        finally:
+            page.close()
+    if not gray and image.ndim == 3 and image.shape[2] == 4:
+        image = image[:, :, :3]
+    return image
+
+
+def _render_pdftoppm(pdf_path, page_number, dpi, roi, gray):
+    args = ["pdftoppm", "-r", str(dpi), "-f", str(page_number), "-l", str(page_number)]
+    if gray:
+        args.append("-gray")
+    if roi:
+        x, y, w, h = crop_box(pdf_path, page_number, dpi, roi)
+        args += ["-x", str(x), "-y", str(y), "-W", str(w), "-H", str(h)]
+    args.append(str(pdf_path))
+
+    proc = subprocess.run(args, capture_output=True, timeout=settings.RENDER_TIMEOUT)
+    if proc.returncode != 0 or not proc.stdout:
+        raise RuntimeError(f"pdftoppm failed on {pdf_path} page {page_number}: {proc.stderr.decode(errors='replace')}")
+    return np.array(Image.open(BytesIO(proc.stdout)))
+
+
+def _scanned_image(page):
+    """The image object of an image-only page, ``None`` for vector or mixed pages."""
+    image = None
+    for obj in page.get_objects():
+        if obj.type == pdfium_c.FPDF_PAGEOBJ_IMAGE and image is None:
+            image = obj
+        elif obj.type != pdfium_c.FPDF_PAGEOBJ_TEXT:
+            return None
+    if image is None:
+        return None
+    left, bottom, right, top = image.get_bounds()
+    width, height = page.get_size()
+    if (right - left) * (top - bottom) < NATIVE_MIN_COVERAGE * width * height:
+        return None
+    return image
+
+
+def _orient(pixels, matrix, rotation):
+    """Image pixels (top row first) as laid out on the displayed page, ``None`` if skewed."""
+    a, b, c, d, _, _ = matrix
+    if b == 0 and c == 0:
+        if a < 0:
+            pixels = pixels[:, ::-1]
+        if d < 0:
+            pixels = pixels[::-1]
+    elif a == 0 and d == 0:
+        # ảnh đặt xoay 90°: trục x của ảnh theo trục y của trang và ngược lại
+        pixels = pixels.swapaxes(0, 1)
+        if b > 0:
+            pixels = pixels[::-1]
+        if c > 0:
+            pixels = pixels[:, ::-1]
+    else:
+        return None
+    # /Rotate của trang là chiều kim đồng hồ, np.rot90 xoay ngược chiều kim đồng hồ
+    return np.rot90(pixels, k=-(rotation // 90) % 4)
+
+
+def native_image(pdf_path, page_number, roi=None, gray=False):
+    """Embedded image of an image-only page at native resolution, ``None`` if the page must be rendered.
+
+    Grayscale when the image is (CCITT / gray JPEG) or when ``gray`` is asked for, RGB otherwise.
+    """
+    if not settings.RENDER_NATIVE_IMAGES or backend() != BACKEND_PDFIUM:
+        return None
+    with _pdfium_lock:
+        page = open_document(pdf_path)[page_number - 1]
+        try:
+            image = _scanned_image(page)
+            if image is None:
+                return None
+            if image.get_metadata().bits_per_pixel == 1:
+                # ảnh 1 bit có thể có /Decode hoặc là mask: để pdfium áp dụng (kèm ma trận của ảnh)
+                bitmap, matrix = image.get_bitmap(render=True), (1, 0, 0, 1, 0, 0)
+            else:
+                bitmap, matrix = image.get_bitmap(render=False), image.get_matrix().get()
+            pixels = _orient(bitmap.to_numpy(), matrix, page.get_rotation())
+            if pixels is None:
+                return None
+            if roi:
+                height, width = pixels.shape[:2]
+                left, top, right, bottom = roi
+                pixels = pixels[int(height * top):max(int(height * bottom), int(height * top) + 1),
+                                int(width * left):max(int(width * right), int(width * left) + 1)]
+            # buffer của bitmap do pdfium giữ: chỉ copy phần ROI ra trước khi đóng
+            pixels = pixels.copy()
+        except Exception:
+            return None
+        finally:
+            page.close()
+
+    if pixels.ndim == 3:
+        # pdfium trả BGR / BGRx / BGRA
+        pixels = cv2.cvtColor(pixels[:, :, :3], cv2.COLOR_BGR2GRAY if gray else cv2.COLOR_BGR2RGB)
+    return pixels
+
+
+def page_image(pdf_path, page_number, dpi=300, roi=None, gray=False):
+    """``(image, native)``: the embedded image of a scanned page, or the page rendered at ``dpi``."""
+    with metrics.timer("render", [pdf_path]):
+        image = native_image(pdf_path, page_number, roi, gray)
+        if image is not None:
+            metrics.registry.inc("render_total", source="native")
+            return image, True
+        render = _render_pdfium if backend() == BACKEND_PDFIUM else _render_pdftoppm
+        metrics.registry.inc("render_total", source=backend())
+        return render(pdf_path, page_number, dpi, roi, gray), False
+
+
+def render_page(pdf_path, page_number, dpi=300, roi=None, gray=False):
+    """Render one page (or only its ``roi``) to a numpy array, RGB or grayscale."""
+    return page_image(pdf_path, page_number, dpi, roi, gray)[0]
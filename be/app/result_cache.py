@@ -0,0 +1,127 @@
+"""Decode results cached by file content.
+
+Keys are ``(sha256, kind, action, decoders.DECODER_VERSION, settings digest)`` so
+re-uploaded scans skip rendering and decoding entirely, while a decoder change or a change
+of one of the :data:`DECODE_SETTINGS` (naming patterns, ROI templates, render DPI steps,
+...) invalidates old entries.
+
+The store is one SQLite file (``DECODE_CACHE_PATH``, WAL, shared by all worker
+processes), separate from the application DB so cache writes never wait for its write
+lock. Entries are evicted least recently used first once their total size is over
+``DECODE_CACHE_MAX_BYTES``; the running total is kept in the ``meta`` table, so a lookup
+or a write costs a few index operations whatever the number of entries.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+from .decoders import DECODER_VERSION
+
+MISS = object()
+# settings làm thay đổi kết quả decode của cùng một file
+DECODE_SETTINGS = (
+    "PATTERNS", "ROI_TEMPLATES", "RENDER_DPI_STEPS", "RENDER_NATIVE_IMAGES", "PREPROCESS_STEPS", "PREPROCESS_SCALES",
+    "QR_FAST_MAX_SIDE", "DATAMATRIX_ENABLED", "QREADER_MODEL_SIZE",
+)
+# đọc lại một entry thì chỉ ghi lại thời điểm dùng nếu đã cũ hơn chừng này (đỡ một lệnh ghi mỗi lần hit)
+TOUCH_INTERVAL = 3600
+# dọn xuống dưới ngân sách một khoảng để không phải dọn ở mỗi lần ghi
+EVICT_TO = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (name, value) VALUES ('bytes', 0);
+"""
+
+_local = threading.local()
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def settings_digest():
+    values = [getattr(settings, name, None) for name in DECODE_SETTINGS]
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+def cache_key(sha256, kind, action):
+    return f"decode:{sha256}:{kind}:{action}:{DECODER_VERSION}:{settings_digest()}"
+
+
+def connection():
+    """SQLite connection of this thread (and process: a spawned worker opens its own)."""
+    path = settings.DECODE_CACHE_PATH
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.key != (os.getpid(), path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _local.conn, _local.key = conn, (os.getpid(), path)
+    return conn
+
+
+def get(sha256, kind, action):
+    """Cached decode result, or ``MISS``. ``None`` is a valid cached result (no code found)."""
+    if not sha256:
+        return MISS
+    key = cache_key(sha256, kind, action)
+    conn = connection()
+    row = conn.execute("SELECT value, used FROM entries WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return MISS
+    now = time.time()
+    if now - row[1] > TOUCH_INTERVAL:
+        conn.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+    return pickle.loads(row[0])
+
+
+def set(sha256, kind, action, value):
+    if not sha256:
+        return
+    key = cache_key(sha256, kind, action)
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    conn = connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        old = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        conn.execute("INSERT OR REPLACE INTO entries (key, value, size, used) VALUES (?, ?, ?, ?)", (key, data, len(data), time.time()))
+        total = conn.execute(
+            "UPDATE meta SET value = value + ? WHERE name = 'bytes' RETURNING value", (len(data) - (old[0] if old else 0),)
+        ).fetchone()[0]
+        if total > settings.DECODE_CACHE_MAX_BYTES:
+            evict(conn, total - int(settings.DECODE_CACHE_MAX_BYTES * EVICT_TO))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def evict(conn, excess):
+    """Remove the least recently used entries until ``excess`` bytes are freed (inside the write transaction)."""
+    freed = 0
+    while freed < excess:
+        rows = conn.execute("SELECT key, size FROM entries ORDER BY used LIMIT 500").fetchall()
+        if not rows:
+            break
+        for key, size in rows:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            freed += size
+            if freed >= excess:
+                break
+    conn.execute("UPDATE meta SET value = value - ? WHERE name = 'bytes'", (freed,))
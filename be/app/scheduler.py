@@ -0,0 +1,201 @@
+"""Fair scheduling between sessions and admission control for the job queue.
+
+One large session must not hold the workers while small ones wait behind it:
+
+- the dispatcher claims queued jobs of the sessions with the fewest running jobs first and
+  never runs more than JOB_SESSION_MAX_RUNNING jobs of one session, on any host,
+- it runs up to JOB_MAX_RUNNING jobs at once and gives every free worker slot to the job
+  chosen by :class:`FairQueue` (weighted fair queuing per session, weights from
+  JOB_SESSION_WEIGHTS), so a 5-file session gets its slots next to a 2,000-file one
+  instead of after it.
+
+New jobs are refused (:class:`Overloaded`, HTTP 429 with ``Retry-After``) while the queue
+is deeper than JOB_MAX_QUEUED jobs or JOB_MAX_BACKLOG_FILES files, or memory use is over
+JOB_MAX_MEMORY_PERCENT. Memory is the highest reading published by the live dispatchers
+(``WorkerStatus``), taken in their containers where the decode workers run, not in the web
+process answering the request. Work already queued is never dropped. :func:`queue_stats` is what
+``GET /app/queue/`` returns.
+"""
+
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+
+from . import metrics
+from .models import File, Job, WorkerStatus
+
+CGROUP_MEMORY = ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current")
+
+
+class Overloaded(Exception):
+    """The queue is over one of its limits; retry in ``retry_after`` seconds."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Server busy ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def weight(session_id):
+    """Weight of ``session_id``: the longest matching ``prefix:weight`` of JOB_SESSION_WEIGHTS, else 1."""
+    matched, result = -1, 1.0
+    for entry in settings.JOB_SESSION_WEIGHTS:
+        prefix, _, value = entry.rpartition(":")
+        if session_id.startswith(prefix) and len(prefix) > matched:
+            matched, result = len(prefix), float(value)
+    return max(result, 0.01)
+
+
+class FairQueue:
+    """Weighted fair queuing of worker slots between the sessions of the running jobs.
+
+    Every session has a virtual time that grows by ``cost / weight`` for each task it is
+    given; the next slot goes to the job of the session with the smallest one. A session
+    joining starts at the smallest virtual time of the active sessions, so it gets no credit
+    for the time it was idle and does not pay for the work done before it arrived.
+    """
+
+    def __init__(self):
+        self.vtime = {}
+
+    def activate(self, session_id):
+        if session_id not in self.vtime:
+            self.vtime[session_id] = min(self.vtime.values(), default=0.0)
+
+    def deactivate(self, session_id):
+        self.vtime.pop(session_id, None)
+
+    def pick(self, runs):
+        """The run to submit the next task of, among ``runs`` with a task ready."""
+        # bằng nhau thì job ít task đang chạy hơn đi trước (phiên vừa tới không phải chờ lượt)
+        return min(runs, key=lambda run: (self.vtime[run.job.session_id], run.in_flight, run.job.id), default=None)
+
+    def charge(self, session_id, cost):
+        self.vtime[session_id] += cost / weight(session_id)
+
+
+def claim_order(queued, running):
+    """``queued`` jobs that may start now, the best candidates first.
+
+    ``running`` is ``[(session_id, kind, action)]`` of the running jobs. A job waits while
+    its session, kind and action already run (it only gets the files that arrived since) or
+    its session runs JOB_SESSION_MAX_RUNNING jobs. Sessions with fewer running jobs for their
+    weight go first, oldest job first among equals.
+    """
+    busy = set(running)
+    per_session = {}
+    for session_id, _, _ in running:
+        per_session[session_id] = per_session.get(session_id, 0) + 1
+    limit = settings.JOB_SESSION_MAX_RUNNING
+    candidates = [
+        job for job in queued
+        if (job.session_id, job.kind, job.action) not in busy and (not limit or per_session.get(job.session_id, 0) < limit)
+    ]
+    return sorted(candidates, key=lambda job: per_session.get(job.session_id, 0) / weight(job.session_id))
+
+
+def memory_percent():
+    """Memory in use in this container, in percent of its limit (cgroup v2) or of the host; ``None`` if unknown."""
+    try:
+        with open(CGROUP_MEMORY[0]) as f:
+            limit = f.read().strip()
+        if limit != "max":
+            with open(CGROUP_MEMORY[1]) as f:
+                return round(100 * int(f.read()) / int(limit), 1)
+    except (OSError, ValueError, ZeroDivisionError):
+        pass
+    try:
+        with open("/proc/meminfo") as f:
+            info = {line.split(":")[0]: int(line.split()[1]) for line in f}
+        return round(100 * (1 - info["MemAvailable"] / info["MemTotal"]), 1)
+    except (OSError, KeyError, ValueError, ZeroDivisionError):
+        return None
+
+
+def workers_memory_percent():
+    """Highest memory use published by the dispatchers alive within JOB_LEASE; ``None`` if none did."""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_LEASE)
+    return WorkerStatus.objects.filter(heartbeat_at__gte=cutoff).aggregate(value=Max("memory_percent"))["value"]
+
+
+def sessions():
+    """``{session_id: {"queued", "running", "remaining"}}`` of the sessions with active jobs.
+
+    ``remaining`` counts the files left in running jobs plus every file of the sessions with
+    a queued job (an upper bound: files already done are skipped when the job runs).
+    """
+    result = {}
+    queued = list(Job.objects.filter(status=Job.Status.QUEUED).values_list("session_id", flat=True))
+    files = dict(
+        File.objects.filter(session_id__in=set(queued)).values("session_id").annotate(n=Count("id")).values_list("session_id", "n")
+    )
+    for session_id in queued:
+        row = result.setdefault(session_id, {"queued": 0, "running": 0, "remaining": 0})
+        row["queued"] += 1
+        row["remaining"] += files.get(session_id, 0)
+    running = (
+        Job.objects.filter(status=Job.Status.RUNNING).values("session_id")
+        .annotate(n=Count("id"), left=Sum(F("total") - F("processed") - F("failed")))
+    )
+    for row in running:
+        session = result.setdefault(row["session_id"], {"queued": 0, "running": 0, "remaining": 0})
+        session["running"] += row["n"]
+        session["remaining"] += max(row["left"] or 0, 0)
+    return result
+
+
+def load(active=None):
+    """Current queue depth and workers' memory use, with the limit each of them is checked against."""
+    active = sessions() if active is None else active
+    return {
+        "queued": (sum(row["queued"] for row in active.values()), settings.JOB_MAX_QUEUED),
+        "backlogFiles": (sum(row["remaining"] for row in active.values()), settings.JOB_MAX_BACKLOG_FILES),
+        "memoryPercent": (workers_memory_percent(), settings.JOB_MAX_MEMORY_PERCENT),
+    }
+
+
+def overloaded(current=None):
+    """:class:`Overloaded` for the first limit exceeded, ``None`` when new work is accepted."""
+    for reason, (value, limit) in (load() if current is None else current).items():
+        if limit and value is not None and value >= limit:
+            # càng vượt ngưỡng nhiều càng bảo client chờ lâu, tối đa 10 lần JOB_RETRY_AFTER
+            ratio = min(value / limit, 10.0)
+            return Overloaded(reason, int(math.ceil(settings.JOB_RETRY_AFTER * ratio)))
+    return None
+
+
+def admit():
+    """Raise :class:`Overloaded` when a new job cannot be accepted now."""
+    error = overloaded()
+    if error is not None:
+        metrics.registry.inc("jobs_rejected_total", reason=error.reason)
+        metrics.registry.flush()
+        raise error
+
+
+def queue_stats(limit=100):
+    """Queue depth, limits and the ``limit`` sessions with the most work left, for ``GET /app/queue/``."""
+    active = sessions()
+    current = load(active)
+    error = overloaded(current)
+    top = sorted(active.items(), key=lambda item: item[1]["remaining"], reverse=True)[:limit]
+    return {
+        "accepting": error is None,
+        "reason": error.reason if error else None,
+        "retryAfter": error.retry_after if error else None,
+        "queued": current["queued"][0],
+        "running": sum(row["running"] for row in active.values()),
+        "backlogFiles": current["backlogFiles"][0],
+        "memoryPercent": current["memoryPercent"][0],
+        "limits": {
+            "maxQueued": settings.JOB_MAX_QUEUED,
+            "maxBacklogFiles": settings.JOB_MAX_BACKLOG_FILES,
+            "maxMemoryPercent": settings.JOB_MAX_MEMORY_PERCENT,
+            "maxRunning": settings.JOB_MAX_RUNNING,
+            "sessionMaxRunning": settings.JOB_SESSION_MAX_RUNNING,
+        },
+        "sessions": [dict(row, sessionId=session_id, weight=weight(session_id)) for session_id, row in top],
+    }
@@ -0,0 +1,26 @@
+from django.conf import settings
+from rest_framework import serializers
+
+from .models import FileResult
+
+
+class FileResultSerializer(serializers.ModelSerializer):
+    fileId = serializers.IntegerField(source="file_id")
+    jobId = serializers.IntegerField(source="job_id")
+    name = serializers.CharField(source="file.original_name")
+    url = serializers.SerializerMethodField()
+    createdAt = serializers.DateTimeField(source="created_at")
+
+    class Meta:
+        model = FileResult
+        fields = [
+            "id", "fileId", "jobId", "name", "kind", "action", "value", "decoder", "symbology",
+            "bbox", "confidence", "page", "output", "url", "error", "createdAt",
+        ]
+
+    def get_url(self, obj):
+        if not obj.output:
+            return None
+        url = f"{settings.MEDIA_URL}{obj.output}"
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
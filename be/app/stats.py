@@ -0,0 +1,165 @@
+"""Processing statistics rollups for the report screen.
+
+Counting from ``File`` / ``FileResult`` or the media tree on every report means scanning
+millions of rows, and the janitor removes them with their sessions anyway. Instead every
+job adds its finished files to :class:`DailyStat` rows, one per day, kind, action and
+outcome, in the transaction that stores its progress (:class:`Rollup`, fed by
+``jobs.Progress``). Reports only read those rows: a year of history stays a few thousand
+rows whatever the number of files.
+
+Processing time percentiles come from a histogram per row over ``metrics.BUCKETS``,
+interpolated within the bucket, so they are approximate.
+"""
+
+import bisect
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import decoders, metrics
+from .models import DailyStat, Job
+
+OUTCOME_SUCCESS = "success"
+OUTCOME_NO_CODE = "no_code"
+OUTCOME_FAILED = "failed"
+
+GROUPS = ("date", "kind", "action", "outcome")
+PERCENTILES = (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+
+
+def outcome(kind, error, info):
+    """Outcome of a finished file, from the arguments of ``Progress.file_done``.
+
+    A qrcode / barcode file is a success only when the value that named it matches
+    ``settings.PATTERNS`` (other symbols on the page do not count); a split file when at
+    least one of its segments was cut at a code.
+    """
+    if error is not None:
+        return OUTCOME_FAILED
+    if kind == Job.KIND_PDF2LAYER:
+        return OUTCOME_SUCCESS
+    if kind == Job.KIND_SPLIT:
+        found = any(row.get("output") and row.get("value") for row in info.get("results") or ())
+    else:
+        # barcode đặt tên theo mã đầu tiên khi không mã nào khớp PATTERNS: vẫn là "không có mã"
+        found = decoders.match_patterns(info.get("value"))
+    return OUTCOME_SUCCESS if found else OUTCOME_NO_CODE
+
+
+def empty_buckets():
+    return [0] * (len(metrics.BUCKETS) + 1)
+
+
+def merge_buckets(total, buckets):
+    total.extend([0] * (len(buckets) - len(total)))
+    for i, count in enumerate(buckets):
+        total[i] += count
+    return total
+
+
+def percentile(buckets, q):
+    """Approximate ``q`` quantile (seconds) of a bucket histogram, ``None`` when empty."""
+    count = sum(buckets)
+    if not count:
+        return None
+    rank, cumulative = q * count, 0
+    for i, n in enumerate(buckets):
+        if n and cumulative + n >= rank:
+            if i >= len(metrics.BUCKETS):
+                return metrics.BUCKETS[-1]
+            lower = metrics.BUCKETS[i - 1] if i else 0.0
+            return lower + (metrics.BUCKETS[i] - lower) * (rank - cumulative) / n
+        cumulative += n
+    return metrics.BUCKETS[-1]
+
+
+class Rollup:
+    """Counters of one job, added to the ``DailyStat`` rows by :meth:`flush`."""
+
+    def __init__(self, kind, action):
+        self.kind = kind
+        self.action = action
+        self.deltas = {}
+
+    def add(self, outcome, pages=0, size=0, seconds=0.0):
+        key = (timezone.localdate(), outcome)
+        delta = self.deltas.setdefault(key, {"files": 0, "pages": 0, "bytes": 0, "seconds": 0.0, "buckets": empty_buckets()})
+        delta["files"] += 1
+        delta["pages"] += pages
+        delta["bytes"] += size
+        delta["seconds"] += seconds
+        delta["buckets"][bisect.bisect_left(metrics.BUCKETS, seconds)] += 1
+
+    def flush(self):
+        """Add the counters to their rows; runs inside the caller's transaction."""
+        for (day, outcome), delta in self.deltas.items():
+            # khoá dòng (PostgreSQL) / write lock IMMEDIATE (SQLite): nhiều dispatcher cộng vào cùng một dòng
+            stat, _ = DailyStat.objects.select_for_update().get_or_create(
+                date=day, kind=self.kind, action=self.action, outcome=outcome,
+            )
+            stat.files += delta["files"]
+            stat.pages += delta["pages"]
+            stat.bytes += delta["bytes"]
+            stat.seconds += delta["seconds"]
+            stat.buckets = merge_buckets(list(stat.buckets), delta["buckets"])
+            stat.save()
+        self.deltas = {}
+
+
+def rows(start=None, end=None, kind=None, action=None):
+    """``DailyStat`` rows between ``start`` and ``end`` (dates, inclusive)."""
+    queryset = DailyStat.objects.all()
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+    if kind:
+        queryset = queryset.filter(kind=kind)
+    if action:
+        queryset = queryset.filter(action=action)
+    return queryset
+
+
+def keys(queryset, group):
+    """Distinct values of ``group`` in ``queryset``, in order (what the report paginates)."""
+    return queryset.order_by(group).values_list(group, flat=True).distinct()
+
+
+def _summary(counts, buckets):
+    files = sum(counts.get(outcome, {}).get("files", 0) for outcome in (OUTCOME_SUCCESS, OUTCOME_NO_CODE, OUTCOME_FAILED))
+    seconds = sum(values["seconds"] for values in counts.values())
+    success = counts.get(OUTCOME_SUCCESS, {}).get("files", 0)
+    summary = {
+        "processed": files,
+        "success": success,
+        "noCode": counts.get(OUTCOME_NO_CODE, {}).get("files", 0),
+        "failed": counts.get(OUTCOME_FAILED, {}).get("files", 0),
+        "pages": sum(values["pages"] for values in counts.values()),
+        "bytes": sum(values["bytes"] for values in counts.values()),
+        "decodeRate": round(success / files, 4) if files else None,
+        "seconds": {"total": round(seconds, 3), "avg": round(seconds / files, 3) if files else None},
+    }
+    for name, q in PERCENTILES:
+        value = percentile(buckets, q)
+        summary["seconds"][name] = round(value, 3) if value is not None else None
+    return summary
+
+
+def summarize(queryset, group=None):
+    """Summary of every ``group`` value in ``queryset`` (``{value: summary}``), or of all of it."""
+    counts = (
+        queryset.values(*([group] if group else []), "outcome")
+        .annotate(files=Sum("files"), pages=Sum("pages"), bytes=Sum("bytes"), seconds=Sum("seconds"))
+        .order_by()
+    )
+    grouped, buckets = {}, {}
+    for row in counts:
+        grouped.setdefault(row.get(group), {})[row["outcome"]] = row
+    # histogram là JSON: cộng ở Python, chỉ trên các dòng rollup (ít) chứ không phải từng file
+    for key, row_buckets in queryset.values_list(group or "id", "buckets"):
+        merge_buckets(buckets.setdefault(key if group else None, empty_buckets()), row_buckets)
+
+    summaries = {key: _summary(values, buckets.get(key, [])) for key, values in grouped.items()}
+    if group:
+        return summaries
+    return summaries.get(None) or _summary({}, [])
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.test import SimpleTestCase
+
+from .. import aidoc
+
+
+class StubAiDoc(BaseHTTPRequestHandler):
+    """AiDoc giả: trả 503 cho ``fail`` request đầu tiên, cắt kết nối giữa body cho ``truncate`` request
+    tiếp theo, sau đó trả lại đúng nội dung file đã upload."""
+
+    fail = 0
+    truncate = 0
+    bodies = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        type(self).bodies.append((self.path, self.headers["Authorization"], body))
+        if type(self).fail > 0:
+            type(self).fail -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        content = body.split(b"\r\n\r\n", 3)[-1].rsplit(b"\r\n--", 1)[0]
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if type(self).truncate > 0:
+            type(self).truncate -= 1
+            # HTTP/1.0: kết nối đóng khi handler trả về, client nhận thiếu body
+            self.wfile.write(content[:len(content) // 2])
+            return
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class AiDocClientTests(SimpleTestCase):
+    def setUp(self):
+        StubAiDoc.fail, StubAiDoc.truncate, StubAiDoc.bodies = 0, 0, []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubAiDoc)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.src = os.path.join(self.tmp.name, "scan.pdf")
+        self.dst = os.path.join(self.tmp.name, "scan-2layer.pdf")
+        with open(self.src, "wb") as f:
+            f.write(b"%PDF-1.4 stub" * 1000)
+
+    def aidoc_client(self, retries=2):
+        host, port = self.server.server_address
+        return aidoc.AiDocClient(
+            base_url=f"http://{host}:{port}/", token="t0ken", concurrency=2, retries=retries, backoff=0, timeout=(5, 5)
+        )
+
+    def test_streams_file_and_writes_response(self):
+        states = []
+        self.aidoc_client().pdf2layer(self.src, self.dst, progress=lambda path, state, **info: states.append(state))
+
+        path, token, body = StubAiDoc.bodies[0]
+        self.assertEqual(path, aidoc.PDF2LAYER_PATH)
+        self.assertEqual(token, "t0ken")
+        self.assertIn(b'name="folder"', body)
+        with open(self.src, "rb") as src, open(self.dst, "rb") as dst:
+            self.assertEqual(src.read(), dst.read())
+        self.assertFalse(os.path.exists(f"{self.dst}.part"))
+        self.assertEqual(states, ["uploading", "done"])
+
+    def test_retries_transient_errors(self):
+        StubAiDoc.fail = 2
+        states = []
+        self.aidoc_client(retries=2).pdf2layer(self.src, self.dst, progress=lambda path, state, **info: states.append(state))
+
+        self.assertEqual(len(StubAiDoc.bodies), 3)
+        self.assertEqual(states, ["uploading", "retry", "uploading", "retry", "uploading", "done"])
+        self.assertTrue(os.path.exists(self.dst))
+
+    def test_gives_up_after_retries(self):
+        StubAiDoc.fail = 5
+        with self.assertRaises(requests.HTTPError):
+            self.aidoc_client(retries=1).pdf2layer(self.src, self.dst)
+        self.assertEqual(len(StubAiDoc.bodies), 2)
+        self.assertFalse(os.path.exists(self.dst))
+
+    def test_cut_response_leaves_no_partial_file(self):
+        StubAiDoc.truncate = 1
+        states = []
+        self.aidoc_client(retries=1).pdf2layer(self.src, self.dst, progress=lambda path, state, **info: states.append(state))
+
+        self.assertEqual(states, ["uploading", "retry", "uploading", "done"])
+        with open(self.src, "rb") as src, open(self.dst, "rb") as dst:
+            self.assertEqual(src.read(), dst.read())
+        self.assertFalse(os.path.exists(f"{self.dst}.part"))
+
+        StubAiDoc.truncate = 5
+        os.remove(self.dst)
+        with self.assertRaises(requests.RequestException):
+            self.aidoc_client(retries=1).pdf2layer(self.src, self.dst)
+        self.assertEqual(os.listdir(self.tmp.name), ["scan.pdf"])
@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from .. import benchmark
+
+
+class CorpusTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.folder = os.path.join(self.tmp.name, "corpus")
+
+    def test_reused_then_regenerated_for_another_seed(self):
+        first = benchmark.load_or_generate_corpus(self.folder, seed=1, limit=2)
+        self.assertTrue(os.path.exists(os.path.join(self.folder, benchmark.MARKER)))
+        self.assertEqual(benchmark.load_or_generate_corpus(self.folder, seed=1, limit=2), first)
+
+        # thư mục output do view tạo ra cũng thuộc corpus
+        os.makedirs(os.path.join(self.folder, "qrcode"))
+        second = benchmark.load_or_generate_corpus(self.folder, seed=2, limit=2)
+        self.assertEqual(second["seed"], 2)
+        self.assertFalse(os.path.exists(os.path.join(self.folder, "qrcode")))
+        names = sorted(os.path.basename(case["file"]) for case in second["cases"])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.folder, "uploads"))), names)
+
+    def test_refuses_a_folder_it_did_not_create(self):
+        os.makedirs(self.folder)
+        with open(os.path.join(self.folder, "thesis.docx"), "w") as f:
+            f.write("do not delete")
+        with self.assertRaises(ValueError):
+            benchmark.load_or_generate_corpus(self.folder, seed=1, limit=1)
+        with self.assertRaises(CommandError):
+            call_command("bench_decode", corpus=self.folder, limit=1)
+        self.assertEqual(os.listdir(self.folder), ["thesis.docx"])
+
+    def test_refuses_a_corpus_with_foreign_files(self):
+        benchmark.load_or_generate_corpus(self.folder, seed=1, limit=1)
+        with open(os.path.join(self.folder, "notes.txt"), "w") as f:
+            f.write("mine")
+        with self.assertRaises(ValueError):
+            benchmark.load_or_generate_corpus(self.folder, seed=2, limit=1)
+        with open(os.path.join(self.folder, "manifest.json")) as f:
+            self.assertEqual(json.load(f)["seed"], 1)
+
+
+class CompareTests(SimpleTestCase):
+    def report(self, files_per_sec, accuracy):
+        return {"results": {"qrcode": {"files_per_sec": files_per_sec, "accuracy": accuracy}}}
+
+    def test_throughput_and_accuracy_regressions(self):
+        baseline = self.report(10.0, 0.95)
+        self.assertEqual(benchmark.compare(self.report(9.5, 0.95), baseline), [])
+        self.assertEqual(benchmark.compare(self.report(8.0, 0.95), baseline), ["qrcode: 8.0 files/s < baseline 10.0"])
+        self.assertEqual(benchmark.compare(self.report(10.0, 0.9), baseline), ["qrcode: accuracy 0.9 < baseline 0.95"])
+        self.assertEqual(benchmark.compare(self.report(1.0, 0.1), {"results": {}}), [])
@@ -0,0 +1,152 @@
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from .. import decoders, jobs, metrics, preprocess, qr_model
+
+CODE = "HD-2024-000123"
+
+
+def counter(name, **labels):
+    return metrics.registry.counters.get((name, metrics._labels_key(labels)), 0)
+
+
+@override_settings(PATTERNS=[r"^HD-\d{4}-\d{6}$"], DATAMATRIX_ENABLED=True)
+class CascadeTests(SimpleTestCase):
+    """Các tier rẻ được thay bằng stub ghi lại thứ tự gọi, trả về kết quả theo từng ảnh."""
+
+    def setUp(self):
+        self.calls = []
+        # {tier: {điểm ảnh đánh dấu trang: [symbol]}}, trang không có trong dict thì tier không đọc được gì
+        self.found = {decoders.TIER_PYZBAR: {}, decoders.TIER_OPENCV: {}, decoders.TIER_DMTX: {}}
+        self.model = {}
+        for name, tier in (("scan_pyzbar", decoders.TIER_PYZBAR), ("scan_opencv", decoders.TIER_OPENCV),
+                           ("scan_datamatrix", decoders.TIER_DMTX)):
+            patcher = mock.patch.object(decoders, name, side_effect=self.stub(tier))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for patcher in (
+            mock.patch.object(decoders, "dmtx_decode", object()),
+            mock.patch.object(qr_model, "detect_and_decode_batch", side_effect=self.stub_model),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def stub(self, tier):
+        def scan(gray):
+            self.calls.append(tier)
+            return [dict(item) for item in self.found[tier].get(int(gray[0, 0]), [])]
+        return scan
+
+    def stub_model(self, images):
+        self.calls.append(decoders.TIER_QREADER)
+        return [self.model.get(int(image[0, 0, 0]), ()) for image in images]
+
+    @staticmethod
+    def page(marker):
+        # điểm ảnh đầu tiên đánh dấu trang để stub biết trả về gì
+        image = np.full((40, 40), 255, dtype=np.uint8)
+        image[0, 0] = marker
+        return image
+
+    def qr(self, value, tier):
+        return decoders.symbol(value, decoders.SYMBOLOGY_QR, [0, 0, 10, 10], tier)
+
+    def test_tiers_run_cheapest_first(self):
+        self.assertEqual(decoders.scan(self.page(1)), [])
+        self.assertEqual(self.calls, [decoders.TIER_PYZBAR, decoders.TIER_OPENCV, decoders.TIER_DMTX])
+
+    def test_opencv_skipped_after_accepted_zbar_qr(self):
+        self.found[decoders.TIER_PYZBAR][1] = [self.qr(CODE, decoders.TIER_PYZBAR)]
+        symbols = decoders.scan(self.page(1))
+        self.assertEqual(self.calls, [decoders.TIER_PYZBAR, decoders.TIER_DMTX])
+        self.assertEqual([item["tier"] for item in symbols], [decoders.TIER_PYZBAR])
+
+    def test_opencv_still_runs_when_zbar_value_is_rejected(self):
+        self.found[decoders.TIER_PYZBAR][1] = [self.qr("random text", decoders.TIER_PYZBAR)]
+        self.found[decoders.TIER_OPENCV][1] = [self.qr(CODE, decoders.TIER_OPENCV)]
+        result = decoders.decode_pages([self.page(1)], preprocess_steps=())[0]
+        self.assertEqual(self.calls, [decoders.TIER_PYZBAR, decoders.TIER_OPENCV, decoders.TIER_DMTX])
+        self.assertEqual((result["value"], result["tier"]), (CODE, decoders.TIER_OPENCV))
+        self.assertEqual(len(result["symbols"]), 2)
+
+    def test_hit_skips_preprocessing_and_model(self):
+        self.found[decoders.TIER_PYZBAR][1] = [self.qr(CODE, decoders.TIER_PYZBAR)]
+        with mock.patch.object(preprocess, "variants") as variants:
+            result = decoders.decode_pages([self.page(1)])[0]
+        variants.assert_not_called()
+        self.assertNotIn(decoders.TIER_QREADER, self.calls)
+        self.assertEqual((result["value"], result["tier"]), (CODE, decoders.TIER_PYZBAR))
+
+    def test_preprocess_variants_stop_at_first_hit(self):
+        produced = []
+
+        def variants(gray, steps=None):
+            for step, marker in ((preprocess.STEP_THRESHOLD, 2), (preprocess.STEP_DENOISE, 3), (preprocess.STEP_DESKEW, 4)):
+                produced.append(step)
+                yield step, self.page(marker)
+
+        self.found[decoders.TIER_PYZBAR][3] = [self.qr(CODE, decoders.TIER_PYZBAR)]
+        before = counter("preprocess_recovered_total", step=preprocess.STEP_DENOISE, tier=decoders.TIER_PYZBAR)
+        with mock.patch.object(preprocess, "variants", side_effect=variants):
+            result = decoders.decode_pages([self.page(1)])[0]
+
+        self.assertEqual(produced, [preprocess.STEP_THRESHOLD, preprocess.STEP_DENOISE])
+        # DataMatrix chỉ quét trên ảnh gốc
+        self.assertEqual(self.calls, [
+            decoders.TIER_PYZBAR, decoders.TIER_OPENCV, decoders.TIER_DMTX,
+            decoders.TIER_PYZBAR, decoders.TIER_OPENCV,
+            decoders.TIER_PYZBAR,
+        ])
+        self.assertEqual(result["tier"], f"{decoders.TIER_PYZBAR}+{preprocess.STEP_DENOISE}")
+        self.assertEqual(
+            counter("preprocess_recovered_total", step=preprocess.STEP_DENOISE, tier=decoders.TIER_PYZBAR), before + 1
+        )
+
+    def test_only_misses_go_to_the_model(self):
+        self.found[decoders.TIER_PYZBAR][1] = [self.qr(CODE, decoders.TIER_PYZBAR)]
+        self.model = {2: ("not a code", "HD-2024-000999"), 3: ("not a code",)}
+        results = decoders.decode_pages([self.page(1), self.page(2), self.page(3)], preprocess_steps=())
+
+        self.assertEqual(self.calls.count(decoders.TIER_QREADER), 1)
+        self.assertEqual(qr_model.detect_and_decode_batch.call_args.args[0][0].shape, (40, 40, 3))
+        self.assertEqual(len(qr_model.detect_and_decode_batch.call_args.args[0]), 2)
+        self.assertEqual(
+            [(result["value"], result["tier"]) for result in results],
+            [(CODE, decoders.TIER_PYZBAR), ("HD-2024-000999", decoders.TIER_QREADER), (None, decoders.TIER_NONE)],
+        )
+        self.assertEqual(results[1]["symbols"][-1]["tier"], decoders.TIER_QREADER)
+
+    def test_model_disabled(self):
+        results = decoders.decode_pages([self.page(1)], use_model=False, preprocess_steps=())
+        self.assertNotIn(decoders.TIER_QREADER, self.calls)
+        self.assertEqual((results[0]["value"], results[0]["tier"]), (None, decoders.TIER_NONE))
+
+    def test_failing_tier_does_not_stop_the_cascade(self):
+        decoders.scan_pyzbar.side_effect = RuntimeError("zbar missing")
+        self.found[decoders.TIER_OPENCV][1] = [self.qr(CODE, decoders.TIER_OPENCV)]
+        self.assertEqual(decoders.scan(self.page(1))[0]["tier"], decoders.TIER_OPENCV)
+
+    def test_tier_hits_are_counted_per_job(self):
+        progress = jobs.Progress(SimpleNamespace(kind="qrcode", action="qr"))
+        before = counter("decode_tier_total", kind="qrcode", tier=decoders.TIER_OPENCV)
+        for tier in (decoders.TIER_OPENCV, decoders.TIER_PYZBAR, decoders.TIER_OPENCV):
+            progress.count_tier(tier)
+        self.assertEqual(progress.tiers, {decoders.TIER_OPENCV: 2, decoders.TIER_PYZBAR: 1})
+        self.assertEqual(counter("decode_tier_total", kind="qrcode", tier=decoders.TIER_OPENCV), before + 2)
+
+
+@override_settings(PATTERNS=[r"^HD-\d{4}-\d{6}$"])
+class PickTests(SimpleTestCase):
+    def test_accepted_qr_first_then_reading_order(self):
+        symbols = [
+            decoders.symbol("HD-2024-000003", "CODE128", [0, 0, 5, 5], decoders.TIER_PYZBAR),
+            decoders.symbol("junk", decoders.SYMBOLOGY_QR, [0, 0, 5, 5], decoders.TIER_PYZBAR),
+            decoders.symbol("HD-2024-000002", decoders.SYMBOLOGY_QR, [0, 50, 5, 5], decoders.TIER_PYZBAR),
+            decoders.symbol("HD-2024-000001", decoders.SYMBOLOGY_QR, [90, 10, 5, 5], decoders.TIER_OPENCV),
+        ]
+        self.assertEqual(decoders.pick(symbols)["value"], "HD-2024-000001")
+        self.assertEqual(decoders.pick(symbols, prefer=())["value"], "HD-2024-000003")
+        self.assertIsNone(decoders.pick(symbols[1:2]))
@@ -0,0 +1,129 @@
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from .. import ingest, result_cache
+from ..models import File, IngestCheckpoint, IngestedFile, Job
+
+
+@override_settings(
+    INGEST_PIPELINES=["qrcode"], INGEST_SESSION_SIZE=200, INGEST_SETTLE=10, INGEST_MAX_JOBS=4, INGEST_WORKERS=2,
+    JOB_DISPATCHER_EMBEDDED=False, JOB_MAX_QUEUED=0, JOB_MAX_BACKLOG_FILES=0, JOB_MAX_MEMORY_PERCENT=0,
+)
+class IngestTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.src = os.path.join(tmp.name, "src")
+        folders = override_settings(
+            DATA_SRC_PATH=self.src, MEDIA_ROOT=os.path.join(tmp.name, "media"),
+            METRICS_DIR=os.path.join(tmp.name, "metrics"),
+        )
+        folders.enable()
+        self.addCleanup(folders.disable)
+        os.makedirs(self.src)
+
+    def drop(self, rel, content=None, age=60):
+        """Ghi ``rel`` dưới DATA_SRC_PATH với mtime ``age`` giây trước (0 = đang được ghi)."""
+        path = os.path.join(self.src, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content if content is not None else b"%PDF-1.4 " + rel.encode())
+        os.utime(path, (time.time() - age,) * 2)
+        return path
+
+    def ingester(self):
+        ingester = ingest.Ingester()
+        self.addCleanup(ingester.stop)
+        return ingester
+
+    def sessions(self):
+        result = {}
+        for session_id, name in File.objects.order_by("id").values_list("session_id", "original_name"):
+            result.setdefault(session_id, []).append(name)
+        return sorted(result.values())
+
+    def test_settled_pdfs_become_sessions_per_folder(self):
+        sources = {rel: self.drop(rel) for rel in ("a/1.pdf", "a/2.PDF", "b/3.pdf", "a/.partial.pdf", "a/notes.txt", ".hidden/4.pdf")}
+
+        self.assertEqual(self.ingester().run_once(), {"ingested": 3})
+
+        self.assertEqual(self.sessions(), [["1.pdf", "2.PDF"], ["3.pdf"]])
+        for file in File.objects.all():
+            self.assertTrue(file.session_id.startswith(ingest.SESSION_PREFIX))
+            self.assertTrue(os.path.exists(file.file.path))
+            row = IngestedFile.objects.get(file=file)
+            self.assertEqual(file.sha256, result_cache.file_sha256(sources[row.path]))
+        queued = Job.objects.filter(status=Job.Status.QUEUED)
+        self.assertEqual(sorted(queued.values_list("kind", flat=True)), ["qrcode", "qrcode"])
+        self.assertEqual(set(queued.values_list("session_id", flat=True)), set(File.objects.values_list("session_id", flat=True)))
+
+    def test_files_still_being_written_wait(self):
+        self.drop("a/done.pdf")
+        writing = self.drop("a/writing.pdf", age=0)
+        ingester = self.ingester()
+
+        self.assertEqual(ingester.run_once(), {"ingested": 1})
+        self.assertEqual(list(ingester.pending), ["a/writing.pdf"])
+        # thư mục còn file chưa xong: chưa ghi checkpoint để lần khởi động sau còn thấy file
+        self.assertEqual(list(IngestCheckpoint.objects.values_list("path", flat=True)), [""])
+
+        os.utime(writing, (time.time() - 60,) * 2)
+        self.assertEqual(ingester.process(), {"ingested": 1})
+        ingester.checkpoint()
+        self.assertEqual(sorted(IngestCheckpoint.objects.values_list("path", flat=True)), ["", "a"])
+        self.assertEqual(ingester.pending, {})
+
+    def test_restart_resumes_from_the_checkpoint(self):
+        self.drop("a/1.pdf")
+        self.drop("b/2.pdf")
+        self.ingester().run_once()
+
+        restarted = self.ingester()
+        with mock.patch.object(result_cache, "file_sha256") as sha256:
+            self.assertEqual(restarted.walk(), 0)
+            self.assertEqual(restarted.run_once(), {})
+        sha256.assert_not_called()
+
+        # chỉ thư mục có thay đổi được liệt kê lại
+        self.drop("b/3.pdf")
+        self.assertEqual(self.ingester().walk(), 1)
+        self.assertEqual(self.ingester().run_once(), {"ingested": 1})
+
+    def test_reingestion_is_idempotent(self):
+        first = self.drop("a/1.pdf", b"%PDF-1.4 same")
+        self.drop("a/2.pdf", b"%PDF-1.4 other")
+        self.ingester().run_once()
+        self.assertEqual(File.objects.count(), 2)
+
+        self.assertEqual(self.ingester().run_once(), {})
+        # touch / copy lại cùng nội dung, cùng nội dung dưới tên khác, nội dung mới
+        os.utime(first, (time.time() - 30,) * 2)
+        self.drop("b/copy-of-1.pdf", b"%PDF-1.4 same")
+        changed = self.drop("a/2.pdf", b"%PDF-1.4 changed", age=30)
+        ingester = self.ingester()
+        # ghi đè tại chỗ không đổi mtime của thư mục: chỉ sự kiện inotify báo
+        for path in (first, changed):
+            ingester.notify(path)
+        ingester.drain_events()
+
+        self.assertEqual(ingester.run_once(), {"unchanged": 1, "duplicate": 1, "ingested": 1})
+        self.assertEqual(File.objects.count(), 3)
+        statuses = dict(IngestedFile.objects.values_list("path", "status"))
+        self.assertEqual(statuses, {"a/1.pdf": "ingested", "a/2.pdf": "ingested", "b/copy-of-1.pdf": "duplicate"})
+        self.assertEqual(self.ingester().run_once(), {})
+
+    @override_settings(INGEST_SESSION_SIZE=2, INGEST_MAX_JOBS=1)
+    def test_sessions_wait_for_the_job_budget(self):
+        for i in range(3):
+            self.drop(f"a/{i}.pdf")
+        ingester = self.ingester()
+
+        self.assertEqual(ingester.run_once(), {"ingested": 2})
+        self.assertEqual(sorted(ingester.pending), ["a/2.pdf"])
+        Job.objects.update(status=Job.Status.DONE)
+        self.assertEqual(ingester.run_once(), {"ingested": 1})
+        self.assertEqual(self.sessions(), [["0.pdf", "1.pdf"], ["2.pdf"]])
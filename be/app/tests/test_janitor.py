@@ -0,0 +1,106 @@
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import janitor
+from ..models import File, Job, SessionExpiry, Upload
+
+DAY = 24 * 3600
+
+
+class JanitorTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media = tmp.name
+        media = override_settings(
+            MEDIA_ROOT=tmp.name, METRICS_DIR=os.path.join(tmp.name, ".cache", "metrics"), JOB_DISPATCHER_EMBEDDED=False,
+            SESSION_TTL=DAY, MEDIA_QUOTA=0, JANITOR_MIN_AGE=600, JANITOR_BATCH=2,
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def session(self, session_id, age=0, size=100):
+        """Một file upload của phiên, trên đĩa và trong DB, hoạt động lần cuối ``age`` giây trước."""
+        name = f"uploads/2026/10/18/{session_id}/doc.pdf"
+        path = os.path.join(self.media, name)
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        obj = File.objects.create(session_id=session_id, file=name, original_name="doc.pdf", size=size)
+        File.objects.filter(pk=obj.pk).update(created_at=timezone.now() - timedelta(seconds=age))
+        return os.path.dirname(path)
+
+    def test_expired_and_idle_sessions_are_removed(self):
+        downloaded = self.session("sess_downloaded")
+        idle = self.session("sess_idle", age=2 * DAY)
+        active = self.session("sess_active", age=60)
+        janitor.expire("sess_downloaded", -1, reason="downloaded")
+        janitor.expire("sess_active", 3600, reason="downloaded")
+        # thư mục không còn dòng DB nào: hoạt động lần cuối là mtime
+        orphan = os.path.join(self.media, "split", "2026", "10", "01", "sess_orphan")
+        os.makedirs(orphan)
+        os.utime(orphan, (time.time() - 3 * DAY,) * 2)
+
+        report = janitor.janitor.run_once()
+
+        self.assertEqual({key: report[key] for key in ("downloaded", "ttl")}, {"downloaded": 1, "ttl": 2})
+        self.assertEqual(report["bytes"], 200)
+        for folder in (downloaded, idle, orphan):
+            self.assertFalse(os.path.exists(folder))
+        self.assertTrue(os.path.exists(active))
+        self.assertEqual(list(File.objects.values_list("session_id", flat=True)), ["sess_active"])
+        self.assertEqual(list(SessionExpiry.objects.values_list("session_id", flat=True)), ["sess_active"])
+
+    def test_dry_run_removes_nothing(self):
+        folder = self.session("sess_idle", age=2 * DAY)
+        self.assertEqual(janitor.janitor.run_once(dry_run=True), {"bytes": 0, "ttl": 1})
+        self.assertTrue(os.path.exists(folder))
+
+    def test_sessions_with_active_jobs_are_protected(self):
+        folders = [self.session(f"sess_{status}", age=2 * DAY) for status in ("queued", "running", "done")]
+        for status in (Job.Status.QUEUED, Job.Status.RUNNING, Job.Status.DONE):
+            Job.objects.create(session_id=f"sess_{status}", kind=Job.KIND_QRCODE, action="qr", status=status,
+                               finished_at=timezone.now() - timedelta(seconds=2 * DAY))
+            SessionExpiry.objects.create(session_id=f"sess_{status}", expires_at=timezone.now(), reason="downloaded")
+
+        janitor.janitor.run_once()
+
+        self.assertEqual([os.path.exists(folder) for folder in folders], [True, True, False])
+        self.assertEqual(sorted(Job.objects.values_list("session_id", flat=True)), ["sess_queued", "sess_running"])
+
+    def test_purge_rechecks_each_session_before_deleting(self):
+        folders = {session_id: [self.session(session_id, age=2 * DAY)] for session_id in ("sess_arrival", "sess_upload", "sess_gone")}
+        selected_at = timezone.now()
+        doomed = janitor.janitor.select(selected_at, folders)
+        self.assertEqual(set(doomed), set(folders))
+
+        # sau khi chọn: một file đến với process on arrival và tạo job, một phiên khác bắt đầu upload tiếp
+        Job.objects.create(session_id="sess_arrival", kind=Job.KIND_QRCODE, action="qr")
+        Upload.objects.create(session_id="sess_upload", original_name="more.pdf", size=10, path="uploads/2026/10/18/sess_upload/more.pdf")
+
+        freed, removed = janitor.purge(sorted(doomed), folders, since=selected_at)
+
+        self.assertEqual((freed, removed), (100, ["sess_gone"]))
+        self.assertTrue(os.path.exists(folders["sess_arrival"][0]))
+        self.assertTrue(os.path.exists(folders["sess_upload"][0]))
+        self.assertFalse(os.path.exists(folders["sess_gone"][0]))
+        self.assertEqual(sorted(File.objects.values_list("session_id", flat=True)), ["sess_arrival", "sess_upload"])
+
+    @override_settings(MEDIA_QUOTA=250)
+    def test_quota_evicts_least_recently_active_first(self):
+        oldest = self.session("sess_oldest", age=3 * 3600)
+        older = self.session("sess_older", age=2 * 3600)
+        recent = self.session("sess_recent", age=60)
+        # vẫn vượt quota nhưng phiên vừa hoạt động (< JANITOR_MIN_AGE) không bị xoá
+        with override_settings(MEDIA_QUOTA=50):
+            report = janitor.janitor.run_once(dry_run=True)
+        self.assertEqual(report["quota"], 2)
+
+        report = janitor.janitor.run_once()
+        self.assertEqual((report["quota"], report["bytes"]), (1, 100))
+        self.assertEqual([os.path.exists(folder) for folder in (oldest, older, recent)], [False, True, True])
@@ -0,0 +1,82 @@
+import socket
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import jobs
+from ..models import Job
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+@override_settings(JOB_LEASE=120, JOB_DISPATCHER_EMBEDDED=False)
+class LeaseTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        metrics_dir = override_settings(METRICS_DIR=tmp.name)
+        metrics_dir.enable()
+        self.addCleanup(metrics_dir.disable)
+        self.dispatcher = jobs.Dispatcher(workers=1)
+
+    def running(self, worker, heartbeat_age=None, started_age=0):
+        now = timezone.now()
+        return Job.objects.create(
+            session_id="sess_lease", kind=Job.KIND_QRCODE, action="qr", status=Job.Status.RUNNING, worker=worker,
+            started_at=now - timedelta(seconds=started_age),
+            heartbeat_at=None if heartbeat_age is None else now - timedelta(seconds=heartbeat_age),
+        )
+
+    def status(self, job):
+        job.refresh_from_db()
+        return job.status
+
+    def test_expired_lease_is_requeued_whatever_the_host(self):
+        # container worker cũ đã bị tạo lại với hostname khác
+        expired = self.running("old-container:1:aaaa", heartbeat_age=600)
+        fresh = self.running("other-container:1:bbbb", heartbeat_age=5)
+        never = self.running("old-container:7:cccc", started_age=600)
+
+        self.dispatcher.requeue_orphans()
+
+        self.assertEqual(self.status(expired), Job.Status.QUEUED)
+        self.assertEqual((expired.worker, expired.heartbeat_at), ("", None))
+        self.assertEqual(self.status(fresh), Job.Status.RUNNING)
+        self.assertEqual(self.status(never), Job.Status.QUEUED)
+
+    def test_dead_dispatcher_on_this_host_is_requeued_at_once(self):
+        job = self.running(f"{socket.gethostname()}:{dead_pid()}:dddd", heartbeat_age=1)
+        alive = self.running(f"{socket.gethostname()}:1:eeee", heartbeat_age=1)
+        self.dispatcher.requeue_orphans()
+        self.assertEqual(self.status(job), Job.Status.QUEUED)
+        self.assertEqual(self.status(alive), Job.Status.RUNNING)
+
+    def test_heartbeat_renews_owned_jobs_and_drops_lost_ones(self):
+        Job.objects.create(session_id="sess_lease", kind=Job.KIND_QRCODE, action="qr")
+        Job.objects.create(session_id="sess_other", kind=Job.KIND_QRCODE, action="qr")
+        kept, lost = self.dispatcher.claim(), self.dispatcher.claim()
+        for job in (kept, lost):
+            self.dispatcher.runs.append(jobs.Run(job, jobs.Progress(job)))
+            self.dispatcher.fair.activate(job.session_id)
+        Job.objects.filter(pk=kept.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=60))
+        # một dispatcher khác đã lấy lại job sau khi lease hết hạn
+        Job.objects.filter(pk=lost.pk).update(worker="other:1:ffff")
+
+        self.dispatcher.heartbeat()
+
+        kept.refresh_from_db()
+        self.assertLess(timezone.now() - kept.heartbeat_at, timedelta(seconds=5))
+        self.assertEqual([run.job.id for run in self.dispatcher.runs], [kept.id])
+        self.assertNotIn(lost.session_id, self.dispatcher.fair.vtime)
+
+        # kết thúc muộn của job đã mất không ghi đè trạng thái của dispatcher mới
+        jobs.Dispatcher.finish(lost, Job.Status.DONE)
+        self.assertEqual(self.status(lost), Job.Status.RUNNING)
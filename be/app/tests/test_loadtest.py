@@ -0,0 +1,37 @@
+import io
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from .. import loadtest
+from ..models import DailyStat, File, Job
+
+
+class ConcurrentWritesTests(TransactionTestCase):
+    """Upload và ghi tiến độ job cùng lúc, mỗi thread một kết nối, trên database file tạm."""
+
+    def test_uploads_and_progress_writes_are_not_locked(self):
+        with loadtest.scratch() as folder:
+            self.assertEqual(os.path.dirname(settings.DATABASES["default"]["NAME"]), folder)
+            self.assertEqual(str(settings.MEDIA_ROOT), folder)
+            for chunked in (False, True):
+                report = loadtest.run(sessions=8, files=3, size=4096, concurrency=6, chunked=chunked, chunk_size=1024, progress=2)
+                self.assertEqual((report["ok"], report["failed"], report["locked"]), (8, 0, 0), report["errors"])
+                self.assertGreater(report["progress_flushes"], 0)
+            self.assertEqual(File.objects.count(), 2 * 8 * 3)
+            self.assertEqual(Job.objects.count(), 2 * 2)
+            self.assertTrue(os.path.isdir(os.path.join(folder, "uploads")))
+        self.assertFalse(os.path.exists(folder))
+        # database của test không bị đụng tới
+        self.assertFalse(File.objects.exists() or Job.objects.exists() or DailyStat.objects.exists())
+
+    def test_command_uses_a_temporary_folder_by_default(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            out = io.StringIO()
+            call_command("loadtest_uploads", sessions=2, files=1, size=1024, concurrency=2, stdout=out)
+            self.assertIn("No database lock errors", out.getvalue())
+            self.assertEqual(os.listdir(media), [])
+        self.assertFalse(File.objects.exists())
@@ -0,0 +1,98 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .. import metrics
+
+
+def registry(name):
+    # tên snapshot riêng: các Registry trong cùng process test không ghi đè file của nhau
+    result = metrics.Registry()
+    result._name = (os.getpid(), name)
+    return result
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+class SnapshotTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.folder = tmp.name
+        folder = override_settings(METRICS_DIR=tmp.name, METRICS_SNAPSHOT_TTL=3600)
+        folder.enable()
+        self.addCleanup(folder.disable)
+
+    def snapshot(self, name, value, age=0):
+        path = os.path.join(self.folder, name)
+        with open(path, "w") as f:
+            json.dump({"counters": [["files_total", metrics._labels_key({}), value]], "histograms": []}, f)
+        os.utime(path, (time.time() - age,) * 2)
+        return name
+
+    def total(self):
+        counters, histograms = {}, {}
+        for name in os.listdir(self.folder):
+            if name.endswith(".json"):
+                with open(os.path.join(self.folder, name)) as f:
+                    metrics._add(counters, histograms, json.load(f))
+        return counters.get(("files_total", metrics._labels_key({})), 0), histograms
+
+    def test_old_snapshots_of_any_host_are_archived(self):
+        # container cũ bị tạo lại: hostname (có dấu '-') không còn, không kiểm tra được pid
+        gone = self.snapshot("old-container-1-123.json", 5, age=7200)
+        fresh = self.snapshot("other-container-1-456.json", 7, age=60)
+        exited = self.snapshot(f"{socket.gethostname()}-{dead_pid()}-789.json", 11, age=60)
+
+        live = registry("this-container-1-1.json")
+        live.inc("files_total", 1)
+        live.flush()
+
+        names = set(os.listdir(self.folder))
+        self.assertNotIn(gone, names)
+        self.assertNotIn(exited, names)
+        self.assertIn(fresh, names)
+        self.assertIn(metrics.ARCHIVE, names)
+        self.assertEqual(self.total()[0], 5 + 7 + 11 + 1)
+
+    def test_idle_process_archived_meanwhile_is_not_counted_twice(self):
+        idle = registry("worker-1-1.json")
+        idle.inc("files_total", 3)
+        idle.observe("stage_seconds", 0.2, stage="render")
+        idle.flush()
+        own = os.path.join(self.folder, idle._name[1])
+        # process khác gộp snapshot này vì quá METRICS_SNAPSHOT_TTL không ghi
+        os.utime(own, (time.time() - 7200,) * 2)
+        registry("web-1-1.json").flush()
+        self.assertFalse(os.path.exists(own))
+
+        idle.inc("files_total", 2)
+        idle.observe("stage_seconds", 0.2, stage="render")
+        idle.flush()
+        idle.flush()
+
+        count, histograms = self.total()
+        self.assertEqual(count, 5)
+        self.assertEqual(histograms[("stage_seconds", metrics._labels_key({"stage": "render"}))]["count"], 2)
+        self.assertEqual(idle.counters[("files_total", metrics._labels_key({}))], 5)
+
+    def test_works_without_fcntl(self):
+        self.snapshot("old-container-1-123.json", 5, age=7200)
+        with mock.patch.object(metrics, "fcntl", None):
+            live = registry("this-container-1-1.json")
+            live.inc("files_total", 1)
+            live.flush()
+            counters, _ = metrics.collect()
+        self.assertEqual(counters[("files_total", metrics._labels_key({}))] - metrics.registry.counters.get(("files_total", metrics._labels_key({})), 0), 6)
+        self.assertNotIn("old-container-1-123.json", os.listdir(self.folder))
@@ -0,0 +1,139 @@
+import os
+import subprocess
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+from PyPDF2 import PdfReader, PdfWriter
+
+from .. import render
+
+
+def scan(width=120, height=80):
+    """Ảnh xám bất đối xứng: mỗi cột một mức xám, thêm một ô đen ở góc trên trái."""
+    pixels = np.tile(np.linspace(40, 250, width).astype(np.uint8), (height, 1))
+    pixels[:10, :10] = 0
+    return pixels
+
+
+def write_scan(path, pixels, rotate=0, resolution=72):
+    Image.fromarray(pixels).save(path, "PDF", resolution=resolution)
+    if rotate:
+        writer = PdfWriter()
+        for page in PdfReader(path).pages:
+            writer.add_page(page.rotate(rotate))
+        with open(path, "wb") as f:
+            writer.write(f)
+    return path
+
+
+def write_mixed(path, pixels):
+    """Trang 200x200 pt với ảnh chỉ phủ một góc: phải render cả trang."""
+    document = render.pdfium.PdfDocument.new()
+    page = document.new_page(200, 200)
+    image = render.pdfium.PdfImage.new(document)
+    image.set_bitmap(render.pdfium.PdfBitmap.from_pil(Image.fromarray(pixels)))
+    image.set_matrix(render.pdfium.PdfMatrix().scale(100, 100).translate(10, 10))
+    page.insert_obj(image)
+    page.gen_content()
+    document.save(path)
+    document.close()
+    return path
+
+
+@override_settings(RENDER_BACKEND="auto", RENDER_NATIVE_IMAGES=True, RENDER_DOC_POOL=4)
+class NativeImageTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.folder = tmp.name
+        render.close_documents()
+        self.addCleanup(render.close_documents)
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def assertSimilar(self, image, expected, msg=None):
+        # PIL nhúng ảnh dưới dạng JPEG: so sánh gần đúng
+        self.assertEqual(image.shape, expected.shape, msg)
+        self.assertLess(np.abs(image.astype(int) - expected.astype(int)).mean(), 8, msg)
+
+    def test_scanned_page_is_used_at_native_resolution(self):
+        pixels = scan()
+        pdf = write_scan(self.path("scan.pdf"), pixels, resolution=200)
+        for dpi in (150, 300):
+            image, native = render.page_image(pdf, 1, dpi=dpi, gray=True)
+            self.assertTrue(native)
+            self.assertSimilar(image, pixels)
+
+        # ảnh xám nhúng vẫn là ảnh xám, ảnh màu trả về RGB
+        image, native = render.page_image(pdf, 1, dpi=150)
+        self.assertEqual((native, image.shape), (True, (80, 120)))
+        color = np.stack([pixels, np.zeros_like(pixels), np.full_like(pixels, 255)], axis=2)
+        image, native = render.page_image(write_scan(self.path("color.pdf"), color), 1)
+        self.assertTrue(native)
+        self.assertSimilar(image, color)
+        crop, _ = render.page_image(pdf, 1, roi=(0.5, 0.0, 1.0, 0.5), gray=True)
+        self.assertSimilar(crop, pixels[:40, 60:])
+
+    def test_rotated_scan_is_oriented_like_the_rendered_page(self):
+        for rotate in (90, 180, 270):
+            pdf = write_scan(self.path(f"scan_{rotate}.pdf"), scan(), rotate=rotate)
+            image, native = render.page_image(pdf, 1, gray=True)
+            with override_settings(RENDER_NATIVE_IMAGES=False):
+                rendered, rendered_native = render.page_image(pdf, 1, dpi=72, gray=True)
+            self.assertTrue(native)
+            self.assertFalse(rendered_native)
+            self.assertSimilar(image, rendered, rotate)
+
+    def test_mixed_page_is_rendered(self):
+        pdf = write_mixed(self.path("mixed.pdf"), scan())
+        self.assertIsNone(render.native_image(pdf, 1))
+        image, native = render.page_image(pdf, 1, dpi=144, gray=True)
+        self.assertEqual((native, image.shape), (False, (400, 400)))
+
+    def test_disabled(self):
+        pdf = write_scan(self.path("scan.pdf"), scan())
+        with override_settings(RENDER_NATIVE_IMAGES=False):
+            self.assertIsNone(render.native_image(pdf, 1))
+
+
+@override_settings(RENDER_BACKEND=render.BACKEND_PDFTOPPM, RENDER_NATIVE_IMAGES=True, RENDER_TIMEOUT=30)
+class PdftoppmFallbackTests(SimpleTestCase):
+    """Không có pdfium: không đọc ảnh nhúng, pdftoppm chỉ render vùng ROI."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # trang 120x80 pt
+        self.pdf = write_scan(os.path.join(tmp.name, "scan.pdf"), scan())
+        render.page_size.cache_clear()
+        self.calls = []
+
+    def pdftoppm(self, args, capture_output, timeout):
+        self.calls.append(args)
+        width, height = int(args[args.index("-W") + 1]), int(args[args.index("-H") + 1])
+        output = BytesIO()
+        Image.fromarray(np.zeros((height, width), dtype=np.uint8)).save(output, "PPM")
+        return subprocess.CompletedProcess(args, 0, output.getvalue(), b"")
+
+    def test_roi_is_cropped_by_pdftoppm(self):
+        with mock.patch.object(render.subprocess, "run", side_effect=self.pdftoppm):
+            image, native = render.page_image(self.pdf, 1, dpi=144, roi=(0.5, 0.0, 1.0, 0.5), gray=True)
+
+        self.assertFalse(native)
+        self.assertEqual(image.shape, (80, 120))
+        args = self.calls[0]
+        self.assertEqual(args[:7], ["pdftoppm", "-r", "144", "-f", "1", "-l", "1"])
+        self.assertIn("-gray", args)
+        crop = [args[args.index(flag) + 1] for flag in ("-x", "-y", "-W", "-H")]
+        self.assertEqual(crop, ["120", "0", "120", "80"])
+        self.assertEqual(render.crop_box(self.pdf, 1, 144, (0.5, 0.0, 1.0, 0.5)), (120, 0, 120, 80))
+
+    def test_failure_is_reported(self):
+        failed = subprocess.CompletedProcess([], 1, b"", b"Syntax Error")
+        with mock.patch.object(render.subprocess, "run", return_value=failed), self.assertRaises(RuntimeError):
+            render.page_image(self.pdf, 1, dpi=144)
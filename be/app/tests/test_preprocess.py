@@ -0,0 +1,104 @@
+import os
+import tempfile
+from unittest import mock
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from .. import benchmark, decoders, preprocess, qr_model, render
+from ..views import QrCode
+
+CODE = "HD-2024-000123"
+
+
+def shadowed_page(value=CODE):
+    """Mã QR tương phản thấp, nửa trái bị bóng tối: các decoder rẻ không đọc được trên ảnh gốc."""
+    page = np.full((600, 600), 255, dtype=np.uint8)
+    if value:
+        page[150:450, 150:450] = benchmark.qr_image(value, 300)
+    light = np.ones(page.shape, dtype=np.float32)
+    light[:, :300] = 0.3
+    light = cv2.GaussianBlur(light, (31, 31), 0)
+    return ((page.astype(np.float32) * 0.5 + 127.5) * light).astype(np.uint8)
+
+
+@override_settings(PATTERNS=[r"^HD-\d{4}-\d{6}$"], PREPROCESS_SCALES=[2.0, 0.5])
+class VariantTests(SimpleTestCase):
+    def test_steps_follow_the_configured_order(self):
+        applied = []
+        with mock.patch.object(preprocess, "apply", side_effect=lambda step, gray: applied.append(step) or [gray]):
+            steps = [step for step, _ in preprocess.variants(shadowed_page(), ["denoise", "unknown", "scale", "threshold"])]
+        self.assertEqual(applied, [preprocess.STEP_DENOISE, preprocess.STEP_SCALE, preprocess.STEP_THRESHOLD])
+        self.assertEqual(steps, applied)
+
+    def test_variants_are_computed_lazily(self):
+        applied = []
+        real_apply = preprocess.apply
+        with mock.patch.object(preprocess, "apply", side_effect=lambda step, gray: applied.append(step) or real_apply(step, gray)):
+            variants = preprocess.variants(shadowed_page(), [preprocess.STEP_THRESHOLD, preprocess.STEP_SCALE])
+            self.assertEqual(next(variants)[0], preprocess.STEP_THRESHOLD)
+            self.assertEqual(applied, [preprocess.STEP_THRESHOLD])
+            self.assertEqual([image.shape for _, image in variants], [(1200, 1200), (300, 300)])
+
+    def test_shadowed_code_is_recovered_by_a_step(self):
+        page = shadowed_page()
+        self.assertEqual(decoders.scan(page), [])
+        self.assertEqual(decoders.decode_pages([page], use_model=False, preprocess_steps=())[0]["value"], None)
+
+        result = decoders.decode_pages([page], use_model=False)[0]
+        tier, _, step = result["tier"].partition("+")
+        self.assertEqual(result["value"], CODE)
+        self.assertIn(tier, (decoders.TIER_PYZBAR, decoders.TIER_OPENCV))
+        self.assertIn(step, preprocess.STEPS)
+
+
+@override_settings(
+    PATTERNS=[r"^HD-\d{4}-\d{6}$"], RENDER_DPI_STEPS=[144, 288], RENDER_NATIVE_IMAGES=False, ROI_TEMPLATES={},
+    PREPROCESS_STEPS=[preprocess.STEP_THRESHOLD, preprocess.STEP_DENOISE, preprocess.STEP_DESKEW], PREPROCESS_SCALES=[],
+)
+class RenderOrderTests(SimpleTestCase):
+    """Các bước tiền xử lý chạy hết ở DPI hiện tại trước khi render lại ở DPI cao hơn."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.folder = tmp.name
+        self.log = []
+        real_page_image, real_apply = render.page_image, preprocess.apply
+
+        def page_image(pdf_path, page_number, dpi=300, roi=None, gray=False):
+            self.log.append(("render", dpi))
+            return real_page_image(pdf_path, page_number, dpi=dpi, roi=roi, gray=gray)
+
+        def apply(step, gray):
+            self.log.append(("preprocess", step))
+            return real_apply(step, gray)
+
+        for patcher in (
+            mock.patch.object(render, "page_image", side_effect=page_image),
+            mock.patch.object(preprocess, "apply", side_effect=apply),
+            mock.patch.object(qr_model, "detect_and_decode_batch", side_effect=lambda images: [() for _ in images]),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def pdf(self, name, page):
+        path = os.path.join(self.folder, name)
+        Image.fromarray(page).save(path, "PDF", resolution=72)
+        return path
+
+    def test_recovered_at_the_first_dpi_without_rerender(self):
+        result = QrCode().process_pages([self.pdf("shadowed.pdf", shadowed_page())], 1)[0]
+        self.assertEqual(result["value"], CODE)
+        self.assertIn("+", result["tier"])
+        self.assertEqual([entry for entry in self.log if entry[0] == "render"], [("render", 144)])
+        self.assertEqual(self.log[0], ("render", 144))
+
+    def test_every_step_runs_before_the_next_dpi(self):
+        blank = np.full((600, 600), 255, dtype=np.uint8)
+        result = QrCode().process_pages([self.pdf("blank.pdf", blank)], 1)[0]
+        self.assertEqual((result["value"], result["tier"]), (None, decoders.TIER_NONE))
+        steps = [("preprocess", step) for step in (preprocess.STEP_THRESHOLD, preprocess.STEP_DENOISE, preprocess.STEP_DESKEW)]
+        self.assertEqual(self.log, [("render", 144)] + steps + [("render", 288)] + steps)
@@ -0,0 +1,86 @@
+import os
+import tempfile
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from .. import render
+
+
+def write_pdf(path, sizes, value=0):
+    """PDF nhiều trang, mỗi trang là một ảnh xám ``(width, height)`` pixel ở 72 dpi."""
+    pages = [Image.fromarray(np.full((height, width), value + i, dtype=np.uint8)) for i, (width, height) in enumerate(sizes)]
+    pages[0].save(path, "PDF", resolution=72, save_all=True, append_images=pages[1:])
+    return path
+
+
+@override_settings(RENDER_BACKEND=render.BACKEND_PDFIUM, RENDER_DOC_POOL=2, RENDER_NATIVE_IMAGES=False)
+class DocumentPoolTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.paths = [write_pdf(os.path.join(tmp.name, f"{name}.pdf"), [(200, 100), (100, 200)]) for name in "abc"]
+        render.close_documents()
+        self.addCleanup(render.close_documents)
+
+        self.opened, self.closed = [], []
+        real_init, real_close = render.pdfium.PdfDocument.__init__, render.pdfium.PdfDocument.close
+
+        def init(document, path, *args, **kwargs):
+            self.opened.append(os.path.basename(path))
+            real_init(document, path, *args, **kwargs)
+
+        def close(document):
+            self.closed.append(document)
+            return real_close(document)
+
+        for patcher in (
+            mock.patch.object(render.pdfium.PdfDocument, "__init__", autospec=True, side_effect=init),
+            mock.patch.object(render.pdfium.PdfDocument, "close", autospec=True, side_effect=close),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def pooled(self):
+        return [os.path.basename(path) for path in render._documents]
+
+    def test_pages_and_dpi_steps_share_one_handle(self):
+        a = self.paths[0]
+        self.assertEqual(render.page_count(a), 2)
+        first = render.render_page(a, 1, dpi=144)
+        second = render.render_page(a, 2, dpi=72, gray=True)
+        self.assertEqual(self.opened, ["a.pdf"])
+        self.assertEqual(first.shape, (200, 400, 3))
+        self.assertEqual(second.shape, (200, 100))
+        self.assertEqual(render.render_page(a, 1, dpi=72, roi=(0.5, 0.0, 1.0, 0.5)).shape, (50, 100, 3))
+        self.assertEqual(self.opened, ["a.pdf"])
+
+    def test_least_recently_used_document_is_closed(self):
+        a, b, c = self.paths
+        render.page_count(a)
+        render.page_count(b)
+        document_b = render._documents[str(b)][1]
+        render.page_count(a)
+        render.page_count(c)
+
+        self.assertEqual(self.pooled(), ["a.pdf", "c.pdf"])
+        self.assertEqual(self.closed, [document_b])
+        self.assertEqual(self.opened, ["a.pdf", "b.pdf", "c.pdf"])
+
+    def test_changed_file_is_reopened(self):
+        a = self.paths[0]
+        self.assertEqual(render.page_count(a), 2)
+        old = render._documents[str(a)][1]
+        write_pdf(a, [(200, 100)] * 3)
+        self.assertEqual(render.page_count(a), 3)
+        self.assertEqual(self.closed, [old])
+        self.assertEqual(self.opened, ["a.pdf", "a.pdf"])
+
+    def test_close_documents(self):
+        for path in self.paths[:2]:
+            render.page_count(path)
+        render.close_documents()
+        self.assertEqual(render._documents, {})
+        self.assertEqual(len(self.closed), 2)
@@ -0,0 +1,71 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .. import result_cache
+
+
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        store = override_settings(DECODE_CACHE_PATH=os.path.join(tmp.name, "decode.sqlite3"), DECODE_CACHE_MAX_BYTES=10 ** 6)
+        store.enable()
+        self.addCleanup(store.disable)
+
+    def total(self):
+        conn = result_cache.connection()
+        counted = conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+        actual = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self.assertEqual(counted, actual)
+        return counted
+
+    def test_round_trip(self):
+        self.assertIs(result_cache.get("a" * 64, "qrcode", "qr"), result_cache.MISS)
+        result_cache.set("a" * 64, "qrcode", "qr", {"value": "HD-2024-000001", "symbols": []})
+        self.assertEqual(result_cache.get("a" * 64, "qrcode", "qr"), {"value": "HD-2024-000001", "symbols": []})
+        # None là kết quả hợp lệ (không có mã), khác với chưa có trong cache
+        result_cache.set("b" * 64, "barcode", "bar", None)
+        self.assertIsNone(result_cache.get("b" * 64, "barcode", "bar"))
+        self.assertIs(result_cache.get("", "qrcode", "qr"), result_cache.MISS)
+
+    def test_keys_are_isolated(self):
+        result_cache.set("a" * 64, "qrcode", "qr", "qr-result")
+        result_cache.set("a" * 64, "barcode", "qr", "barcode-result")
+        result_cache.set("a" * 64, "qrcode", "other", "other-action")
+        self.assertEqual(result_cache.get("a" * 64, "qrcode", "qr"), "qr-result")
+        self.assertEqual(result_cache.get("a" * 64, "barcode", "qr"), "barcode-result")
+        self.assertEqual(result_cache.get("a" * 64, "qrcode", "other"), "other-action")
+        self.assertIs(result_cache.get("c" * 64, "qrcode", "qr"), result_cache.MISS)
+
+        result_cache.set("a" * 64, "qrcode", "qr", "replaced")
+        self.assertEqual(result_cache.get("a" * 64, "qrcode", "qr"), "replaced")
+        self.total()
+
+    def test_decode_settings_are_part_of_the_key(self):
+        with override_settings(PATTERNS=[r"^HD-\d{4}-\d{6}$"]):
+            result_cache.set("a" * 64, "qrcode", "qr", {"value": None})
+            self.assertEqual(result_cache.get("a" * 64, "qrcode", "qr"), {"value": None})
+        with override_settings(PATTERNS=[r"^HD-\d{4}-\d{6}$", r"^PX-\d+$"]):
+            self.assertIs(result_cache.get("a" * 64, "qrcode", "qr"), result_cache.MISS)
+        with override_settings(PATTERNS=[r"^HD-\d{4}-\d{6}$"], RENDER_DPI_STEPS=[200, 400]):
+            self.assertIs(result_cache.get("a" * 64, "qrcode", "qr"), result_cache.MISS)
+        with override_settings(PATTERNS=[r"^HD-\d{4}-\d{6}$"]):
+            self.assertEqual(result_cache.get("a" * 64, "qrcode", "qr"), {"value": None})
+
+    def test_evicts_least_recently_used(self):
+        value = "x" * 1000
+        with override_settings(DECODE_CACHE_MAX_BYTES=5500), mock.patch.object(result_cache, "TOUCH_INTERVAL", 0):
+            for i in range(5):
+                result_cache.set(f"{i:064d}", "qrcode", "qr", value)
+            # đọc lại entry cũ nhất: nó thành mới dùng gần đây nhất
+            self.assertEqual(result_cache.get(f"{0:064d}", "qrcode", "qr"), value)
+            result_cache.set(f"{5:064d}", "qrcode", "qr", value)
+
+            kept = [i for i in range(6) if result_cache.get(f"{i:064d}", "qrcode", "qr") is not result_cache.MISS]
+            self.assertIn(0, kept)
+            self.assertIn(5, kept)
+            self.assertNotIn(1, kept)
+            self.assertLessEqual(self.total(), 5500)
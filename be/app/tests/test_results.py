@@ -0,0 +1,158 @@
+import os
+import tempfile
+from concurrent.futures import Future
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase, override_settings
+
+from .. import decoders, jobs, preprocess, render
+from ..models import File, FileResult, Job
+
+CODE = "HD-2024-000123"
+SESSION = "sess_results"
+# tier dài nhất có thể ghi vào FileResult.decoder: tier rẻ + bước tiền xử lý
+PREPROCESSED = f"{decoders.TIER_PYZBAR}+{preprocess.STEP_THRESHOLD}"
+
+
+class InlineExecutor:
+    """Chạy task ngay trong thread gọi submit, thay cho process pool."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def fake_page(pdf_path, page_number, dpi=300, roi=None, gray=False):
+    name = os.path.basename(pdf_path)
+    if name.startswith("broken"):
+        raise ValueError("cannot render")
+    image = np.full((20, 20), 255, dtype=np.uint8)
+    image[0, 0] = 1 if name.startswith("coded") else 2
+    return image, False
+
+
+def fake_decode(images, use_model=True, preprocess_steps=None):
+    results = []
+    for image in images:
+        if image[0, 0] == 1:
+            symbols = [
+                decoders.symbol(CODE, decoders.SYMBOLOGY_QR, [10, 10, 50, 50], PREPROCESSED),
+                decoders.symbol("8930000000019", "EAN13", [90, 10, 80, 20], decoders.TIER_OPENCV),
+            ]
+            results.append({"value": CODE, "tier": PREPROCESSED, "symbols": symbols})
+        else:
+            results.append({"value": None, "tier": decoders.TIER_NONE, "symbols": []})
+    return results
+
+
+@override_settings(PATTERNS=[r"^HD-\d{4}-\d{6}$"], RENDER_DPI_STEPS=[150], JOB_POLL_INTERVAL=0.01, JOB_DISPATCHER_EMBEDDED=False)
+class JobResultsTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media = tmp.name
+        folders = override_settings(
+            MEDIA_ROOT=tmp.name, METRICS_DIR=os.path.join(tmp.name, ".cache", "metrics"),
+            DECODE_CACHE_PATH=os.path.join(tmp.name, ".cache", "decode.sqlite3"),
+        )
+        folders.enable()
+        self.addCleanup(folders.disable)
+        for patcher in (
+            mock.patch.object(render, "page_image", side_effect=fake_page),
+            mock.patch.object(decoders, "decode_pages", side_effect=fake_decode),
+            mock.patch.object(jobs.Dispatcher, "executor", lambda self, kind: InlineExecutor()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.files = {name: self.upload(name, sha) for name, sha in (("coded.pdf", "a"), ("blank.pdf", "b"), ("broken.pdf", "c"))}
+
+    def upload(self, name, sha):
+        relative = f"uploads/2026/10/18/{SESSION}/{name}"
+        os.makedirs(os.path.join(self.media, os.path.dirname(relative)), exist_ok=True)
+        with open(os.path.join(self.media, relative), "wb") as f:
+            f.write(b"%PDF-1.4 " + name.encode())
+        return File.objects.create(session_id=SESSION, file=relative, original_name=name, size=20, sha256=sha * 64)
+
+    def run_job(self):
+        job = jobs.enqueue(SESSION, Job.KIND_QRCODE, "qr", admit=False)
+        dispatcher = jobs.Dispatcher(workers=1)
+        for _ in range(50):
+            dispatcher.step()
+            job.refresh_from_db()
+            if job.status in (Job.Status.DONE, Job.Status.FAILED):
+                return job
+        self.fail(f"job {job.id} did not finish: {job.status}")
+
+    def rows(self, name):
+        return list(FileResult.objects.filter(file=self.files[name]).order_by("id").values(
+            "value", "decoder", "symbology", "bbox", "page", "output", "error",
+        ))
+
+    def test_job_stores_one_row_per_symbol(self):
+        job = self.run_job()
+        self.assertEqual((job.status, job.total, job.processed, job.failed), (Job.Status.DONE, 3, 3, 0))
+
+        output = f"qr/2026/10/18/{SESSION}/{CODE}.pdf"
+        self.assertEqual(self.rows("coded.pdf"), [
+            {"value": CODE, "decoder": PREPROCESSED, "symbology": decoders.SYMBOLOGY_QR, "bbox": [10, 10, 50, 50],
+             "page": 1, "output": output, "error": ""},
+            {"value": "8930000000019", "decoder": decoders.TIER_OPENCV, "symbology": "EAN13", "bbox": [90, 10, 80, 20],
+             "page": 1, "output": "", "error": ""},
+        ])
+        self.assertTrue(os.path.exists(os.path.join(self.media, output)))
+        self.assertEqual(self.rows("blank.pdf"), [{
+            "value": "", "decoder": decoders.TIER_NONE, "symbology": "", "bbox": None, "page": None,
+            "output": f"qr/2026/10/18/{SESSION}/blank.pdf", "error": "",
+        }])
+        broken = self.rows("broken.pdf")
+        self.assertEqual([(row["decoder"], row["error"]) for row in broken], [(decoders.TIER_ERROR, "render failed")])
+
+        processed = dict(File.objects.filter(session_id=SESSION).values_list("original_name", "is_processed"))
+        self.assertEqual(processed, {"coded.pdf": True, "blank.pdf": True, "broken.pdf": False})
+
+    def test_decoder_names_fit_the_column(self):
+        max_length = FileResult._meta.get_field("decoder").max_length
+        tiers = [decoders.TIER_CACHE, decoders.TIER_PYZBAR, decoders.TIER_OPENCV, decoders.TIER_DMTX,
+                 decoders.TIER_QREADER, decoders.TIER_NONE, decoders.TIER_ERROR]
+        tiers += [f"{tier}+{step}" for tier in (decoders.TIER_PYZBAR, decoders.TIER_OPENCV)
+                  for step in (preprocess.STEP_THRESHOLD, preprocess.STEP_DENOISE, preprocess.STEP_DESKEW, preprocess.STEP_SCALE)]
+        self.assertEqual([tier for tier in tiers if len(tier) > max_length], [])
+
+        self.run_job()
+        self.assertTrue(all(len(decoder) <= max_length for decoder in FileResult.objects.values_list("decoder", flat=True)))
+
+    def test_next_job_skips_files_already_done(self):
+        self.run_job()
+        job = self.run_job()
+        self.assertEqual((job.total, job.processed), (3, 3))
+        self.assertEqual(job.stats["skipped"], 2)
+        # chỉ file lỗi được chạy lại
+        self.assertEqual(FileResult.objects.filter(file=self.files["broken.pdf"]).count(), 2)
+        self.assertEqual(FileResult.objects.filter(file=self.files["coded.pdf"]).count(), 2)
+
+    def test_results_endpoint(self):
+        self.run_job()
+        response = self.client.get("/app/results/", {"session_id": SESSION, "page_size": 2})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(set(body), {"data", "count", "next", "previous", "message"})
+        self.assertEqual((body["count"], len(body["data"]), body["previous"]), (4, 2, None))
+        self.assertIn("page=2", body["next"])
+
+        first = body["data"][0]
+        self.assertEqual(set(first), {
+            "id", "fileId", "jobId", "name", "kind", "action", "value", "decoder", "symbology",
+            "bbox", "confidence", "page", "output", "url", "error", "createdAt",
+        })
+        self.assertEqual((first["fileId"], first["name"], first["kind"], first["action"], first["decoder"]),
+                         (self.files["coded.pdf"].id, "coded.pdf", Job.KIND_QRCODE, "qr", PREPROCESSED))
+        self.assertTrue(first["url"].endswith(f"/qr/2026/10/18/{SESSION}/{CODE}.pdf"))
+        self.assertIsNone(body["data"][1]["url"])
+
+        self.assertEqual(self.client.get("/app/results/", {"session_id": SESSION, "kind": Job.KIND_BARCODE}).json()["count"], 0)
+        self.assertEqual(self.client.get("/app/results/").status_code, 400)
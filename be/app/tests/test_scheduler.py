@@ -0,0 +1,127 @@
+import os
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .. import jobs, scheduler
+from ..models import File, Job, WorkerStatus
+
+
+def run(session_id, job_id, in_flight=0):
+    return SimpleNamespace(job=SimpleNamespace(session_id=session_id, id=job_id), in_flight=in_flight)
+
+
+@override_settings(JOB_SESSION_WEIGHTS=[])
+class FairQueueTests(SimpleTestCase):
+    def schedule(self, queue, runs, slots):
+        order = []
+        for _ in range(slots):
+            chosen = queue.pick(runs)
+            queue.charge(chosen.job.session_id, 1)
+            order.append(chosen.job.session_id)
+        return order
+
+    def test_sessions_share_slots(self):
+        queue = scheduler.FairQueue()
+        big, small = run("big", 1, in_flight=4), run("small", 2)
+        queue.activate("big")
+        self.schedule(queue, [big], 10)
+
+        # phiên tới sau bắt đầu từ vtime nhỏ nhất, không phải chờ 10 task của phiên lớn
+        queue.activate("small")
+        self.assertEqual(self.schedule(queue, [big, small], 4), ["small", "big", "small", "big"])
+
+    @override_settings(JOB_SESSION_WEIGHTS=["vip-:3", "vip-slow:0.5"])
+    def test_weights(self):
+        self.assertEqual(scheduler.weight("vip-1"), 3.0)
+        self.assertEqual(scheduler.weight("vip-slow-1"), 0.5)
+        self.assertEqual(scheduler.weight("other"), 1.0)
+
+        queue = scheduler.FairQueue()
+        for session_id in ("vip-1", "other"):
+            queue.activate(session_id)
+        order = self.schedule(queue, [run("vip-1", 1), run("other", 2)], 8)
+        self.assertEqual(order.count("vip-1"), 6)
+
+    @override_settings(JOB_SESSION_MAX_RUNNING=2)
+    def test_claim_order(self):
+        queued = [
+            SimpleNamespace(session_id="a", kind="qrcode", action="qr"),
+            SimpleNamespace(session_id="a", kind="split", action="split"),
+            SimpleNamespace(session_id="b", kind="qrcode", action="qr"),
+            SimpleNamespace(session_id="c", kind="qrcode", action="qr"),
+        ]
+        running = [("a", "qrcode", "qr"), ("c", "split", "split"), ("c", "barcode", "bar")]
+        # a/qrcode đang chạy, c đã đủ 2 job: còn b (chưa chạy gì) rồi a/split
+        self.assertEqual(scheduler.claim_order(queued, running), [queued[2], queued[1]])
+
+
+class AdmissionTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        limits = override_settings(
+            MEDIA_ROOT=tmp.name, METRICS_DIR=os.path.join(tmp.name, "metrics"), JOB_DISPATCHER_EMBEDDED=False,
+            JOB_MAX_QUEUED=2, JOB_MAX_BACKLOG_FILES=0, JOB_MAX_MEMORY_PERCENT=0, JOB_RETRY_AFTER=30,
+        )
+        limits.enable()
+        self.addCleanup(limits.disable)
+
+    def test_admits_until_queue_is_full(self):
+        self.assertIsNone(scheduler.overloaded())
+        Job.objects.create(session_id="s1", kind=Job.KIND_QRCODE, action="qr")
+        scheduler.admit()
+        Job.objects.create(session_id="s2", kind=Job.KIND_QRCODE, action="qr")
+        with self.assertRaises(scheduler.Overloaded) as raised:
+            scheduler.admit()
+        self.assertEqual((raised.exception.reason, raised.exception.retry_after), ("queued", 30))
+
+    def test_retry_after_grows_with_overload(self):
+        error = scheduler.overloaded({"queued": (5, 2), "backlogFiles": (0, 0), "memoryPercent": (None, 90)})
+        self.assertEqual(error.retry_after, 75)
+        error = scheduler.overloaded({"queued": (0, 2), "backlogFiles": (10 ** 6, 10), "memoryPercent": (None, 90)})
+        self.assertEqual((error.reason, error.retry_after), ("backlogFiles", 300))
+
+    def test_start_returns_429(self):
+        for i in range(2):
+            Job.objects.create(session_id=f"s{i}", kind=Job.KIND_QRCODE, action="qr")
+        File.objects.create(session_id="sess_busy", file="uploads/x.pdf", original_name="x.pdf")
+        response = self.client.post("/app/qrcode/start/", {"session_id": "sess_busy", "action": "qr"}, content_type="application/json")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+        self.assertFalse(Job.objects.filter(session_id="sess_busy").exists())
+
+    def test_queued_job_is_reused_when_full(self):
+        for i in range(2):
+            Job.objects.create(session_id=f"s{i}", kind=Job.KIND_QRCODE, action="qr")
+        File.objects.create(session_id="s0", file="uploads/x.pdf", original_name="x.pdf")
+        response = self.client.post("/app/qrcode/start/", {"session_id": "s0", "action": "qr"}, content_type="application/json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Job.objects.filter(session_id="s0").count(), 1)
+
+    @override_settings(JOB_MAX_MEMORY_PERCENT=90, JOB_LEASE=120)
+    def test_memory_is_the_workers_published_reading(self):
+        # bộ nhớ của process web không tính: chỉ số do dispatcher (container worker) công bố
+        with mock.patch.object(scheduler, "memory_percent", return_value=99.0):
+            self.assertIsNone(scheduler.overloaded())
+
+        dispatcher = jobs.Dispatcher(workers=1)
+        with mock.patch.object(scheduler, "memory_percent", return_value=95.0):
+            dispatcher.publish_status()
+        WorkerStatus.objects.create(name="gone:1:aaaa", memory_percent=100.0, heartbeat_at=timezone.now() - timedelta(seconds=60))
+        with self.assertRaises(scheduler.Overloaded) as raised:
+            scheduler.admit()
+        self.assertEqual(raised.exception.reason, "memoryPercent")
+        self.assertEqual(scheduler.queue_stats()["memoryPercent"], 100.0)
+
+        WorkerStatus.objects.filter(name="gone:1:aaaa").update(heartbeat_at=timezone.now() - timedelta(seconds=600))
+        with mock.patch.object(scheduler, "memory_percent", return_value=40.0):
+            dispatcher.publish_status()
+        # dispatcher đã dừng quá JOB_LEASE: bỏ qua và xoá
+        self.assertEqual(list(WorkerStatus.objects.values_list("name", flat=True)), [dispatcher.name])
+        self.assertEqual(scheduler.queue_stats()["memoryPercent"], 40.0)
+        self.assertIsNone(scheduler.overloaded())
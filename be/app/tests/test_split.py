@@ -0,0 +1,117 @@
+import os
+import tempfile
+from concurrent.futures import Future
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase, override_settings
+from PIL import Image
+from PyPDF2 import PdfReader
+
+from .. import benchmark, jobs
+from ..models import File, FileResult, Job
+
+SESSION = "sess_split"
+FIRST, SECOND = "HD-2024-000001", "HD-2024-000002"
+
+
+class LifoExecutor:
+    """Giữ các task đã nộp, test cho chạy task nộp sau cùng trước: kết quả các trang về ngược thứ tự."""
+
+    def __init__(self):
+        self.held = []
+        self.completed = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.held.append((future, fn, args))
+        return future
+
+    def release(self):
+        future, fn, args = self.held.pop()
+        self.completed.append((fn, args))
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+
+
+def page(number, value=None):
+    # mỗi trang rộng khác nhau để nhận ra thứ tự trang trong file output
+    image = np.full((400, 300 + number * 10), 255, dtype=np.uint8)
+    if value:
+        image[50:250, 50:250] = benchmark.qr_image(value, 200)
+    return Image.fromarray(image)
+
+
+@override_settings(PATTERNS=[r"^HD-\d{4}-\d{6}$"], SPLIT_DPI=144, SPLIT_USE_QREADER=False, SPLIT_PREPROCESS=False,
+                   JOB_POLL_INTERVAL=0.01, JOB_DISPATCHER_EMBEDDED=False)
+class SplitJobTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media = tmp.name
+        folders = override_settings(
+            MEDIA_ROOT=tmp.name, METRICS_DIR=os.path.join(tmp.name, ".cache", "metrics"),
+            DECODE_CACHE_PATH=os.path.join(tmp.name, ".cache", "decode.sqlite3"),
+        )
+        folders.enable()
+        self.addCleanup(folders.disable)
+        self.executor = LifoExecutor()
+        patcher = mock.patch.object(jobs.Dispatcher, "executor", lambda dispatcher, kind: self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, name, pages):
+        relative = f"uploads/2026/10/18/{SESSION}/{name}"
+        path = os.path.join(self.media, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pages[0].save(path, "PDF", resolution=72, save_all=True, append_images=pages[1:])
+        return File.objects.create(session_id=SESSION, file=relative, original_name=name, size=os.path.getsize(path),
+                                   sha256=name[0] * 64)
+
+    def run_job(self):
+        job = jobs.enqueue(SESSION, Job.KIND_SPLIT, Job.KIND_SPLIT, admit=False)
+        dispatcher = jobs.Dispatcher(workers=2)
+        for _ in range(200):
+            dispatcher.step()
+            if self.executor.held:
+                self.executor.release()
+            job.refresh_from_db()
+            if job.status in (Job.Status.DONE, Job.Status.FAILED):
+                return job
+        self.fail(f"job {job.id} did not finish: {job.status}")
+
+    def widths(self, relative):
+        reader = PdfReader(os.path.join(self.media, relative))
+        return [round(float(item.mediabox.width)) for item in reader.pages]
+
+    def test_segments_keep_page_order_when_pages_finish_out_of_order(self):
+        batch = self.upload("batch.pdf", [page(1), page(2), page(3, FIRST), page(4), page(5, SECOND), page(6), page(7)])
+        plain = self.upload("plain.pdf", [page(1), page(2), page(3)])
+
+        job = self.run_job()
+
+        self.assertEqual((job.status, job.total, job.processed, job.failed), (Job.Status.DONE, 2, 2, 0))
+        self.assertEqual(job.stats["pages"], 10)
+        self.assertEqual(job.stats["segments"], 4)
+        # các trang của batch.pdf đã về không theo thứ tự nộp
+        scanned = [args[1] for fn, args in self.executor.completed if fn is jobs.scan_page and args[0].endswith("batch.pdf")]
+        self.assertEqual(sorted(scanned), list(range(1, 8)))
+        self.assertNotEqual(scanned, sorted(scanned))
+
+        folder = f"{Job.KIND_SPLIT}/2026/10/18/{SESSION}"
+        rows = list(FileResult.objects.filter(file=batch).order_by("id").values_list("value", "page", "output"))
+        self.assertEqual(rows, [
+            ("", 1, f"{folder}/batch.pdf"),
+            (FIRST, 3, f"{folder}/{FIRST}.pdf"),
+            (SECOND, 5, f"{folder}/{SECOND}.pdf"),
+        ])
+        self.assertEqual(self.widths(f"{folder}/batch.pdf"), [310, 320])
+        self.assertEqual(self.widths(f"{folder}/{FIRST}.pdf"), [330, 340])
+        self.assertEqual(self.widths(f"{folder}/{SECOND}.pdf"), [350, 360, 370])
+
+        # không có trang phân cách: cả file thành một segment
+        self.assertEqual(list(FileResult.objects.filter(file=plain).values_list("value", "page", "output")),
+                         [("", 1, f"{folder}/plain.pdf")])
+        self.assertEqual(self.widths(f"{folder}/plain.pdf"), [310, 320, 330])
@@ -0,0 +1,29 @@
+from django.test import SimpleTestCase
+
+from .. import stats
+from ..models import Job
+
+
+class OutcomeTests(SimpleTestCase):
+    def test_failed_and_pdf2layer(self):
+        self.assertEqual(stats.outcome(Job.KIND_QRCODE, "boom", {}), stats.OUTCOME_FAILED)
+        self.assertEqual(stats.outcome(Job.KIND_PDF2LAYER, None, {}), stats.OUTCOME_SUCCESS)
+
+    def test_named_value_must_match_patterns(self):
+        for kind in (Job.KIND_QRCODE, Job.KIND_BARCODE):
+            with self.subTest(kind=kind):
+                self.assertEqual(stats.outcome(kind, None, {"value": "HD-2024-000123"}), stats.OUTCOME_SUCCESS)
+                # barcode đặt tên theo mã đầu tiên dù không khớp: vẫn tính là không có mã
+                self.assertEqual(stats.outcome(kind, None, {"value": "8934567890123"}), stats.OUTCOME_NO_CODE)
+                self.assertEqual(stats.outcome(kind, None, {"value": None}), stats.OUTCOME_NO_CODE)
+
+    def test_split_needs_a_segment_cut_at_a_code(self):
+        cut = {"value": "HD-2024-000123", "page": 1, "output": "split/x/HD-2024-000123.pdf"}
+        extra = {"value": "8934567890123", "page": 2, "output": ""}
+        self.assertEqual(stats.outcome(Job.KIND_SPLIT, None, {"results": [extra, cut]}), stats.OUTCOME_SUCCESS)
+        self.assertEqual(stats.outcome(Job.KIND_SPLIT, None, {"results": [extra]}), stats.OUTCOME_NO_CODE)
+        self.assertEqual(
+            stats.outcome(Job.KIND_SPLIT, None, {"results": [{"value": None, "page": None, "output": "split/x/x.pdf"}]}),
+            stats.OUTCOME_NO_CODE,
+        )
+        self.assertEqual(stats.outcome(Job.KIND_SPLIT, None, {}), stats.OUTCOME_NO_CODE)
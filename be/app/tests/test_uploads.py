@@ -0,0 +1,60 @@
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from ..models import File, Upload
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=tmp.name, PROCESS_ON_ARRIVAL=False)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def init(self, name="scan.pdf", size=10):
+        response = self.client.post(
+            "/app/files/uploads/", {"session_id": "sess_test", "files": [{"name": name, "size": size}]}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()["uploads"][0]
+
+    def put(self, upload_id, offset, data):
+        return self.client.put(f"/app/files/uploads/{upload_id}/?offset={offset}", data, content_type="application/octet-stream")
+
+    def test_chunks_resume_from_offset(self):
+        upload = self.init()
+        self.assertEqual(upload["offset"], 0)
+
+        response = self.put(upload["uploadId"], 0, b"0123")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["upload"]["offset"], 4)
+
+        # chunk gửi lại sau khi mất kết nối: 409 kèm offset để client gửi tiếp từ đó
+        response = self.put(upload["uploadId"], 0, b"0123")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["upload"]["offset"], 4)
+        self.assertEqual(self.put(upload["uploadId"], 8, b"89").status_code, 409)
+
+        # init lại cùng file thì nhận đúng upload đang dở
+        self.assertEqual(self.init(), dict(upload, offset=4))
+
+        self.assertEqual(self.put(upload["uploadId"], 4, b"456789").status_code, 200)
+        response = self.client.post("/app/files/uploads/complete/", {"session_id": "sess_test"}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        stored = Upload.objects.get(pk=upload["uploadId"])
+        with open(stored.file.file.path, "rb") as f:
+            self.assertEqual(f.read(), b"0123456789")
+
+    def test_chunk_over_declared_size(self):
+        upload = self.init(size=4)
+        self.assertEqual(self.put(upload["uploadId"], 0, b"012345").status_code, 400)
+        self.assertEqual(Upload.objects.get(pk=upload["uploadId"]).received, 0)
+
+    def test_complete_refuses_unfinished_uploads(self):
+        upload = self.init()
+        self.put(upload["uploadId"], 0, b"0123")
+        response = self.client.post("/app/files/uploads/complete/", {"session_id": "sess_test"}, content_type="application/json")
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(File.objects.filter(session_id="sess_test").exists())
@@ -0,0 +1,110 @@
+import errno
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .. import writer
+
+
+@override_settings(OUTPUT_LINK_MODE="auto")
+class CloneTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.folder = tmp.name
+        self.src = os.path.join(tmp.name, "upload.pdf")
+        with open(self.src, "wb") as f:
+            f.write(b"%PDF-1.4 content")
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_hardlink_first(self):
+        dst = os.path.join(self.folder, "out.pdf")
+        self.assertEqual(writer._clone(self.src, dst), "hardlink")
+        self.assertTrue(os.path.samefile(self.src, dst))
+        with self.assertRaises(FileExistsError):
+            writer._clone(self.src, dst)
+
+    def test_other_filesystem_falls_back_to_reflink_then_copy(self):
+        cross_device = OSError(errno.EXDEV, "Invalid cross-device link")
+        fake_fcntl = mock.Mock()
+        with mock.patch.object(writer.os, "link", side_effect=cross_device), mock.patch.object(writer, "fcntl", fake_fcntl):
+            self.assertEqual(writer._clone(self.src, os.path.join(self.folder, "reflink.pdf")), "reflink")
+            self.assertEqual(fake_fcntl.ioctl.call_args.args[1], writer.FICLONE)
+
+            fake_fcntl.ioctl.side_effect = OSError(errno.EOPNOTSUPP, "Operation not supported")
+            copied = os.path.join(self.folder, "copy.pdf")
+            self.assertEqual(writer._clone(self.src, copied), "copy")
+        self.assertEqual(self.read(copied), self.read(self.src))
+        self.assertFalse(os.path.samefile(self.src, copied))
+
+    def test_copy_without_fcntl(self):
+        with mock.patch.object(writer.os, "link", side_effect=OSError(errno.EXDEV, "")), mock.patch.object(writer, "fcntl", None):
+            self.assertEqual(writer._clone(self.src, os.path.join(self.folder, "copy.pdf")), "copy")
+
+    def test_forced_modes(self):
+        with override_settings(OUTPUT_LINK_MODE="copy"), mock.patch.object(writer, "fcntl") as fake_fcntl:
+            copied = os.path.join(self.folder, "copy.pdf")
+            self.assertEqual(writer._clone(self.src, copied), "copy")
+            fake_fcntl.ioctl.assert_not_called()
+        self.assertFalse(os.path.samefile(self.src, copied))
+        with override_settings(OUTPUT_LINK_MODE="reflink"), mock.patch.object(writer.os, "link") as link:
+            writer._clone(self.src, os.path.join(self.folder, "reflink.pdf"))
+            link.assert_not_called()
+
+    def test_place_replaces_and_leaves_no_temp_file(self):
+        dst = os.path.join(self.folder, "out.pdf")
+        with open(dst, "wb") as f:
+            f.write(b"old")
+        writer.place(self.src, dst)
+        self.assertEqual(self.read(dst), self.read(self.src))
+
+        with mock.patch.object(writer.os, "replace", side_effect=OSError(errno.EACCES, "denied")):
+            with self.assertRaises(OSError):
+                writer.place(self.src, dst)
+        self.assertEqual(sorted(os.listdir(self.folder)), ["out.pdf", "upload.pdf"])
+
+
+@override_settings(OUTPUT_LINK_MODE="auto")
+class UniqueNameTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.src = os.path.join(tmp.name, "upload.pdf")
+        with open(self.src, "wb") as f:
+            f.write(b"%PDF-1.4")
+        self.folder = os.path.join(tmp.name, "out")
+        os.makedirs(self.folder)
+
+    def names(self, paths):
+        return [os.path.basename(path) for path in paths]
+
+    def test_collisions_are_numbered(self):
+        paths = [writer.place_unique(self.src, self.folder, "HD-2024-000001.pdf") for _ in range(3)]
+        self.assertEqual(self.names(paths), ["HD-2024-000001.pdf", "HD-2024-000001 (1).pdf", "HD-2024-000001 (2).pdf"])
+        self.assertEqual(self.names([writer.place_unique(self.src, self.folder, "other.pdf")]), ["other.pdf"])
+
+    def test_existing_files_are_counted_once(self):
+        for name in ("X.pdf", "X (4).pdf", "X (2).txt"):
+            open(os.path.join(self.folder, name), "w").close()
+        with mock.patch.object(writer, "_scan", wraps=writer._scan) as scan:
+            paths = [writer.place_unique(self.src, self.folder, "X.pdf") for _ in range(2)]
+            paths.append(writer.place_unique(self.src, self.folder, "X.txt"))
+        self.assertEqual(self.names(paths), ["X (5).pdf", "X (6).pdf", "X (3).txt"])
+        self.assertEqual(scan.call_count, 1)
+
+    def test_name_taken_by_another_process(self):
+        writer.place_unique(self.src, self.folder, "X.pdf")
+        # process khác đã ghi X (1) và X (2) mà bộ đếm của process này không biết
+        for name in ("X (1).pdf", "X (2).pdf"):
+            open(os.path.join(self.folder, name), "w").close()
+        self.assertEqual(self.names([writer.place_unique(self.src, self.folder, "X.pdf")]), ["X (3).pdf"])
+
+    def test_reserve_creates_an_empty_file(self):
+        path = writer.reserve_unique(self.folder, "split.pdf")
+        self.assertEqual(os.path.getsize(path), 0)
+        self.assertEqual(self.names([writer.reserve_unique(self.folder, "split.pdf")]), ["split (1).pdf"])
@@ -0,0 +1,92 @@
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import TransactionTestCase
+
+from .. import events, ws
+from ..models import Job
+
+
+class Socket:
+    """Client giả: gửi connect rồi giữ kết nối tới khi ``close()``."""
+
+    def __init__(self, path, query=b""):
+        self.scope = {"type": "websocket", "path": path, "query_string": query}
+        self.incoming = asyncio.Queue()
+        self.incoming.put_nowait({"type": "websocket.connect"})
+        self.sent = []
+        self.frames = asyncio.Queue()
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send(self, message):
+        self.sent.append(message)
+        if message["type"] == "websocket.send":
+            self.frames.put_nowait(json.loads(message["text"]))
+
+    def open(self):
+        return asyncio.create_task(ws.application(self.scope, self.receive, self.send))
+
+    async def next(self, timeout=5):
+        return await asyncio.wait_for(self.frames.get(), timeout)
+
+    def close(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect"})
+
+
+@mock.patch.object(ws, "POLL_INTERVAL", 0.05)
+class ProgressStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.job = Job.objects.create(session_id="sess_ws", kind=Job.KIND_QRCODE, action="qr")
+        self.other = Job.objects.create(session_id="sess_other", kind=Job.KIND_QRCODE, action="qr")
+
+    def test_progress_event_reaches_connected_sockets(self):
+        async def scenario():
+            first, second = Socket("/ws/sessions/sess_ws/"), Socket("/ws/sessions/sess_ws/")
+            foreign = Socket("/ws/sessions/sess_other/")
+            tasks = [first.open(), second.open(), foreign.open()]
+            await asyncio.sleep(0.1)
+
+            await sync_to_async(events.emit)(self.job, events.DECODED, "/media/a.pdf", page=1, value="HD-2024-000001")
+            got = [await first.next(), await second.next()]
+            await sync_to_async(events.emit)(self.other, events.DONE)
+            foreign_got = await foreign.next()
+
+            for socket in (first, second, foreign):
+                socket.close()
+            await asyncio.wait_for(asyncio.gather(*tasks), 5)
+            return got, foreign_got, first, second
+
+        got, foreign_got, first, second = asyncio.run(scenario())
+        for event in got:
+            self.assertEqual((event["jobId"], event["event"], event["file"], event["page"], event["value"]),
+                             (self.job.id, events.DECODED, "a.pdf", 1, "HD-2024-000001"))
+        self.assertEqual((foreign_got["jobId"], foreign_got["event"]), (self.other.id, events.DONE))
+        # event của phiên khác không lọt vào socket này
+        self.assertEqual(len([m for m in first.sent if m["type"] == "websocket.send"]), 1)
+        self.assertEqual(len([m for m in second.sent if m["type"] == "websocket.send"]), 1)
+        self.assertEqual(ws.poller.subscribers, set())
+
+    def test_reconnect_resumes_after_last_seen_event(self):
+        events.emit(self.job, events.QUEUED)
+        seen = self.job.events.get().id
+        events.emit(self.job, events.RENDERING, "/media/b.pdf")
+
+        async def scenario(query):
+            socket = Socket("/ws/sessions/sess_ws/", query)
+            task = socket.open()
+            first = await socket.next()
+            socket.close()
+            await asyncio.wait_for(task, 5)
+            return first
+
+        self.assertEqual(asyncio.run(scenario(b""))["event"], events.QUEUED)
+        self.assertEqual(asyncio.run(scenario(f"after={seen}".encode()))["event"], events.RENDERING)
+
+    def test_unknown_path_is_closed(self):
+        socket = Socket("/ws/nowhere/")
+        asyncio.run(ws.application(socket.scope, socket.receive, socket.send))
+        self.assertEqual(socket.sent, [{"type": "websocket.close", "code": 4404}])
@@ -0,0 +1,50 @@
+import io
+import os
+import tempfile
+import zipfile
+
+from django.test import SimpleTestCase
+
+from .. import zipstream
+from ..views import Download
+
+
+class ZipStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.files = {"a.pdf": os.urandom(3000), "sub/b.pdf": os.urandom(70000), "sub/c.png": os.urandom(10)}
+        for name, content in self.files.items():
+            path = os.path.join(self.tmp.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+
+    def test_planned_size_matches_stream(self):
+        archive = zipstream.ZipStream(self.tmp.name)
+        data = b"".join(archive)
+        self.assertEqual(archive.size, len(data))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertEqual({name: zf.read(name) for name in zf.namelist()}, self.files)
+
+    def test_range_slices_are_byte_exact(self):
+        archive = zipstream.ZipStream(self.tmp.name)
+        data = b"".join(archive)
+        for start, end in [(0, 0), (0, 99), (29, 3100), (3000, None), (len(data) - 1, None), (5000, len(data) - 1)]:
+            with self.subTest(start=start, end=end):
+                expected = data[start:None if end is None else end + 1]
+                self.assertEqual(b"".join(archive.iter_range(start, end)), expected)
+
+    def test_deflated_entries_have_no_planned_size(self):
+        with open(os.path.join(self.tmp.name, "notes.txt"), "w") as f:
+            f.write("x" * 1000)
+        self.assertIsNone(zipstream.ZipStream(self.tmp.name).size)
+
+    def test_parse_range(self):
+        self.assertEqual(Download.parse_range("bytes=10-19", 100), (10, 19))
+        self.assertEqual(Download.parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(Download.parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(Download.parse_range("bytes=50-500", 100), (50, 99))
+        self.assertIsNone(Download.parse_range("bytes=100-", 100))
+        with self.assertRaises(ValueError):
+            Download.parse_range("bytes=0-1,5-6", 100)
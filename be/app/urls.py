@@ -7,7 +7,13 @@ router = DefaultRouter()
 router.register(r'qrcode', views.QrCode, basename='qrcode')
 router.register(r'barcode', views.BarCode, basename='barcode')
 router.register(r'aidoc', views.AiDoc, basename='aidoc')
+router.register(r'split', views.Split, basename='split')
 router.register(r'files', views.FileUpload, basename='files')
 router.register(r'download', views.Download, basename='download')
+router.register(r'jobs', views.Jobs, basename='jobs')
+router.register(r'metrics', views.Metrics, basename='metrics')
+router.register(r'results', views.Results, basename='results')
+router.register(r'stats', views.Stats, basename='stats')
+router.register(r'queue', views.Queue, basename='queue')
 
 urlpatterns += router.urls
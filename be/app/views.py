@@ -2,34 +2,40 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from rest_framework import viewsets
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from loguru import logger
-from qreader import QReader
-from pdf2image import convert_from_path
 from django.conf import settings
-from pyzbar.pyzbar import decode
-from django.core.cache import cache
-from django.http import FileResponse, HttpResponse
-
-import zipfile
-import shutil
-import numpy as np
-import glob
-import cv2
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from PyPDF2 import PdfReader, PdfWriter
+
 import os
-import re
-import json
 import time
-import requests
-
-from .models import File
+from datetime import date
 
-qreader = QReader(model_size='l')
+from . import aidoc, decoders, janitor, metrics, render, result_cache, scheduler, stats, writer, zipstream
+from .jobs import enqueue
+from .models import File, FileResult, Job, Upload, upload_to_session
+from .serializers import FileResultSerializer
 
 
 # Create your views here.
 
 
+def busy(error):
+    """429 for a job refused by admission control, see ``scheduler.Overloaded``."""
+    return Response(
+        {"data": None, 'message': f'Hệ thống đang quá tải, thử lại sau {error.retry_after} giây', "retryAfter": error.retry_after},
+        status=429,
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
 class FileUpload(viewsets.ViewSet):
     """Simple upload endpoint used by the FE to replace mockUpload.
 
@@ -39,11 +45,59 @@ class FileUpload(viewsets.ViewSet):
         - files: multiple files
         - file: single file
     - optional: session_id
+    - optional: process (qrcode / barcode / pdf2layer / split) and action, to queue the files
+      for that pipeline right away (process on arrival); ``start`` then only waits for the job
     """
 
     permission_classes = [AllowAny]
     parser_classes = [MultiPartParser, FormParser]
 
+    @staticmethod
+    def arrival_target(data):
+        """``(kind, action)`` to process the uploaded files with on arrival, ``("", "")`` if none."""
+        kind = data.get("process") or ""
+        if not kind or not settings.PROCESS_ON_ARRIVAL:
+            return "", ""
+        if kind not in Job.KINDS:
+            raise ValueError(f"Unknown process {kind!r}")
+        return kind, data.get("action") or kind
+
+    @staticmethod
+    def enqueue_arrival(session_id, kind, action):
+        try:
+            enqueue(session_id, kind, action)
+        except scheduler.Overloaded as e:
+            # quá tải: không xử lý ngay, file chờ tới lúc client gọi start
+            logger.info(f'------------ Process on arrival deferred for {session_id}: {e}')
+
+    @staticmethod
+    def file_info(request, obj):
+        return {
+            "id": obj.id,
+            "name": obj.original_name,
+            "size": obj.size,
+            "url": request.build_absolute_uri(obj.file.url) if obj.file else None,
+        }
+
+    @staticmethod
+    def finish_upload(upload):
+        """Create the ``File`` row of a fully received upload; ``None`` if it already has one."""
+        sha256 = result_cache.file_sha256(default_storage.path(upload.path))
+        with transaction.atomic():
+            # chunk cuối và complete có thể tới cùng lúc: chỉ một bên tạo File
+            if Upload.objects.select_for_update().filter(pk=upload.pk, file__isnull=True).first() is None:
+                return None
+            upload.file = File.objects.create(
+                session_id=upload.session_id,
+                file=upload.path,
+                original_name=upload.original_name,
+                size=upload.size,
+                content_type=upload.content_type,
+                sha256=sha256,
+            )
+            Upload.objects.filter(pk=upload.pk).update(file=upload.file, updated_at=timezone.now())
+        return upload.file
+
     @action(detail=False, methods=["post"], url_path="upload")
     def upload(self, request, *args, **kwargs):
         session_id = request.data.get("session_id")
@@ -60,89 +114,267 @@ class FileUpload(viewsets.ViewSet):
 
         if not files:
             return Response({"detail": "No file provided (use field 'files' or 'file')"}, status=400)
+        try:
+            kind, process_action = self.arrival_target(request.data)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
 
+        objs = []
         for f in files:
-            obj = File.objects.create(
+            obj = File(
                 session_id=session_id,
-                file=f,
                 original_name=getattr(f, "name", ""),
                 size=getattr(f, "size", 0) or 0,
                 content_type=getattr(f, "content_type", "") or "",
+                sha256=getattr(f, "sha256", "") or "",
             )
-            uploaded.append({
-                "id": obj.id,
-                "name": obj.original_name,
-                "size": obj.size,
-                "url": request.build_absolute_uri(obj.file.url) if obj.file else None,
-            })
+            # ghi file ra storage trước, ngoài transaction, rồi insert tất cả trong một lệnh
+            obj.file.save(getattr(f, "name", "") or "file", f, save=False)
+            objs.append(obj)
+        for obj in File.objects.bulk_create(objs):
+            uploaded.append(self.file_info(request, obj))
+        if kind:
+            self.enqueue_arrival(session_id, kind, process_action)
         logger.info(f'------------ File upload {session_id} ------------')
         return Response({"sessionId": session_id, "files": uploaded}, status=200)
 
-class QrCode(viewsets.ViewSet):
-
-    @staticmethod
-    def get_unique_filename(path):
-        base, ext = os.path.splitext(path)
-        counter = 1
-        new_path = path
-
-        while os.path.exists(new_path):
-            new_path = f"{base} ({counter}){ext}"
-            counter += 1
-
-        return new_path
-
-    def process_page(self, pdf_path, page_number):
+    # Chunked, resumable upload:
+    #   POST /app/files/uploads/                {session_id, files: [{name, size, contentType}], process?, action?}
+    #                                           -> uploadId + offset per file
+    #   PUT  /app/files/uploads/<id>/?offset=N  raw bytes of the chunk starting at N; with process set, the last
+    #                                           chunk creates the File row and queues it (process on arrival)
+    #   GET  /app/files/uploads/?session_id=    offsets to resume from after a disconnect
+    #   POST /app/files/uploads/complete/       {session_id} -> File rows, same response as upload()
+
+    @action(detail=False, methods=["get"], url_path="uploads", parser_classes=[JSONParser])
+    def upload_status(self, request, *args, **kwargs):
+        session_id = request.query_params.get("session_id")
+        if not session_id:
+            return Response({"detail": "session_id is required"}, status=400)
+        uploads = Upload.objects.filter(session_id=session_id).order_by("created_at")
+        return Response({"sessionId": session_id, "uploads": [upload.to_dict() for upload in uploads]}, status=200)
+
+    @upload_status.mapping.post
+    def init_uploads(self, request, *args, **kwargs):
+        session_id = request.data.get("session_id") or f"sess_{int(time.time() * 1000)}"
+        files = request.data.get("files") or []
+        if not files:
+            return Response({"detail": "No file provided (use field 'files')"}, status=400)
         try:
-
-            images = convert_from_path(
-                pdf_path,
-                dpi=300,
-                first_page=page_number,
-                last_page=page_number
+            kind, process_action = self.arrival_target(request.data)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        pending = {
+            (upload.original_name, upload.size): upload
+            for upload in Upload.objects.filter(session_id=session_id, file__isnull=True)
+        }
+        uploads = []
+        for f in files:
+            name = os.path.basename(str(f.get("name", ""))) or "file"
+            size = int(f.get("size") or 0)
+            upload = pending.pop((name, size), None)
+            if upload is None:
+                # giữ chỗ đường dẫn cuối cùng ngay từ đầu, các chunk ghi thẳng vào đó
+                upload = Upload(
+                    session_id=session_id, original_name=name, size=size, content_type=f.get("contentType", "") or "",
+                    kind=kind, action=process_action,
+                )
+                upload.path = default_storage.get_available_name(default_storage.generate_filename(upload_to_session(upload, name)))
+                full_path = default_storage.path(upload.path)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                open(full_path, "ab").close()
+                upload.save()
+            elif (upload.kind, upload.action) != (kind, process_action):
+                upload.kind, upload.action = kind, process_action
+                upload.save(update_fields=["kind", "action", "updated_at"])
+            uploads.append(upload.to_dict())
+
+        logger.info(f'------------ Upload init {session_id}: {len(uploads)} files ------------')
+        return Response(
+            {"sessionId": session_id, "chunkSize": settings.UPLOAD_CHUNK_SIZE, "process": kind or None, "uploads": uploads},
+            status=200,
+        )
+
+    @action(detail=False, methods=["put"], url_path=r"uploads/(?P<upload_id>[0-9a-f-]{36})")
+    def upload_chunk(self, request, upload_id=None, *args, **kwargs):
+        upload = Upload.objects.filter(pk=upload_id).first()
+        if upload is None:
+            return Response({"detail": "Upload not found"}, status=404)
+        try:
+            offset = int(request.query_params.get("offset", ""))
+        except ValueError:
+            return Response({"detail": "offset is required"}, status=400)
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+        if upload.file_id is not None or offset != upload.received:
+            # client gửi lại chunk cũ hoặc nhảy cóc: trả offset hiện tại để nó gửi tiếp từ đó
+            return Response({"detail": "Offset mismatch", "upload": upload.to_dict()}, status=409)
+        if offset + length > upload.size:
+            return Response({"detail": "Chunk exceeds declared size", "upload": upload.to_dict()}, status=400)
+
+        written = 0
+        try:
+            with open(default_storage.path(upload.path), "r+b") as f:
+                f.seek(offset)
+                f.truncate()
+                while written < length:
+                    chunk = request.stream.read(min(1024 * 1024, length - written))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    written += len(chunk)
+        finally:
+            # ghi nhận cả phần đã nhận được khi client đứt kết nối giữa chừng
+            Upload.objects.filter(pk=upload.pk, received=offset).update(received=offset + written)
+
+        upload.received = offset + written
+        if upload.complete and upload.kind:
+            # process on arrival: không chờ complete, file vào pipeline ngay khi ghi xong
+            if self.finish_upload(upload) is not None:
+                self.enqueue_arrival(upload.session_id, upload.kind, upload.action)
+        return Response({"upload": upload.to_dict()}, status=200)
+
+    @action(detail=False, methods=["post"], url_path="uploads/complete", parser_classes=[JSONParser])
+    def complete_uploads(self, request, *args, **kwargs):
+        session_id = request.data.get("session_id")
+        if not session_id:
+            return Response({"detail": "session_id is required"}, status=400)
+        uploads = list(Upload.objects.filter(session_id=session_id, file__isnull=True).order_by("created_at"))
+        incomplete = [upload.to_dict() for upload in uploads if not upload.complete]
+        if incomplete:
+            return Response({"detail": "Upload not finished", "uploads": incomplete}, status=409)
+
+        # upload có process mà chưa có File (chunk cuối lỗi giữa chừng): tạo từng cái như ở upload_chunk
+        arrivals = {}
+        for upload in uploads:
+            if upload.kind and self.finish_upload(upload) is not None:
+                arrivals[(upload.kind, upload.action)] = True
+        for kind, process_action in arrivals:
+            self.enqueue_arrival(session_id, kind, process_action)
+
+        uploads = [upload for upload in uploads if not upload.kind]
+        files = File.objects.bulk_create([
+            File(
+                session_id=session_id,
+                file=upload.path,
+                original_name=upload.original_name,
+                size=upload.size,
+                content_type=upload.content_type,
+                sha256=result_cache.file_sha256(default_storage.path(upload.path)),
             )
-            if not images:
-                return None
-
-            page = images[0]
-            regions = [page]
+            for upload in uploads
+        ])
+        for upload, obj in zip(uploads, files):
+            upload.file = obj
+        Upload.objects.bulk_update(uploads, ["file"])
+
+        # cả các file đã tạo khi chunk cuối tới (process on arrival)
+        completed = Upload.objects.filter(session_id=session_id, file__isnull=False).select_related("file").order_by("created_at")
+        uploaded = [self.file_info(request, upload.file) for upload in completed]
+        logger.info(f'------------ Upload complete {session_id}: {len(uploaded)} files ------------')
+        return Response({"sessionId": session_id, "files": uploaded}, status=200)
 
-            qr_value = self.detect_qr_from_regions(regions)
-            logger.info(f'-------- QR value detected: {qr_value}')
-            for pattern in settings.PATTERNS:
-                if bool(re.match(pattern, qr_value)):
-                    return page_number, qr_value
+class QrCode(viewsets.ViewSet):
 
-        except Exception as e:
-            logger.info(f"Exception during QR code detection: {str(e)}")
-            return None, None
+    def process_pages(self, pdf_paths, page_number, action_detect=None):
+        """Render ``page_number`` of every PDF and decode its QR value through the tiered decoders.
+
+        Pages start at the lowest of ``settings.RENDER_DPI_STEPS`` with the cheap decoders only;
+        the ones still unresolved are re-rendered at the next step, and the QReader model joins
+        at the last step. Scanned pages are read from their embedded image at the first step
+        (see ``render.page_image``) and go through every tier at once, since re-rendering
+        cannot add detail to them. Returns ``{"value", "tier", "symbols"}`` per PDF (see
+        ``decoders.decode_pages``); ``value`` is ``None`` unless it matches ``settings.PATTERNS``.
+        """
+        roi = render.roi_for(action_detect, Job.KIND_QRCODE)
+        results = [{"value": None, "tier": decoders.TIER_NONE, "symbols": []} for _ in pdf_paths]
+        pending = list(range(len(pdf_paths)))
+        steps = settings.RENDER_DPI_STEPS
+
+        for step, dpi in enumerate(steps):
+            last = step == len(steps) - 1
+            images, native = {}, set()
+            for i in pending:
+                try:
+                    images[i], is_native = render.page_image(pdf_paths[i], page_number, dpi=dpi, roi=roi, gray=not last)
+                except Exception as e:
+                    logger.info(f"Exception during QR code detection: {str(e)}")
+                    results[i] = {"value": None, "tier": decoders.TIER_ERROR, "symbols": []}
+                    continue
+                if is_native:
+                    native.add(i)
+
+            for use_model, indices in ((True, [i for i in images if i in native]), (last, [i for i in images if i not in native])):
+                if not indices:
+                    continue
+                with metrics.timer("decode", [pdf_paths[i] for i in indices]):
+                    decoded = decoders.decode_pages([images[i] for i in indices], use_model=use_model)
+                for i, result in zip(indices, decoded):
+                    results[i] = result
+            pending = [i for i in images if i not in native and results[i]["value"] is None]
+            if not pending:
+                break
+
+        for pdf_path, result in zip(pdf_paths, results):
+            logger.info(f'-------- QR value detected: {result["value"]} ({result["tier"]}, {len(result["symbols"])} symbols) in {pdf_path}')
+        return results
 
     @staticmethod
-    def detect_qr_from_regions(pil_regions):
-        for region in pil_regions:
-            image = cv2.cvtColor(np.array(region), cv2.COLOR_RGB2BGR)
-            decoded = qreader.detect_and_decode(image)
-            if decoded:
-                return decoded[0]
-        return None
-
-    def convert_pdfs(self, pdf_file, action_detect):
+    def write_output(pdf_file, action_detect, qrcode_val):
         basedir = os.path.dirname(pdf_file)
         new_basedir = basedir.replace('uploads', action_detect)
         os.makedirs(new_basedir, exist_ok=True)
 
-        page_number, qrcode_val = self.process_page(pdf_file, 1)
+        with metrics.timer("write_output", [pdf_file]):
+            if qrcode_val:
+                # 2 file có cùng giá trị qr code -> "X.pdf", "X (1).pdf", ...
+                new_file = writer.place_unique(pdf_file, new_basedir, f'{qrcode_val}.pdf')
+                logger.info(f'------------ QrCode renaming file {pdf_file} to: {new_file}')
 
-        if qrcode_val:
-            new_file = f'{new_basedir}/{qrcode_val}.pdf'
-            new_file = self.get_unique_filename(new_file) # cần có hàm này để xử lý case 2 qr code có giá trị giống nhau
-            logger.info(f'------------ QrCode renaming file {pdf_file} to: {new_file}')
-            shutil.copyfile(pdf_file, new_file)
+            else:
+                logger.info(f'------------ Không phát hiện qr code trong file {pdf_file}')
+                new_file = writer.place(pdf_file, pdf_file.replace('uploads', action_detect))
+
+        return new_file
+
+    def convert_batch(self, pdf_files, action_detect, hashes=None):
+        """Decode the first page of several PDFs together, then rename each one.
+
+        ``hashes`` are the content hashes stored at upload; files already decoded once are
+        answered from ``result_cache`` without rendering. Returns one info dict per PDF with
+        the decoder tier that resolved it.
+        """
+        hashes = hashes or [None] * len(pdf_files)
+        hashes = [sha256 or result_cache.file_sha256(pdf_file) for pdf_file, sha256 in zip(pdf_files, hashes)]
+
+        results = []
+        with metrics.timer("cache", pdf_files):
+            for sha256 in hashes:
+                cached = result_cache.get(sha256, Job.KIND_QRCODE, action_detect)
+                results.append(cached if cached is result_cache.MISS else dict(cached, tier=decoders.TIER_CACHE))
+
+        misses = [i for i, result in enumerate(results) if result is result_cache.MISS]
+        decoded = self.process_pages([pdf_files[i] for i in misses], 1, action_detect) if misses else []
+        for i, result in zip(misses, decoded):
+            if result["tier"] != decoders.TIER_ERROR:
+                result_cache.set(hashes[i], Job.KIND_QRCODE, action_detect, {"value": result["value"], "symbols": result["symbols"]})
+            results[i] = result
+
+        infos = []
+        for pdf_file, result in zip(pdf_files, results):
+            qrcode_val = result["value"]
+            new_file = self.write_output(pdf_file, action_detect, qrcode_val)
+            infos.append({
+                "tier": result["tier"],
+                "value": qrcode_val,
+                "page": 1 if qrcode_val else None,
+                "outputs": [new_file],
+                "results": decoders.result_rows(result["symbols"], qrcode_val, new_file),
+            })
+        return infos
 
-        else:
-            logger.info(f'------------ Không phát hiện qr code trong file {pdf_file}')
-            new_file = pdf_file.replace('uploads', action_detect)
-            shutil.copyfile(pdf_file, new_file)
+    def convert_pdfs(self, pdf_file, action_detect, sha256=None):
+        return self.convert_batch([pdf_file], action_detect, [sha256])[0]
 
 
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
@@ -150,167 +382,389 @@ class QrCode(viewsets.ViewSet):
 
         session_id = self.request.data.get('session_id')
         action = self.request.data.get('action')
-        files = File.objects.filter(session_id=session_id)
 
-        if not len(files):
+        if not File.objects.filter(session_id=session_id).exists():
             return Response({"data": None, 'message': 'Không tìm thấy file'}, status=500)
 
-        else:
-            for file in files:
-                path_file = os.path.join(settings.MEDIA_ROOT, file.file.name)
-                logger.info(f'------- xử lý file : {path_file}')
-                self.convert_pdfs(path_file, action)
-
-        return Response({"data": None, 'message': 'Thành công'}, status=200)
+        try:
+            job = enqueue(session_id, Job.KIND_QRCODE, action, force=bool(self.request.data.get('force')))
+        except scheduler.Overloaded as e:
+            return busy(e)
+        logger.info(f'------- QrCode job {job.id} queued for session {session_id}')
+        return Response({"data": job.to_dict(), 'message': 'Đã tiếp nhận'}, status=202)
 
 class BarCode(viewsets.ViewSet):
 
     @staticmethod
-    def convert_pdfs(pdf_file, action_detect):
+    def read_barcodes(pdf_file, action_detect, page_number=1):
+        """Every symbol on a page (any type, see ``decoders.detect_symbols``), ``[]`` if none."""
+        roi = render.roi_for(action_detect, Job.KIND_BARCODE)
+        for dpi in settings.RENDER_DPI_STEPS:
+            image, native = render.page_image(pdf_file, page_number, dpi=dpi, roi=roi, gray=True)
+            # thử ảnh đã tiền xử lý ở cùng DPI trước khi render lại ở DPI cao hơn
+            with metrics.timer("decode", [pdf_file]):
+                symbols = decoders.detect_symbols(image, accept=bool)
+            # ảnh nhúng đã ở độ phân giải gốc: render DPI cao hơn cũng không thêm chi tiết
+            if symbols or native:
+                return symbols
+        return []
+
+    @staticmethod
+    def convert_pdfs(pdf_file, action_detect, sha256=None):
         try:
             dirname = os.path.dirname(pdf_file)
             dirname = dirname.replace('uploads', action_detect)
             os.makedirs(dirname, exist_ok=True)
 
-            try:
-                pages = convert_from_path(pdf_file, dpi=300, first_page=1, last_page=1)
-            except Exception as e:
-                logger.info(f"Lỗi khi đọc file PDF: {e}")
+            sha256 = sha256 or result_cache.file_sha256(pdf_file)
+            with metrics.timer("cache", [pdf_file]):
+                symbols = result_cache.get(sha256, Job.KIND_BARCODE, action_detect)
+            cached = symbols is not result_cache.MISS
+            if not cached:
+                # Chỉ render vùng ROI (mặc định 1/4 góc phải trên), tăng DPI khi chưa đọc được
+                symbols = BarCode.read_barcodes(pdf_file, action_detect)
+                result_cache.set(sha256, Job.KIND_BARCODE, action_detect, symbols)
+
+            # một bản sao duy nhất, đặt tên theo mã khớp PATTERNS (nếu có), không thì mã đầu tiên
+            chosen = decoders.pick(symbols, prefer=()) or decoders.pick(symbols, accept=bool, prefer=())
+            with metrics.timer("write_output", [pdf_file]):
+                if chosen:
+                    output = writer.place(pdf_file, f"{dirname}/{chosen['value']}.pdf")
+
+                else:
+                    logger.info(f'------------ Không tìm thấy barcode trong file {pdf_file}')
+                    output = writer.place(pdf_file, pdf_file.replace('uploads', action_detect))
 
-            if not pages:
-                logger.info("Không đọc được trang đầu tiên")
+            logger.info("Hoàn tất")
+            value = chosen["value"] if chosen else ""
+            tier = decoders.TIER_CACHE if cached else chosen["tier"] if chosen else decoders.TIER_NONE
+            return {
+                "tier": tier,
+                "value": value,
+                "outputs": [output],
+                "results": decoders.result_rows(symbols, value, output),
+            }
+        except Exception as e:
+            logger.info(f"Lỗi: {str(e)}")
+            raise
 
-            first_page_image = pages[0]
-            width, height = first_page_image.size
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    def start(self, request, *args, **kwargs):
+        session_id = self.request.data.get('session_id')
+        action = self.request.data.get('action')
 
-            # Cắt vùng 1/4 góc phải trên
-            crop_box = (width // 2, 0, width, height // 2)
-            cropped_image = first_page_image.crop(crop_box)
+        if not File.objects.filter(session_id=session_id).exists():
+            return Response({"data": None, 'message': 'Không tìm thấy file'}, status=500)
 
-            # Đọc barcode trong vùng đã cắt
-            barcodes = decode(cropped_image)
+        try:
+            job = enqueue(session_id, Job.KIND_BARCODE, action, force=bool(self.request.data.get('force')))
+        except scheduler.Overloaded as e:
+            return busy(e)
+        logger.info(f'------- BarCode job {job.id} queued for session {session_id}')
+        return Response({"data": job.to_dict(), 'message': 'Đã tiếp nhận'}, status=202)
 
-            if barcodes:
-                for barcode in barcodes:
-                    barcode_data = barcode.data.decode("utf-8")
-                    new_file = f"{dirname}/{barcode_data}.pdf"
-                    shutil.copyfile(pdf_file, new_file)
+class Split(viewsets.ViewSet):
+    """Split batch scans into documents at pages carrying a QR code / barcode.
 
-            else:
-                print("Không tìm thấy barcode")
-                shutil.copyfile(pdf_file, pdf_file.replace('uploads', 'barcode'))
+    Every page is scanned in parallel by the job workers; a page whose code matches
+    ``settings.PATTERNS`` starts a new document named after that code.
+    """
 
+    @staticmethod
+    def scan_page(pdf_file, page_number, action_detect):
+        roi = render.roi_for(action_detect, Job.KIND_SPLIT)
+        image = render.render_page(pdf_file, page_number, dpi=settings.SPLIT_DPI, roi=roi,
+                                   gray=not settings.SPLIT_USE_QREADER)
 
+        with metrics.timer("decode", [pdf_file]):
+            # phần lớn trang không có mã: chỉ tiền xử lý khi bật SPLIT_PREPROCESS
+            steps = None if settings.SPLIT_PREPROCESS else ()
+            result = decoders.decode_pages([image], use_model=settings.SPLIT_USE_QREADER, preprocess_steps=steps, prefer=())[0]
+            return result["value"], result["tier"]
 
-            logger.info("Hoàn tất")
-        except Exception as e:
-            logger.info(f"Lỗi: {str(e)}")
+    @staticmethod
+    def write_segments(pdf_file, action_detect, codes):
+        """Write one PDF per segment; ``codes`` maps page number -> separator value or ``None``.
+
+        Pages before the first separator keep the original file name, a PDF without any
+        separator is copied as a single segment. Returns ``(path, first page, value)`` per segment.
+        """
+        dirname = os.path.dirname(pdf_file).replace('uploads', action_detect)
+        os.makedirs(dirname, exist_ok=True)
+
+        with metrics.timer("write_output", [pdf_file]):
+            boundaries = sorted(page for page, value in codes.items() if value)
+            if not boundaries:
+                logger.info(f'------------ Không tìm thấy trang phân cách trong file {pdf_file}')
+                return [(writer.place(pdf_file, pdf_file.replace('uploads', action_detect)), 1, None)]
+
+            reader = PdfReader(pdf_file)
+            starts = ([1] if boundaries[0] != 1 else []) + boundaries
+            ends = [start - 1 for start in starts[1:]] + [len(reader.pages)]
+            stem = os.path.splitext(os.path.basename(pdf_file))[0]
+
+            segments = []
+            for start, end in zip(starts, ends):
+                name = codes.get(start) or stem
+                new_file = writer.reserve_unique(dirname, f'{name}.pdf')
+                pdf_writer = PdfWriter()
+                for page_number in range(start, end + 1):
+                    pdf_writer.add_page(reader.pages[page_number - 1])
+                with open(new_file, "wb") as f:
+                    pdf_writer.write(f)
+                logger.info(f'------------ Split {pdf_file} pages {start}-{end} -> {new_file}')
+                segments.append((new_file, start, codes.get(start)))
+            return segments
 
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
     def start(self, request, *args, **kwargs):
         session_id = self.request.data.get('session_id')
-        action = self.request.data.get('action')
-
-        files = File.objects.filter(session_id=session_id)
+        action = self.request.data.get('action') or Job.KIND_SPLIT
 
-        if not len(files):
+        if not File.objects.filter(session_id=session_id).exists():
             return Response({"data": None, 'message': 'Không tìm thấy file'}, status=500)
 
-        else:
-            for file in files:
-                path_file = os.path.join(settings.MEDIA_ROOT, file.file.name)
-                logger.info(f'------- xử lý file : {path_file}')
-                self.convert_pdfs(path_file, action)
-
-        return Response({"data": None, 'message': 'Thành công'}, status=200)
+        try:
+            job = enqueue(session_id, Job.KIND_SPLIT, action, force=bool(self.request.data.get('force')))
+        except scheduler.Overloaded as e:
+            return busy(e)
+        logger.info(f'------- Split job {job.id} queued for session {session_id}')
+        return Response({"data": job.to_dict(), 'message': 'Đã tiếp nhận'}, status=202)
 
 class AiDoc(viewsets.ViewSet):
 
-    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
-    def pdf2layer(self, request, *args, **kwargs):
+    @staticmethod
+    def pdf2layer_file(file_path, action):
+        filename = os.path.basename(file_path)
+        dirname = os.path.dirname(file_path).replace('uploads', action)
+        os.makedirs(dirname, exist_ok=True)
+        new_file = f"{dirname}/{filename}"
 
-        url = f'{settings.DOMAIN_AIDOC}/home/api/v1/ocr-general/upload-and-download-pdf2layer'
-        payload = {"folder": 660690, "get_value": 1}
-        headers = {"Authorization": settings.TOKEN_AIDOC}
+        logger.info(f"======== filename: {new_file}")
+        aidoc.get_client().pdf2layer(file_path, new_file, progress=AiDoc.log_progress)
+        return new_file
+
+    @staticmethod
+    def log_progress(file_path, state, **info):
+        logger.info(f"======== AiDoc {state}: {os.path.basename(file_path)} {info or ''}")
 
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    def pdf2layer(self, request, *args, **kwargs):
         session_id = self.request.data.get('session_id')
         action = self.request.data.get('action')
-        files = File.objects.filter(session_id=session_id)
 
-        if not len(files):
+        if not File.objects.filter(session_id=session_id).exists():
             return Response({"data": None, 'message': 'Không tìm thấy file'}, status=500)
-        else:
-            for file in files:
-                file_path = os.path.join(settings.MEDIA_ROOT, file.file.name)
-                filename = os.path.basename(file_path)
-                dirname = os.path.dirname(file_path)
-                files = [("file", (filename, open(file_path, "rb"), "application/pdf"))]
-
-                res =  requests.post(url, headers=headers, data=payload, files=files)
-                # response = HttpResponse(
-                #     res.content,
-                #     content_type=res.headers.get("Content-Type", "application/octet-stream")
-                # )
-
-                dirname = dirname.replace('uploads', action)
-                os.makedirs(dirname, exist_ok=True)
-                new_file = f"{dirname}/{filename}"
-
-                logger.info(f"======== filename: {new_file}")
-                with open(new_file, "wb") as f:
-                    f.write(res.content)
-                # return response
 
-        return Response({"status": "success"}, status=200)
+        try:
+            job = enqueue(session_id, Job.KIND_PDF2LAYER, action, force=bool(self.request.data.get('force')))
+        except scheduler.Overloaded as e:
+            return busy(e)
+        logger.info(f'------- AiDoc job {job.id} queued for session {session_id}')
+        return Response({"status": "queued", "data": job.to_dict()}, status=202)
 
 
-class Download(viewsets.ViewSet):
+class Jobs(viewsets.ViewSet):
+    """Job status polled by the FE after calling a ``start`` endpoint.
 
-    @staticmethod
-    def zip_session_folder(folder_path, zip_path):
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(folder_path):
-                for file in files:
-                    full_path = os.path.join(root, file)
-                    # giữ relative path trong zip
-                    arcname = os.path.relpath(full_path, folder_path)
-                    zipf.write(full_path, arcname)
+    GET /app/jobs/<id>/
+    """
 
-        return zip_path
+    permission_classes = [AllowAny]
 
-    @staticmethod
-    def delete_data(session_id):
+    def retrieve(self, request, pk=None, *args, **kwargs):
+        job = Job.objects.filter(pk=pk).first()
+        if job is None:
+            return Response({"data": None, 'message': 'Không tìm thấy job'}, status=404)
+        return Response({"data": job.to_dict(), 'message': job.status}, status=200)
 
-        # delete folder
-        file = File.objects.filter(session_id=session_id).first()
-        basedir = os.path.dirname(os.path.join(settings.MEDIA_ROOT, file.file.name))
-        if os.path.exists(basedir):
-            shutil.rmtree(basedir)
 
-        # delete database
-        File.objects.filter(session_id=session_id).delete()
+class ResultPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
 
-        # delete zip file
-        zip_path = f'{session_id}.zip'
-        if os.path.exists(zip_path):
-            os.remove(zip_path)
+class Results(viewsets.ViewSet):
+    """Stored decode results of a session, read from the DB only.
 
+    GET /app/results/?session_id=<id>[&action=<action>][&kind=<kind>][&page=N&page_size=M]
+    """
 
+    permission_classes = [AllowAny]
 
-    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    def list(self, request, *args, **kwargs):
+        session_id = request.query_params.get("session_id")
+        if not session_id:
+            return Response({"data": None, 'message': 'Thiếu session_id'}, status=400)
+
+        results = FileResult.objects.filter(file__session_id=session_id).select_related("file").order_by("file_id", "id")
+        for field in ("action", "kind"):
+            if request.query_params.get(field):
+                results = results.filter(**{field: request.query_params[field]})
+
+        paginator = ResultPagination()
+        page = paginator.paginate_queryset(results, request, view=self)
+        return Response({
+            "data": FileResultSerializer(page, many=True, context={"request": request}).data,
+            "count": paginator.page.paginator.count,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            'message': 'Thành công',
+        }, status=200)
+
+
+class StatsPagination(PageNumberPagination):
+    page_size = 31
+    page_size_query_param = "page_size"
+    max_page_size = 366
+
+
+class Stats(viewsets.ViewSet):
+    """Processing statistics for the report screen, read from the ``DailyStat`` rollups only.
+
+    GET /app/stats/?start=YYYY-MM-DD&end=YYYY-MM-DD[&kind=][&action=][&group=date|kind|action|outcome][&page=N&page_size=M]
+
+    ``data`` has one summary per group value (per day by default), ``totals`` sums the whole range.
+    """
+
+    permission_classes = [AllowAny]
+
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        group = params.get("group") or "date"
+        if group not in stats.GROUPS:
+            return Response({"data": None, 'message': f'group phải là một trong {", ".join(stats.GROUPS)}'}, status=400)
+        try:
+            start, end = (date.fromisoformat(params[name]) if params.get(name) else None for name in ("start", "end"))
+        except ValueError:
+            return Response({"data": None, 'message': 'Ngày không hợp lệ (YYYY-MM-DD)'}, status=400)
+
+        rows = stats.rows(start, end, params.get("kind"), params.get("action"))
+        paginator = StatsPagination()
+        keys = paginator.paginate_queryset(stats.keys(rows, group), request, view=self)
+        summaries = stats.summarize(rows.filter(**{f"{group}__in": keys}), group)
+        return Response({
+            "data": [dict(summaries[key], **{group: key}) for key in keys],
+            "totals": stats.summarize(rows),
+            "count": paginator.page.paginator.count,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            'message': 'Thành công',
+        }, status=200)
+
+
+class Queue(viewsets.ViewSet):
+    """Job queue load for monitoring: depth, limits, whether new jobs are accepted, busiest sessions.
+
+    GET /app/queue/
+    """
+
+    permission_classes = [AllowAny]
+
+    def list(self, request, *args, **kwargs):
+        data = scheduler.queue_stats()
+        return Response({"data": data, 'message': 'Thành công' if data["accepting"] else 'Quá tải'}, status=200)
+
+
+class Metrics(viewsets.ViewSet):
+    """Prometheus scrape endpoint: stage timings, file/page/job counters of every process.
+
+    GET /app/metrics/
+    """
+
+    permission_classes = [AllowAny]
+
+    def list(self, request, *args, **kwargs):
+        return HttpResponse(metrics.render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+class Download(viewsets.ViewSet):
+    """Session result as a ZIP streamed while the client downloads it.
+
+    POST/GET /app/download/result/  (session_id, action)
+    - supports Range / If-Range so an interrupted download can resume
+    - once the last byte was sent the session is scheduled for removal by the janitor
+    """
+
+    @staticmethod
+    def parse_range(header, size):
+        """``(start, end)`` of a single ``bytes=`` range, ``None`` if unsatisfiable.
+
+        Raises ``ValueError`` for headers we don't handle (the full archive is sent then).
+        """
+        unit, _, spec = header.partition("=")
+        if unit.strip() != "bytes" or "," in spec:
+            raise ValueError(header)
+        first, _, last = spec.strip().partition("-")
+        if not first:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        if start > end or start >= size:
+            return None
+        return start, end
+
+    @staticmethod
+    def stream_and_cleanup(archive, start, end, session_id):
+        yield from archive.iter_range(start, end)
+        # chỉ hẹn dọn dữ liệu khi client đã nhận tới byte cuối cùng của file zip; janitor xoá sau SESSION_DOWNLOAD_GRACE
+        if end is None or end >= archive.size - 1:
+            logger.info(f"------------- Download completed, session {session_id} expires in {settings.SESSION_DOWNLOAD_GRACE}s")
+            janitor.expire(session_id, settings.SESSION_DOWNLOAD_GRACE, reason="downloaded")
+
+    @staticmethod
+    async def iterate_async(iterator):
+        # dưới ASGI, Django gom toàn bộ iterator đồng bộ vào bộ nhớ -> đọc từng chunk trong thread
+        sentinel = object()
+        while True:
+            chunk = await sync_to_async(next, thread_sensitive=False)(iterator, sentinel)
+            if chunk is sentinel:
+                return
+            yield chunk
+
+    @action(detail=False, methods=['get', 'post'], permission_classes=[AllowAny])
     def result(self, request, *args, **kwargs):
-        session_id = self.request.data.get('session_id')
-        action = self.request.data.get('action')
+        session_id = self.request.data.get('session_id') or self.request.query_params.get('session_id')
+        action = self.request.data.get('action') or self.request.query_params.get('action')
 
         file = File.objects.filter(session_id=session_id).first()
-        src_file = os.path.join(settings.MEDIA_ROOT, file.file.name)
-        if os.path.exists(src_file):
+        src_file = os.path.join(settings.MEDIA_ROOT, file.file.name) if file else None
+        if src_file and os.path.exists(src_file):
             basedir = os.path.dirname(src_file).replace('uploads', action)
             logger.info(f"------------- Downloading folder: {basedir}")
-            zip_path = f'{session_id}.zip'
-            self.zip_session_folder(folder_path=basedir, zip_path=zip_path)
-            result_file = open(zip_path, 'rb')
-            self.delete_data(session_id=session_id)
-            return FileResponse(result_file, as_attachment=True, filename=zip_path)
+            # danh sách file kết quả lấy từ DB; session chưa có kết quả lưu lại thì quét thư mục như cũ
+            outputs = FileResult.objects.filter(file__session_id=session_id, action=action).exclude(output="")
+            files = [os.path.join(settings.MEDIA_ROOT, output) for output in outputs.values_list("output", flat=True)]
+            archive = zipstream.ZipStream(basedir, files or None)
+            zip_name = f'{session_id}.zip'
+
+            start, end, status = 0, None, 200
+            range_header = request.headers.get("Range")
+            if_range = request.headers.get("If-Range")
+            if archive.size is not None and range_header and if_range in (None, archive.etag):
+                try:
+                    byte_range = self.parse_range(range_header, archive.size)
+                except ValueError:
+                    byte_range = (0, None)
+                if byte_range is None:
+                    return HttpResponse(status=416, headers={"Content-Range": f"bytes */{archive.size}"})
+                start, end = byte_range
+                status = 206 if end is not None else 200
+
+            content = self.stream_and_cleanup(archive, start, end, session_id)
+            if isinstance(request._request, ASGIRequest):
+                content = self.iterate_async(content)
+            response = StreamingHttpResponse(content, status=status, content_type="application/zip")
+            response["Content-Disposition"] = f'attachment; filename="{zip_name}"'
+            response["ETag"] = archive.etag
+            if archive.size is not None:
+                response["Accept-Ranges"] = "bytes"
+                last = archive.size - 1 if end is None else end
+                response["Content-Length"] = str(last - start + 1)
+                if status == 206:
+                    response["Content-Range"] = f"bytes {start}-{end}/{archive.size}"
+            return response
 
         return Response({"status": "error", 'message': 'Không tìm thấy file'}, status=500)
+
@@ -0,0 +1,15 @@
+"""Initializer of the spawned decode worker processes.
+
+A spawned process unpickles its initializer before Django is set up, so this module
+must not import ``app.models`` (``app.jobs`` does, at import time).
+"""
+
+import os
+
+import django
+
+
+def init():
+    # worker process được spawn mới hoàn toàn nên phải tự setup django
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    django.setup()
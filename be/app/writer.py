@@ -0,0 +1,137 @@
+"""Output files of the rename actions, written without duplicating bytes when possible.
+
+An output is usually the uploaded PDF under a new name, so it is materialized as a hard
+link, then as a reflink (``FICLONE``, btrfs / XFS / overlay on those) when hard links are
+not possible (other filesystem, link limit), and copied only as a last resort.
+``settings.OUTPUT_LINK_MODE`` can force ``reflink`` or ``copy``, e.g. when outputs must not
+share an inode with the upload.
+
+Unique names (``X.pdf``, ``X (1).pdf``, ...) come from per-folder, per-name counters kept
+in memory (a folder is listed once, the first time a process writes into it), so placing
+the n-th file with the same QR value does not probe the n-1 existing ones. The file is
+always created exclusively (``os.link`` / ``O_EXCL``), so several worker processes
+writing into one folder never overwrite each other: a stale counter only costs one
+extra attempt.
+"""
+
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+FICLONE = 0x40049409  # linux/fs.h
+CHUNK_SIZE = 1024 * 1024
+MAX_FOLDERS = 1000
+NAME_RE = re.compile(r"^(?P<stem>.*?)(?: \((?P<n>\d+)\))?(?P<ext>\.[^.]*)?$")
+
+_lock = threading.Lock()
+_folders = OrderedDict()  # folder -> {(stem, ext): next counter}
+
+
+def _clone(src, dst):
+    """Create ``dst`` with the content of ``src``; raises ``FileExistsError`` if it exists."""
+    mode = settings.OUTPUT_LINK_MODE
+    if mode == "auto":
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except FileExistsError:
+            raise
+        except OSError:
+            pass  # khác filesystem / không hỗ trợ hard link
+
+    with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+        if mode != "copy" and fcntl is not None:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return "reflink"
+            except OSError:
+                pass
+        shutil.copyfileobj(fsrc, fdst, CHUNK_SIZE)
+        return "copy"
+
+
+def _count(method):
+    metrics.registry.inc("outputs_total", method=method)
+
+
+def place(src, dst):
+    """Put ``src`` at ``dst``, replacing an existing file (same behaviour as ``copyfile``)."""
+    tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        _count(_clone(src, tmp))
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return dst
+
+
+def _candidate(folder, stem, ext, n):
+    return os.path.join(folder, f"{stem}{ext}" if n == 0 else f"{stem} ({n}){ext}")
+
+
+def _scan(folder):
+    """Next free counter of every name already in ``folder`` (one listing per folder)."""
+    counters = {}
+    if os.path.isdir(folder):
+        for entry in os.scandir(folder):
+            match = NAME_RE.match(entry.name)
+            if match:
+                key = (match["stem"], match["ext"] or "")
+                counters[key] = max(counters.get(key, 0), int(match["n"] or 0) + 1)
+    return counters
+
+
+def _next_name(folder, stem, ext, create):
+    """Call ``create(path)`` on the first free name of ``stem`` in ``folder``."""
+    with _lock:
+        if folder not in _folders:
+            _folders[folder] = _scan(folder)
+            while len(_folders) > MAX_FOLDERS:
+                _folders.popitem(last=False)
+        _folders.move_to_end(folder)
+        counters = _folders[folder]
+        n = counters.get((stem, ext), 0)
+        counters[(stem, ext)] = n + 1
+    rescanned = False
+    while True:
+        path = _candidate(folder, stem, ext, n)
+        try:
+            result = create(path)
+            break
+        except FileExistsError:
+            # process khác đã ghi vào cùng thư mục: đọc lại thư mục một lần rồi lấy số kế tiếp
+            with _lock:
+                if not rescanned:
+                    for key, value in _scan(folder).items():
+                        counters[key] = max(counters.get(key, 0), value)
+                    rescanned = True
+                n = max(n + 1, counters.get((stem, ext), 0))
+                counters[(stem, ext)] = n + 1
+    return path, result
+
+
+def place_unique(src, folder, name):
+    """Put ``src`` in ``folder`` as ``name``, or ``name (n)`` if taken. Returns the new path."""
+    stem, ext = os.path.splitext(name)
+    path, method = _next_name(folder, stem, ext, lambda path: _clone(src, path))
+    _count(method)
+    return path
+
+
+def reserve_unique(folder, name):
+    """Create an empty file named ``name`` (or ``name (n)``) in ``folder`` for the caller to fill in."""
+    stem, ext = os.path.splitext(name)
+    path, _ = _next_name(folder, stem, ext, lambda path: open(path, "xb").close())
+    return path
@@ -0,0 +1,129 @@
+"""WebSocket endpoint streaming job progress events.
+
+``/ws/sessions/<session_id>/`` sends every ``JobEvent`` of the session as a JSON text
+frame, oldest first. Events live in the DB, so a client that reconnects passes
+``?after=<last event id>`` and gets what it missed before the live tail. The socket is
+served by whichever uvicorn worker accepted it; new events are picked up by polling.
+
+Each process runs one :class:`Poller` for all of its sockets: every POLL_INTERVAL it reads
+the new events of every session with an open socket in a single query, on its own thread
+(which keeps its DB connection between polls), and hands them to the sockets' queues.
+"""
+
+import asyncio
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from django.db import close_old_connections
+from loguru import logger
+
+from . import events
+
+PATH_RE = re.compile(r"^/ws/sessions/(?P<session_id>[\w-]{1,64})/?$")
+POLL_INTERVAL = 0.5
+FETCH_LIMIT = 500
+
+
+def _fetch(cursors):
+    # chỉ đóng kết nối hỏng hoặc quá CONN_MAX_AGE, không mở lại kết nối ở mỗi lượt poll
+    close_old_connections()
+    return events.since_many(cursors, FETCH_LIMIT)
+
+
+class Subscriber:
+    def __init__(self, session_id, after_id):
+        self.session_id = session_id
+        self.after_id = after_id
+        self.queue = asyncio.Queue()
+
+
+class Poller:
+    """Shared poll loop of the sockets of this process."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ws-poll")
+        self._task = None
+        self._wake = None
+
+    def subscribe(self, session_id, after_id):
+        subscriber = Subscriber(session_id, after_id)
+        self.subscribers.add(subscriber)
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wake = asyncio.Event()
+            self._task = loop.create_task(self.run())
+        # socket mới nhận ngay các event nó bỏ lỡ, không chờ hết lượt
+        self._wake.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while self.subscribers:
+            self._wake.clear()
+            by_session = {}
+            for subscriber in self.subscribers:
+                by_session.setdefault(subscriber.session_id, []).append(subscriber)
+            cursors = {session_id: min(s.after_id for s in subscribers) for session_id, subscribers in by_session.items()}
+            try:
+                found = await loop.run_in_executor(self._executor, _fetch, cursors)
+            except Exception as e:
+                logger.exception(f"WS poll error: {e}")
+                found = []
+            for session_id, event in found:
+                for subscriber in by_session.get(session_id, ()):
+                    if event["id"] > subscriber.after_id:
+                        subscriber.after_id = event["id"]
+                        subscriber.queue.put_nowait(event)
+            if len(found) < FETCH_LIMIT:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+
+poller = Poller()
+
+
+async def application(scope, receive, send):
+    match = PATH_RE.match(scope["path"])
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    if match is None:
+        await send({"type": "websocket.close", "code": 4404})
+        return
+
+    session_id = match["session_id"]
+    query = parse_qs(scope.get("query_string", b"").decode())
+    try:
+        after_id = int(query.get("after", ["0"])[0])
+    except ValueError:
+        after_id = 0
+    await send({"type": "websocket.accept"})
+    logger.info(f"------------ WS connected: {session_id} after {after_id}")
+
+    # client chỉ nhận, không gửi; đọc receive để biết lúc nó ngắt kết nối
+    async def wait_disconnect():
+        while (await receive())["type"] != "websocket.disconnect":
+            pass
+
+    subscriber = poller.subscribe(session_id, after_id)
+    watcher = asyncio.create_task(wait_disconnect())
+    try:
+        while True:
+            getter = asyncio.create_task(subscriber.queue.get())
+            await asyncio.wait({getter, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                break
+            await send({"type": "websocket.send", "text": json.dumps(getter.result(), ensure_ascii=False)})
+    finally:
+        poller.unsubscribe(subscriber)
+        watcher.cancel()
+        logger.info(f"------------ WS closed: {session_id}")
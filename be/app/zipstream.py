@@ -0,0 +1,188 @@
+"""Streaming ZIP writer for session downloads.
+
+The archive is produced chunk by chunk while the client reads it, so nothing is written
+to disk first. Entries use data descriptors (CRC and sizes follow the data) and ZIP64
+records when sizes or offsets need them. Already-compressed formats (PDF, images,
+archives) are stored as-is; everything else is deflated.
+
+The byte stream is deterministic for a given folder (sorted entries, file mtimes), so a
+download can be resumed with an HTTP Range request: the stream is regenerated and the
+bytes before the requested offset are skipped. When every entry is stored the total
+size is known up front, which is what makes ``Content-Length`` / ``Content-Range``
+possible.
+"""
+
+import hashlib
+import os
+import struct
+import time
+import zlib
+
+STORED = 0
+DEFLATED = 8
+CHUNK_SIZE = 1024 * 1024
+
+COMPRESSED_EXTENSIONS = {
+    ".pdf", ".zip", ".gz", ".bz2", ".xz", ".7z", ".rar",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".tif", ".tiff", ".jp2",
+    ".docx", ".xlsx", ".pptx", ".mp3", ".mp4",
+}
+
+ZIP64_LIMIT = 0xFFFFFFFF
+# deflate có thể làm dữ liệu lớn hơn một chút, chừa khoảng trống khi quyết định dùng zip64
+DEFLATE_MARGIN = 1024 * 1024
+
+FLAG_DATA_DESCRIPTOR = 0x0008
+FLAG_UTF8 = 0x0800
+
+
+def _dos_datetime(mtime):
+    t = time.localtime(max(mtime, 315532800))  # ZIP không biểu diễn được trước 1980
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class Entry:
+    def __init__(self, path, arcname):
+        stat = os.stat(path)
+        self.path = path
+        self.name = arcname.replace(os.sep, "/").encode("utf-8")
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        self.method = STORED if os.path.splitext(path)[1].lower() in COMPRESSED_EXTENSIONS else DEFLATED
+        limit = ZIP64_LIMIT if self.method == STORED else ZIP64_LIMIT - DEFLATE_MARGIN
+        self.zip64 = self.size >= limit
+        self.offset = 0
+        self.crc = 0
+        self.compressed_size = self.size if self.method == STORED else None
+
+    def local_header(self):
+        dos_time, dos_date = _dos_datetime(self.mtime)
+        extra = b""
+        sizes = 0
+        if self.zip64:
+            extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+            sizes = ZIP64_LIMIT
+        return struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 45 if self.zip64 else 20, FLAG_DATA_DESCRIPTOR | FLAG_UTF8,
+            self.method, dos_time, dos_date, 0, sizes, sizes, len(self.name), len(extra),
+        ) + self.name + extra
+
+    def data_descriptor(self):
+        if self.zip64:
+            return struct.pack("<IIQQ", 0x08074B50, self.crc, self.compressed_size, self.size)
+        return struct.pack("<IIII", 0x08074B50, self.crc, self.compressed_size, self.size)
+
+    def central_header(self):
+        dos_time, dos_date = _dos_datetime(self.mtime)
+        extra_values = []
+        size, compressed_size, offset = self.size, self.compressed_size, self.offset
+        if size >= ZIP64_LIMIT or compressed_size >= ZIP64_LIMIT:
+            extra_values += [size, compressed_size]
+            size = compressed_size = ZIP64_LIMIT
+        if offset >= ZIP64_LIMIT:
+            extra_values.append(offset)
+            offset = ZIP64_LIMIT
+        extra = struct.pack(f"<HH{len(extra_values)}Q", 0x0001, 8 * len(extra_values), *extra_values) if extra_values else b""
+        version = 45 if extra else 20
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, version, version, FLAG_DATA_DESCRIPTOR | FLAG_UTF8,
+            self.method, dos_time, dos_date, self.crc, compressed_size, size,
+            len(self.name), len(extra), 0, 0, 0, 0, offset,
+        ) + self.name + extra
+
+    def data(self):
+        """Yield the (possibly deflated) file content, filling in crc and compressed size."""
+        crc, written = 0, 0
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15) if self.method == DEFLATED else None
+        with open(self.path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                crc = zlib.crc32(chunk, crc)
+                if compressor is not None:
+                    chunk = compressor.compress(chunk)
+                written += len(chunk)
+                if chunk:
+                    yield chunk
+        if compressor is not None:
+            chunk = compressor.flush()
+            written += len(chunk)
+            yield chunk
+        self.crc, self.compressed_size = crc, written
+
+
+def end_of_central_directory(count, cd_offset, cd_size):
+    records = b""
+    if count > 0xFFFF or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+        zip64_offset = cd_offset + cd_size
+        records += struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset)
+        records += struct.pack("<IIQI", 0x07064B50, 0, zip64_offset, 1)
+        count, cd_offset, cd_size = min(count, 0xFFFF), min(cd_offset, ZIP64_LIMIT), min(cd_size, ZIP64_LIMIT)
+    return records + struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, count, count, cd_size, cd_offset, 0)
+
+
+class ZipStream:
+    """ZIP archive of every file under ``folder`` (or of ``files`` in it), generated on the fly."""
+
+    def __init__(self, folder, files=None):
+        self.entries = []
+        if files is not None:
+            for full_path in sorted(set(files)):
+                try:
+                    self.entries.append(Entry(full_path, os.path.relpath(full_path, folder)))
+                except FileNotFoundError:
+                    continue
+        else:
+            for root, dirs, names in os.walk(folder):
+                dirs.sort()
+                for name in sorted(names):
+                    full_path = os.path.join(root, name)
+                    # giữ relative path trong zip
+                    self.entries.append(Entry(full_path, os.path.relpath(full_path, folder)))
+        self.size = self._planned_size()
+
+    @property
+    def etag(self):
+        digest = hashlib.sha1()
+        for entry in self.entries:
+            digest.update(b"%s\0%d\0%d\n" % (entry.name, entry.size, entry.mtime))
+        return f'"{digest.hexdigest()}"'
+
+    def _planned_size(self):
+        """Exact archive size when every entry is stored, ``None`` otherwise."""
+        if any(entry.method != STORED for entry in self.entries):
+            return None
+        offset = 0
+        for entry in self.entries:
+            entry.offset = offset
+            offset += len(entry.local_header()) + entry.size + len(entry.data_descriptor())
+        cd_size = sum(len(entry.central_header()) for entry in self.entries)
+        return offset + cd_size + len(end_of_central_directory(len(self.entries), offset, cd_size))
+
+    def __iter__(self):
+        offset = 0
+        for entry in self.entries:
+            entry.offset = offset
+            header = entry.local_header()
+            yield header
+            offset += len(header)
+            for chunk in entry.data():
+                offset += len(chunk)
+                yield chunk
+            descriptor = entry.data_descriptor()
+            offset += len(descriptor)
+            yield descriptor
+
+        cd_offset = offset
+        central = b"".join(entry.central_header() for entry in self.entries)
+        yield central
+        yield end_of_central_directory(len(self.entries), cd_offset, len(central))
+
+    def iter_range(self, start=0, end=None):
+        """Yield bytes ``start..end`` (inclusive) of the archive."""
+        position = 0
+        for chunk in self:
+            chunk_end = position + len(chunk)
+            if chunk_end > start and (end is None or position <= end):
+                yield chunk[max(start - position, 0):None if end is None else end + 1 - position]
+            position = chunk_end
+            if end is not None and position > end:
+                return
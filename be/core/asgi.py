@@ -13,4 +13,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from app import ws  # noqa: E402  (cần django đã setup)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        return await ws.application(scope, receive, send)
+    return await django_application(scope, receive, send)
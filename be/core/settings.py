@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import json
+import os
 from pathlib import Path
-from decouple import config
+
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -85,12 +88,51 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=sqlite (default): one file shared by the web and worker processes, in WAL mode so readers never
+# block the writer; writers take the lock up front (IMMEDIATE) and wait up to DB_TIMEOUT seconds for it.
+# DB_ENGINE=postgresql: server database for larger deployments, with a psycopg connection pool per process.
+DB_ENGINE = config("DB_ENGINE", "sqlite")
+DB_TIMEOUT = config("DB_TIMEOUT", 20, cast=int)
+
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config("DB_NAME", "tcsmart"),
+            'USER': config("DB_USER", "tcsmart"),
+            'PASSWORD': config("DB_PASSWORD", ""),
+            'HOST': config("DB_HOST", "localhost"),
+            'PORT': config("DB_PORT", 5432, cast=int),
+            # pool thay cho CONN_MAX_AGE (Django không cho dùng cả hai)
+            'OPTIONS': {
+                'pool': {
+                    'min_size': config("DB_POOL_MIN", 2, cast=int),
+                    'max_size': config("DB_POOL_MAX", 10, cast=int),
+                    'timeout': DB_TIMEOUT,
+                },
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config("DB_PATH", str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': config("DB_CONN_MAX_AGE", 600, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'timeout': DB_TIMEOUT,
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f'PRAGMA busy_timeout={DB_TIMEOUT * 1000};'
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA mmap_size=134217728;'
+                ),
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -140,10 +182,136 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 DATA_SRC_PATH = config("DATA_SRC_PATH", "")
 
+# Watch-folder ingestion (app/ingest.py, `manage.py ingest`): PDFs dropped under DATA_SRC_PATH are grouped
+# into sessions of at most INGEST_SESSION_SIZE files and queued for every INGEST_PIPELINES entry ("kind" or
+# "kind:action"). A file is picked up once its mtime is INGEST_SETTLE seconds old (or write to a dot / non-.pdf
+# name and rename). INGEST_WATCHER: auto = inotify through watchdog when installed, polling = rescan every
+# INGEST_POLL_INTERVAL seconds; inotify also rescans every INGEST_RESCAN_INTERVAL seconds (0 = never).
+# At most INGEST_MAX_JOBS ingestion jobs are queued or running at once, INGEST_WORKERS threads hash and copy.
+INGEST_PIPELINES = config("INGEST_PIPELINES", "qrcode", cast=Csv())
+INGEST_SESSION_SIZE = config("INGEST_SESSION_SIZE", 200, cast=int)
+INGEST_SETTLE = config("INGEST_SETTLE", 10, cast=float)
+INGEST_WATCHER = config("INGEST_WATCHER", "auto")
+INGEST_POLL_INTERVAL = config("INGEST_POLL_INTERVAL", 30, cast=float)
+INGEST_RESCAN_INTERVAL = config("INGEST_RESCAN_INTERVAL", 3600, cast=float)
+INGEST_MAX_JOBS = config("INGEST_MAX_JOBS", 4, cast=int)
+INGEST_WORKERS = config("INGEST_WORKERS", 4, cast=int)
+
 PATTERNS = [r"^[A-Z0-9]+-\d{4}-\d{6}$", r"^[\wÀ-Ỷà-ỷĐđ]{1,10}-\d{4}-[\wÀ-Ỷà-ỷĐđ]{1,10}$"]
 
 TOKEN_AIDOC = "Bearer " + config("TOKEN_AIDOC", "")
 PARENT_FOLDER_AIDOC = config("PARENT_FOLDER_AIDOC", 1, cast=int)
 DOMAIN_AIDOC = config("DOMAIN_AIDOC", "")
+AIDOC_CONCURRENCY = config("AIDOC_CONCURRENCY", 4, cast=int)
+AIDOC_RETRIES = config("AIDOC_RETRIES", 3, cast=int)
+AIDOC_BACKOFF = config("AIDOC_BACKOFF", 1.0, cast=float)
+AIDOC_CONNECT_TIMEOUT = config("AIDOC_CONNECT_TIMEOUT", 10, cast=float)
+AIDOC_READ_TIMEOUT = config("AIDOC_READ_TIMEOUT", 600, cast=float)
+
+DATA_UPLOAD_MAX_NUMBER_FILES=1000
+
+# Chunked uploads (/app/files/uploads/): chunk size suggested to the client, must stay below the proxy body limit
+UPLOAD_CHUNK_SIZE = config("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024, cast=int)
+
+# Web server (uvicorn-cfg.py): WEB_WORKERS request-serving processes, independent of the decode workers
+WEB_PORT = config("WEB_PORT", 8000, cast=int)
+WEB_WORKERS = config("WEB_WORKERS", 2, cast=int)
+WEB_TIMEOUT = config("WEB_TIMEOUT", 120, cast=int)
+WEB_MAX_REQUESTS = config("WEB_MAX_REQUESTS", 2000, cast=int)
+
+# Background jobs: the start endpoints enqueue a Job, the dispatcher runs it on a process pool of JOB_WORKERS.
+# Embedded = the dispatcher runs inside the web process (development); in production run `manage.py run_workers`
+# as its own service and set JOB_DISPATCHER_EMBEDDED=False.
+JOB_WORKERS = config("JOB_WORKERS", os.cpu_count() or 1, cast=int)
+JOB_POLL_INTERVAL = config("JOB_POLL_INTERVAL", 1.0, cast=float)
+JOB_DISPATCHER_EMBEDDED = config("JOB_DISPATCHER_EMBEDDED", True, cast=bool)
+# Lease: a dispatcher refreshes Job.heartbeat_at of its running jobs every JOB_HEARTBEAT_INTERVAL seconds; a running
+# job not refreshed for JOB_LEASE seconds (its worker container was stopped or recreated) is queued again.
+JOB_HEARTBEAT_INTERVAL = config("JOB_HEARTBEAT_INTERVAL", 10.0, cast=float)
+JOB_LEASE = config("JOB_LEASE", 120, cast=int)
+# Fair scheduling (app/scheduler.py): a dispatcher runs up to JOB_MAX_RUNNING jobs at once, at most
+# JOB_SESSION_MAX_RUNNING per session, and shares the workers between sessions by weighted fair queuing.
+# JOB_SESSION_WEIGHTS: "<session prefix>:<weight>" entries (default weight 1), e.g. ingest-:0.5
+JOB_MAX_RUNNING = config("JOB_MAX_RUNNING", 16, cast=int)
+JOB_SESSION_MAX_RUNNING = config("JOB_SESSION_MAX_RUNNING", 2, cast=int)
+JOB_SESSION_WEIGHTS = config("JOB_SESSION_WEIGHTS", "", cast=Csv())
+# Admission control: new jobs get 429 + Retry-After (JOB_RETRY_AFTER seconds, more the further over)
+# while queued jobs, files waiting or memory use (% of the container limit, as published by the dispatchers every
+# JOB_HEARTBEAT_INTERVAL) reach these limits; 0 = no limit
+JOB_MAX_QUEUED = config("JOB_MAX_QUEUED", 200, cast=int)
+JOB_MAX_BACKLOG_FILES = config("JOB_MAX_BACKLOG_FILES", 50000, cast=int)
+JOB_MAX_MEMORY_PERCENT = config("JOB_MAX_MEMORY_PERCENT", 90, cast=float)
+JOB_RETRY_AFTER = config("JOB_RETRY_AFTER", 30, cast=int)
+# Process on arrival: uploads that name a pipeline (process=<kind>) queue each file as soon as it is stored
+PROCESS_ON_ARRIVAL = config("PROCESS_ON_ARRIVAL", True, cast=bool)
+
+# QReader model: loaded lazily inside decode workers only
+QREADER_MODEL_SIZE = config("QREADER_MODEL_SIZE", "l")  # n / s / m / l
+QREADER_BATCH_SIZE = config("QREADER_BATCH_SIZE", 8, cast=int)
+
+# Cheap QR decoders (pyzbar / OpenCV) run on a grayscale copy downscaled to this size before QReader
+QR_FAST_MAX_SIDE = config("QR_FAST_MAX_SIDE", 1600, cast=int)
+
+# Preprocessing (app/preprocess.py): when the cheap decoders miss, they retry on these variants, in order, before
+# re-rendering at a higher DPI. Empty = off. Split scans every page, so it only preprocesses with SPLIT_PREPROCESS.
+PREPROCESS_STEPS = config("PREPROCESS_STEPS", "threshold,scale,deskew,denoise", cast=Csv())
+PREPROCESS_SCALES = config("PREPROCESS_SCALES", "2.0,0.5", cast=Csv(float))
+
+# DataMatrix symbols are read with pylibdmtx when it is installed (pip install pylibdmtx, apt install libdmtx0b);
+# it is slow on a full page, so it only runs on the plain page and gives up after DATAMATRIX_TIMEOUT ms.
+DATAMATRIX_ENABLED = config("DATAMATRIX_ENABLED", True, cast=bool)
+DATAMATRIX_TIMEOUT = config("DATAMATRIX_TIMEOUT", 300, cast=int)
+
+# Rendering: pages are rendered at the first DPI step and re-rendered at the next one only if decoding failed.
+# ROI_TEMPLATES maps an action / job kind to the page fractions (left, top, right, bottom) to render, null = full page.
+RENDER_DPI_STEPS = config("RENDER_DPI_STEPS", "150,300", cast=Csv(int))
+RENDER_TIMEOUT = config("RENDER_TIMEOUT", 120, cast=int)  # pdftoppm only
+# auto = pdfium (pypdfium2, in-process, pooled documents) when installed, pdftoppm subprocess otherwise
+RENDER_BACKEND = config("RENDER_BACKEND", "auto")
+RENDER_DOC_POOL = config("RENDER_DOC_POOL", 8, cast=int)
+# pdfium only: image-only (scanned) pages are decoded from the embedded image at its native resolution, no rendering
+RENDER_NATIVE_IMAGES = config("RENDER_NATIVE_IMAGES", True, cast=bool)
+ROI_TEMPLATES = config("ROI_TEMPLATES", '{"barcode": [0.5, 0.0, 1.0, 0.5], "qrcode": null}', cast=json.loads)
+
+# Uploads are hashed while streaming; decode results are cached per (hash, kind, action, decoder version)
+FILE_UPLOAD_HANDLERS = [
+    "app.upload_handlers.HashingMemoryFileUploadHandler",
+    "app.upload_handlers.HashingTemporaryFileUploadHandler",
+]
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+}
 
-DATA_UPLOAD_MAX_NUMBER_FILES=1000
\ No newline at end of file
+# Decode result cache (app/result_cache.py): one SQLite file shared by the workers, LRU-evicted over DECODE_CACHE_MAX_BYTES
+DECODE_CACHE_PATH = config("DECODE_CACHE_PATH", str(MEDIA_ROOT / ".cache" / "decode.sqlite3"))
+DECODE_CACHE_MAX_BYTES = config("DECODE_CACHE_MAX_BYTES", 512 * 1024 * 1024, cast=int)
+
+# Output files: "auto" = hard link, then reflink, then copy; "reflink" skips hard links; "copy" always copies
+OUTPUT_LINK_MODE = config("OUTPUT_LINK_MODE", "auto")
+
+# Janitor (app/janitor.py): sessions expire SESSION_TTL seconds after their last upload / job, or
+# SESSION_DOWNLOAD_GRACE seconds after a completed download; MEDIA_QUOTA (bytes, 0 = none) evicts the least
+# recently active sessions first. JANITOR_INTERVAL = 0 disables the background thread (use `manage.py janitor`).
+SESSION_TTL = config("SESSION_TTL", 7 * 24 * 3600, cast=int)
+SESSION_DOWNLOAD_GRACE = config("SESSION_DOWNLOAD_GRACE", 600, cast=int)
+MEDIA_QUOTA = config("MEDIA_QUOTA", 0, cast=int)
+JANITOR_INTERVAL = config("JANITOR_INTERVAL", 300, cast=int)
+JANITOR_MIN_AGE = config("JANITOR_MIN_AGE", 600, cast=int)
+JANITOR_BATCH = config("JANITOR_BATCH", 50, cast=int)
+
+# Metrics: every process writes its counters/histograms here, /app/metrics/ sums them up. Snapshots not written for
+# METRICS_SNAPSHOT_TTL seconds (e.g. from containers that were recreated) are merged into archive.json
+METRICS_DIR = config("METRICS_DIR", str(MEDIA_ROOT / ".cache" / "metrics"))
+METRICS_SNAPSHOT_TTL = config("METRICS_SNAPSHOT_TTL", 3600, cast=int)
+
+# Split action: every page is scanned for separator codes at SPLIT_DPI (cheap decoders, QReader optional)
+SPLIT_DPI = config("SPLIT_DPI", 200, cast=int)
+SPLIT_USE_QREADER = config("SPLIT_USE_QREADER", False, cast=bool)
+SPLIT_PREPROCESS = config("SPLIT_PREPROCESS", False, cast=bool)
+
+# python manage.py bench_decode compares its run with this file. Timings are machine-specific, so it is not
+# committed: write it once with `bench_decode --save-baseline` on the machine that runs the regression check.
+BENCH_BASELINE = config("BENCH_BASELINE", str(BASE_DIR / "benchmarks" / "decode_baseline.json"))
@@ -1,27 +1,83 @@
-import uvicorn
+"""Server launcher.
+
+    python uvicorn-cfg.py          # production: gunicorn master + WEB_WORKERS uvicorn workers
+    python uvicorn-cfg.py --dev    # development: one uvicorn process with auto-reload
+
+In production the app is imported once in the gunicorn master (preload) and forked into
+WEB_WORKERS processes that only serve requests: upload, download, job status, WebSocket.
+Decoding runs in a separate service, ``python manage.py run_workers``, with its own
+JOB_WORKERS processes, so a large batch never competes with the event loops serving
+requests (set JOB_DISPATCHER_EMBEDDED=False for the web service).
+"""
+
 import os
+import sys
+
 import django
-import threading
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 django.setup()
 
+from django.conf import settings  # noqa: E402
+
 # import threading
 # from core.tcp_receiver import start_tcp_server
 
 # # Khởi động TCP server trên thread riêng
 # threading.Thread(target=start_tcp_server, daemon=True).start()
-# Cấu hình Uvicorn
-config = uvicorn.Config(
-    "core.asgi:application",  # Đường dẫn tới ứng dụng ASGI của bạn
-    host="0.0.0.0",                # Lắng nghe trên tất cả các địa chỉ IP
-    port=8000,                     # Cổng mà server sẽ lắng nghe
-    log_level="debug",             # Mức độ log (debug, info, warning, v.v.)
-    reload=True,                   # Tự động tải lại khi có thay đổi (dành cho môi trường phát triển)
-    workers=2,                     # Số lượng worker (chạy nhiều tiến trình)
-)
-
-
-# Khởi tạo và chạy server
-server = uvicorn.Server(config)
-server.run()
+
+
+def run_dev():
+    import uvicorn
+
+    # Cấu hình Uvicorn cho môi trường phát triển: 1 process, tự động tải lại khi có thay đổi
+    uvicorn.run(
+        "core.asgi:application",
+        host="0.0.0.0",
+        port=settings.WEB_PORT,
+        log_level="debug",
+        reload=True,
+    )
+
+
+def run_production():
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from core.asgi import application
+            import core.urls  # noqa: F401  (nạp sẵn views trong master, các worker fork dùng chung)
+
+            return application
+
+    Server({
+        "bind": f"0.0.0.0:{settings.WEB_PORT}",
+        "workers": settings.WEB_WORKERS,
+        "worker_class": "uvicorn_worker.UvicornWorker",
+        "preload_app": True,
+        # worker không phản hồi heartbeat trong khoảng này sẽ bị khởi động lại
+        "timeout": settings.WEB_TIMEOUT,
+        "graceful_timeout": settings.WEB_TIMEOUT,
+        "keepalive": 5,
+        # tái tạo worker định kỳ để giới hạn bộ nhớ bị giữ lại
+        "max_requests": settings.WEB_MAX_REQUESTS,
+        "max_requests_jitter": settings.WEB_MAX_REQUESTS // 10,
+        "accesslog": "-",
+        "loglevel": "info",
+    }).run()
+
+
+# (cần guard __main__: worker xử lý job được spawn sẽ import lại module chính)
+if __name__ == "__main__":
+    if "--dev" in sys.argv:
+        run_dev()
+    else:
+        run_production()
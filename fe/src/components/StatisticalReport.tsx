@@ -1,34 +1,39 @@
-import { useState } from 'react';
+import { useEffect, useMemo, useState } from 'react';
 import { FileText, CheckCircle, XCircle } from 'lucide-react';
+import { apiStats, loadSettings, type DailyStats, type StatsSummary } from './mockApi';
 
-const mockData = [
-  { date: '2025-01-15', processed: 45, success: 42, failed: 3 },
-  { date: '2025-01-16', processed: 62, success: 60, failed: 2 },
-  { date: '2025-01-17', processed: 38, success: 35, failed: 3 },
-  { date: '2025-01-18', processed: 51, success: 49, failed: 2 },
-  { date: '2025-01-19', processed: 47, success: 46, failed: 1 },
-  { date: '2025-01-20', processed: 55, success: 53, failed: 2 },
-  { date: '2025-01-21', processed: 41, success: 40, failed: 1 },
-];
+function isoDate(date: Date) {
+  return date.toISOString().slice(0, 10);
+}
 
 export default function StatisticalReport() {
-  const [startDate, setStartDate] = useState('2025-01-15');
-  const [endDate, setEndDate] = useState('2025-01-21');
+  const settings = useMemo(() => loadSettings(), []);
+  const [startDate, setStartDate] = useState(() => isoDate(new Date(Date.now() - 6 * 24 * 3600 * 1000)));
+  const [endDate, setEndDate] = useState(() => isoDate(new Date()));
+  const [filteredData, setFilteredData] = useState<DailyStats[]>([]);
+  const [summary, setSummary] = useState<StatsSummary | null>(null);
+  const [error, setError] = useState('');
 
-  const filteredData = mockData.filter(
-    (item) => item.date >= startDate && item.date <= endDate
-  );
+  useEffect(() => {
+    let cancelled = false;
+    apiStats(startDate, endDate, settings)
+      .then(({ days, totals }) => {
+        if (cancelled) return;
+        setFilteredData(days);
+        setSummary(totals);
+        setError('');
+      })
+      .catch((err: Error) => {
+        if (!cancelled) setError(err.message);
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [startDate, endDate, settings]);
 
-  const totals = filteredData.reduce(
-    (acc, item) => ({
-      processed: acc.processed + item.processed,
-      success: acc.success + item.success,
-      failed: acc.failed + item.failed,
-    }),
-    { processed: 0, success: 0, failed: 0 }
-  );
+  const totals = summary ?? { processed: 0, success: 0, noCode: 0, failed: 0 };
 
-  const maxProcessed = Math.max(...filteredData.map((d) => d.processed));
+  const maxProcessed = Math.max(1, ...filteredData.map((d) => d.processed));
 
   return (
     <div className="p-8">
@@ -62,6 +67,7 @@ export default function StatisticalReport() {
             />
           </div>
         </div>
+        {error && <p className="text-sm text-red-600 mb-4">{error}</p>}
 
         <div className="grid grid-cols-3 gap-6">
           <div className="bg-blue-50 rounded-lg p-6">
@@ -109,6 +115,12 @@ export default function StatisticalReport() {
                           width: `${(item.success / maxProcessed) * 100}%`,
                         }}
                       />
+                      <div
+                        className="bg-amber-400"
+                        style={{
+                          width: `${(item.noCode / maxProcessed) * 100}%`,
+                        }}
+                      />
                       <div
                         className="bg-red-500"
                         style={{
@@ -130,6 +142,10 @@ export default function StatisticalReport() {
             <div className="w-4 h-4 bg-green-500 rounded" />
             <span className="text-sm text-gray-600">Success</span>
           </div>
+          <div className="flex items-center gap-2">
+            <div className="w-4 h-4 bg-amber-400 rounded" />
+            <span className="text-sm text-gray-600">No code</span>
+          </div>
           <div className="flex items-center gap-2">
             <div className="w-4 h-4 bg-red-500 rounded" />
             <span className="text-sm text-gray-600">Failed</span>
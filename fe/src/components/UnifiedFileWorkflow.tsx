@@ -71,6 +71,8 @@ export default function UnifiedFileWorkflow() {
   const [uploadedFiles, setUploadedFiles] = useState<Array<{ name: string; size: number }>>([]);
 
   const [selectedAction, setSelectedAction] = useState<ProcessAction | null>(null);
+  // xử lý ngay khi từng file tải lên xong (backend bắt đầu decode trong lúc các file sau còn đang upload)
+  const [arrivalAction, setArrivalAction] = useState<ProcessAction | ''>('');
   const [processResults, setProcessResults] = useState<ProcessResultItem[]>([]);
 
   const [logs, setLogs] = useState<LogEntry[]>([]);
@@ -128,7 +130,7 @@ export default function UnifiedFileWorkflow() {
     try {
       setStatus('uploading');
       appendLog({ status: 'processing', title: 'UPLOAD', detail: `Uploading ${pickedFiles.length} file(s)...` });
-      const res = await apiUpload(pickedFiles, settings);
+      const res = await apiUpload(pickedFiles, settings, undefined, arrivalAction || undefined);
       setSessionId(res.sessionId);
       setUploadedFiles(res.files);
       setStatus('uploaded');
@@ -138,14 +140,16 @@ export default function UnifiedFileWorkflow() {
         title: 'UPLOAD_SUCCESS',
         detail: `sessionId=${res.sessionId}. Uploaded ${res.files.length} file(s).`,
       });
+      // phần lớn file đã được xử lý trong lúc upload, start chỉ chờ phần còn lại
+      if (arrivalAction) await handleProcess(arrivalAction, res.sessionId, res.files);
     } catch (e: any) {
       setStatus('error');
       appendLog({ status: 'error', title: 'UPLOAD_ERROR', detail: e?.message ?? String(e) });
     }
   };
 
-  const handleProcess = async (action: ProcessAction) => {
-    if (!sessionId) return;
+  const handleProcess = async (action: ProcessAction, sid = sessionId, files = uploadedFiles) => {
+    if (!sid) return;
     try {
       setSelectedAction(action);
       setStatus('processing');
@@ -154,10 +158,10 @@ export default function UnifiedFileWorkflow() {
       appendLog({
         status: 'processing',
         title: 'PROCESS',
-        detail: `Action=${action}. Processing ${uploadedFiles.length} file(s)...`,
+        detail: `Action=${action}. Processing ${files.length} file(s)...`,
       });
 
-      const res = await mockProcess(sessionId, action, uploadedFiles, settings);
+      const res = await mockProcess(sid, action, files, settings);
       setProcessResults(res.results);
       setStatus('processed');
       appendLog({
@@ -325,6 +329,23 @@ export default function UnifiedFileWorkflow() {
             )}
           </div>
 
+          <label className="mt-5 block text-sm text-gray-700">
+            Xử lý ngay khi tải lên
+            <select
+              value={arrivalAction}
+              onChange={(e) => setArrivalAction(e.target.value as ProcessAction | '')}
+              disabled={status === 'uploading' || status === 'processing'}
+              className="mt-1 w-full px-3 py-2 border border-gray-300 rounded-lg bg-white"
+            >
+              <option value="">Không — chọn tác vụ sau khi tải lên</option>
+              {actionCards.map((a) => (
+                <option key={a.id} value={a.id}>
+                  {a.label}
+                </option>
+              ))}
+            </select>
+          </label>
+
           <button
             type="button"
             onClick={handleUpload}
@@ -101,6 +101,80 @@ function withBaseUrl(baseUrl: string, path: string) {
   return `${base}${p}`;
 }
 
+export type JobEvent = {
+  id: number;
+  jobId: number;
+  event: 'queued' | 'rendering' | 'decoded' | 'renamed' | 'failed' | 'done';
+  file: string;
+  page: number | null;
+  value: string;
+  detail: Record<string, unknown>;
+  ts: string;
+};
+
+function waitForJobEvents(jobId: number, sessionId: string, settings: AppSettings, onEvent?: (e: JobEvent) => void) {
+  // Backend pushes progress over /ws/sessions/<session_id>/; resolves on the job's "done" event.
+  const base = settings.API_BASE_URL.replace(/\/$/, '').replace(/^http/, 'ws');
+  return new Promise<void>((resolve, reject) => {
+    const ws = new WebSocket(`${base}/ws/sessions/${encodeURIComponent(sessionId)}/`);
+    let finished = false;
+    ws.onmessage = (msg) => {
+      const event: JobEvent = JSON.parse(msg.data);
+      if (event.jobId !== jobId) return;
+      onEvent?.(event);
+      if (event.event === 'done') {
+        finished = true;
+        ws.close();
+        resolve();
+      }
+    };
+    ws.onerror = () => reject(new Error('websocket error'));
+    ws.onclose = () => {
+      if (!finished) reject(new Error('websocket closed'));
+    };
+  });
+}
+
+/**
+ * POST that waits and retries while the backend refuses new jobs (429 + Retry-After, queue overloaded).
+ */
+async function postJob(url: string, init: RequestInit, attempts = 5): Promise<Response> {
+  for (let attempt = 1; ; attempt++) {
+    const res = await fetch(url, { ...init, method: 'POST' });
+    if (res.status !== 429 || attempt >= attempts) return res;
+    const retryAfter = Number(res.headers.get('Retry-After')) || 30;
+    await sleep(Math.min(retryAfter, 300) * 1000);
+  }
+}
+
+async function waitForJob(
+  jobId: number,
+  settings: AppSettings,
+  sessionId?: string,
+  onEvent?: (e: JobEvent) => void
+): Promise<{ status: string; processed: number; failed: number; total: number; error: string }> {
+  const url = withBaseUrl(settings.API_BASE_URL, `/app/jobs/${jobId}/`);
+  const headers: Record<string, string> = {};
+  if (settings.API_TOKEN) headers.Authorization = `Bearer ${settings.API_TOKEN}`;
+
+  if (sessionId && typeof WebSocket !== 'undefined') {
+    // WebSocket không kết nối được thì quay về polling bên dưới
+    await waitForJobEvents(jobId, sessionId, settings, onEvent).catch(() => undefined);
+  }
+
+  // Backend processes the job in background workers; poll until it leaves queued/running.
+  for (;;) {
+    const res = await fetch(url, { headers });
+    const json: any = await res.json().catch(() => null);
+    if (!res.ok) {
+      throw new Error(`job ${jobId} status failed (${res.status}): ${json?.message || res.statusText}`);
+    }
+    const job = json?.data;
+    if (job && job.status !== 'queued' && job.status !== 'running') return job;
+    await sleep(Math.min(Math.max(settings.TIME_SLEEP, 500), 5000));
+  }
+}
+
 async function apiStartDetect(
   action: Extract<ProcessAction, 'qrcode' | 'barcode'>,
   sessionId: string,
@@ -114,8 +188,7 @@ async function apiStartDetect(
   };
   if (settings.API_TOKEN) headers.Authorization = `Bearer ${settings.API_TOKEN}`;
 
-  const res = await fetch(url, {
-    method: 'POST',
+  const res = await postJob(url, {
     headers,
     // Backend expects both session_id and action (used as output folder name)
     body: JSON.stringify({ session_id: sessionId, action }),
@@ -134,6 +207,12 @@ async function apiStartDetect(
     throw new Error(`${action} start failed (${res.status}): ${msg}`);
   }
 
+  if (json?.data?.id) {
+    const job = await waitForJob(json.data.id, settings, sessionId);
+    if (job.status === 'failed') throw new Error(`${action} failed: ${job.error}`);
+    return { data: job, message: `Thành công (${job.processed}/${job.total}, lỗi: ${job.failed})` };
+  }
+
   return {
     data: json?.data ?? null,
     message: json?.message ?? 'Thành công',
@@ -149,8 +228,7 @@ async function apiPdf2Layer(sessionId: string, settings: AppSettings): Promise<{
   if (settings.API_TOKEN) headers.Authorization = `Bearer ${settings.API_TOKEN}`;
 
   // Backend expects {session_id, action}. Here action is the output folder name.
-  const res = await fetch(url, {
-    method: 'POST',
+  const res = await postJob(url, {
     headers,
     body: JSON.stringify({ session_id: sessionId, action: 'pdf2layer' }),
   });
@@ -168,6 +246,12 @@ async function apiPdf2Layer(sessionId: string, settings: AppSettings): Promise<{
     throw new Error(`pdf2layer failed (${res.status}): ${msg}`);
   }
 
+  if (json?.data?.id) {
+    const job = await waitForJob(json.data.id, settings, sessionId);
+    if (job.status === 'failed') throw new Error(`pdf2layer failed: ${job.error}`);
+    return { message: `Thành công (${job.processed}/${job.total}, lỗi: ${job.failed})` };
+  }
+
   return { message: json?.message ?? json?.status ?? 'Thành công' };
 }
 
@@ -230,33 +314,95 @@ async function apiDownloadResult(
 
 
 
+type UploadState = { uploadId: string; name: string; size: number; offset: number };
+
+async function uploadJson(url: string, init: RequestInit, headers: Record<string, string>) {
+  const res = await fetch(url, { ...init, headers: { ...headers, ...(init.headers as Record<string, string>) } });
+  const json: any = await res.json().catch(() => null);
+  return { res, json };
+}
+
 /**
- * Real API: Upload (multipart/form-data)
- * Backend endpoint: POST {API_BASE_URL}/app/files/upload/
- * - field: files (multiple)
+ * Real API: chunked, resumable upload
+ * Backend endpoints:
+ * - POST {API_BASE_URL}/app/files/uploads/            init, returns uploadId + offset per file
+ * - PUT  {API_BASE_URL}/app/files/uploads/<id>/?offset=N  one chunk
+ * - GET  {API_BASE_URL}/app/files/uploads/?session_id=    current offsets (after a dropped connection)
+ * - POST {API_BASE_URL}/app/files/uploads/complete/   creates the File rows
+ *
+ * With `process`, the backend queues every file for that action as soon as its last chunk
+ * arrives; the start call made after the upload then only waits for what is still running.
  */
-export async function apiUpload(files: File[], settings: AppSettings): Promise<UploadResult> {
-  const url = `${settings.API_BASE_URL.replace(/\/$/, '')}/app/files/upload/`;
-
-  const form = new FormData();
-  for (const f of files) form.append('files', f);
+export async function apiUpload(
+  files: File[],
+  settings: AppSettings,
+  sessionId?: string,
+  process?: ProcessAction
+): Promise<UploadResult> {
+  const base = `${settings.API_BASE_URL.replace(/\/$/, '')}/app/files/uploads/`;
 
   const headers: Record<string, string> = {};
   // If later you enable auth, keep the same settings contract.
   if (settings.API_TOKEN) headers.Authorization = `Bearer ${settings.API_TOKEN}`;
+  const jsonHeaders = { 'Content-Type': 'application/json' };
+
+  const init = await uploadJson(
+    base,
+    {
+      method: 'POST',
+      headers: jsonHeaders,
+      body: JSON.stringify({
+        session_id: sessionId,
+        files: files.map((f) => ({ name: f.name, size: f.size, contentType: f.type })),
+        ...(process ? { process, action: process } : {}),
+      }),
+    },
+    headers
+  );
+  if (!init.res.ok) {
+    throw new Error(`Upload failed (${init.res.status}): ${init.json?.detail || init.res.statusText}`);
+  }
+  const sid: string = init.json.sessionId;
+  const chunkSize: number = init.json.chunkSize;
+  const states: UploadState[] = init.json.uploads;
+
+  for (let i = 0; i < files.length; i++) {
+    const file = files[i];
+    const state = states[i];
+    let retries = 0;
+    while (state.offset < state.size) {
+      try {
+        const chunk = file.slice(state.offset, Math.min(state.offset + chunkSize, state.size));
+        const { res, json } = await uploadJson(
+          `${base}${state.uploadId}/?offset=${state.offset}`,
+          { method: 'PUT', headers: { 'Content-Type': 'application/octet-stream' }, body: chunk },
+          headers
+        );
+        // 409: server đã có offset khác (chunk trước đó đã tới nơi), gửi tiếp từ offset của server
+        if (!res.ok && res.status !== 409) throw new Error(`chunk failed (${res.status}): ${json?.detail || res.statusText}`);
+        state.offset = json.upload.offset;
+        retries = 0;
+      } catch (err) {
+        if (++retries > 5) throw new Error(`Upload failed: ${file.name}: ${(err as Error).message}`);
+        await sleep(Math.min(1000 * 2 ** retries, 15000));
+        // mất kết nối: hỏi lại server đã nhận tới đâu rồi gửi tiếp
+        const status = await uploadJson(`${base}?session_id=${encodeURIComponent(sid)}`, {}, headers).catch(() => null);
+        const current = status?.json?.uploads?.find((u: UploadState) => u.uploadId === state.uploadId);
+        if (current) state.offset = current.offset;
+      }
+    }
+  }
 
-  const res = await fetch(url, {
-    method: 'POST',
-    headers,
-    body: form,
-  });
-
-  if (!res.ok) {
-    const txt = await res.text().catch(() => '');
-    throw new Error(`Upload failed (${res.status}): ${txt || res.statusText}`);
+  const done = await uploadJson(
+    `${base}complete/`,
+    { method: 'POST', headers: jsonHeaders, body: JSON.stringify({ session_id: sid }) },
+    headers
+  );
+  if (!done.res.ok) {
+    throw new Error(`Upload failed (${done.res.status}): ${done.json?.detail || done.res.statusText}`);
   }
 
-  const data = (await res.json()) as {
+  const data = done.json as {
     sessionId: string;
     files: Array<{ name: string; size: number; id?: number; url?: string }>;
   };
@@ -267,6 +413,43 @@ export async function apiUpload(files: File[], settings: AppSettings): Promise<U
   };
 }
 
+export interface StatsSummary {
+  processed: number;
+  success: number;
+  noCode: number;
+  failed: number;
+  pages: number;
+  bytes: number;
+  decodeRate: number | null;
+  seconds: { total: number; avg: number | null; p50: number | null; p95: number | null; p99: number | null };
+}
+
+export interface DailyStats extends StatsSummary {
+  date: string;
+}
+
+/**
+ * Real API: processing statistics, read from the backend daily rollups
+ * - GET {API_BASE_URL}/app/stats/?start=YYYY-MM-DD&end=YYYY-MM-DD   one row per day + totals of the range
+ */
+export async function apiStats(
+  startDate: string,
+  endDate: string,
+  settings: AppSettings
+): Promise<{ days: DailyStats[]; totals: StatsSummary }> {
+  const params = new URLSearchParams({ start: startDate, end: endDate, page_size: '366' });
+  const url = withBaseUrl(settings.API_BASE_URL, `/app/stats/?${params}`);
+  const headers: Record<string, string> = {};
+  if (settings.API_TOKEN) headers.Authorization = `Bearer ${settings.API_TOKEN}`;
+
+  const res = await fetch(url, { headers });
+  const json: any = await res.json().catch(() => null);
+  if (!res.ok) {
+    throw new Error(`stats failed (${res.status}): ${json?.message || res.statusText}`);
+  }
+  return { days: json.data as DailyStats[], totals: json.totals as StatsSummary };
+}
+
 /**
  * Mock API: Process all uploaded files for an action
  * - simulates per-file results